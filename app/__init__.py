@@ -61,6 +61,16 @@ def create_app(config_class=None):
         from app.distribucion.whatsapp_sender import iniciar_procesador_whatsapp
         iniciar_procesador_whatsapp(app)
 
+        # Escaneos automáticos incrementales (desactivados por defecto)
+        if app.config.get('ESCANEO_AUTOMATICO'):
+            from app.tasks.escaneo_programado import iniciar_escaneo_programado
+            iniciar_escaneo_programado(app)
+
+        # Interpretación anticipada de los PDFs descargados
+        if app.config.get('PREEXTRACCION_AUTOMATICA'):
+            from app.tasks.preextraccion import iniciar_preextraccion
+            iniciar_preextraccion(app)
+
     # Headers de seguridad
     @app.after_request
     def agregar_headers_seguridad(response):
@@ -2,14 +2,14 @@
 Rutas del panel de administración
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SelectField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, Length, Optional
 from functools import wraps
 from app import db
-from app.models import Usuario, LogActividad, Escaneo, CuentaGmail
+from app.models import Usuario, LogActividad, Escaneo, CuentaGmail, EstadisticaPatron
 from app.auth.forms import validar_contrasena_segura
 from datetime import datetime, timedelta
 
@@ -300,3 +300,40 @@ def estadisticas():
                           escaneos_recientes=escaneos_recientes,
                           total_pdfs=total_pdfs,
                           total_cuentas_gmail=total_cuentas_gmail)
+
+
+@admin_bp.route('/patrones')
+@login_required
+@admin_requerido
+def patrones():
+    """Aciertos de los patrones del intérprete de PDFs por compañía y campo."""
+    from app.extractor.pdf_parser import ExtractorDatosPoliza
+    from app.extractor.orden_patrones import informe_patrones, MIN_EVALUACIONES
+
+    filtro_compania = request.args.get('compania')
+
+    query = db.session.query(
+        EstadisticaPatron.compania_clave, EstadisticaPatron.campo, EstadisticaPatron.patron,
+        EstadisticaPatron.aciertos, EstadisticaPatron.evaluaciones
+    )
+    if filtro_compania is not None and filtro_compania != 'todas':
+        query = query.filter(EstadisticaPatron.compania_clave == filtro_compania)
+
+    patrones_compania = {
+        clave: config['patron_poliza']
+        for clave, config in ExtractorDatosPoliza.COMPANIAS.items() if 'patron_poliza' in config
+    }
+    informe = informe_patrones(query.all(), ExtractorDatosPoliza.PATRONES, patrones_compania)
+
+    companias = [c[0] for c in db.session.query(EstadisticaPatron.compania_clave).distinct().order_by(
+        EstadisticaPatron.compania_clave
+    ).all()]
+    sin_aciertos = sum(1 for grupo in informe for patron in grupo['patrones'] if patron['sin_aciertos'])
+
+    return render_template('admin/patrones.html',
+                          informe=informe,
+                          companias=companias,
+                          filtro_compania=filtro_compania or 'todas',
+                          sin_aciertos=sin_aciertos,
+                          min_evaluaciones=MIN_EVALUACIONES,
+                          orden_adaptativo=current_app.config.get('EXTRACCION_ORDEN_ADAPTATIVO', False))
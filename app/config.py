@@ -37,6 +37,61 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(basedir), 'archivos_usuarios')
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50 MB
 
+    # Escaneo de correos
+    ESCANEO_PREFILTRO = True  # Descartar correos sin PDF (BODYSTRUCTURE) antes de descargarlos
+    ESCANEO_LOTE_METADATOS = 500  # Correos por cada FETCH de metadatos
+    ESCANEO_MAX_TAMANO_ADJUNTO = 25 * 1024 * 1024  # 25 MB por PDF (0 = sin límite)
+    ESCANEO_INTERPRETAR_PDFS = False  # Interpretar cada PDF descargado durante el escaneo
+    ESCANEO_PROCESOS_INTERPRETACION = 2  # Procesos del pool de interpretación
+    ESCANEO_MAX_SESIONES_IMAP = 3  # Sesiones IMAP abiertas a la vez (todos los escaneos)
+    ESCANEO_MAX_HILOS = 4  # Escaneos ejecutándose a la vez; el resto espera en cola
+    ESCANEO_HILOS_RESERVADOS_PEQUENOS = 1  # Huecos que no pueden ocupar las cargas grandes
+    ESCANEO_DIAS_ESCANEO_PEQUENO = 7  # Escaneo de una cuenta con fecha_desde reciente = pequeño
+
+    # Archivo de logs de escaneo (un archivo por escaneo, rotado por tamaño)
+    ESCANEO_LOGS_FOLDER = os.path.join(os.path.dirname(basedir), 'logs_escaneo')
+    ESCANEO_LOG_MAX_BYTES = 5 * 1024 * 1024  # Tamaño de cada parte antes de rotar
+    ESCANEO_LOG_PARTES = 3  # Partes rotadas que se conservan por escaneo
+    ESCANEO_LOG_RETENCION_DIAS = 90  # Los logs más antiguos se borran
+
+    # Caché en disco del texto extraído de los PDFs (None = desactivada)
+    TEXTO_CACHE_FOLDER = os.path.join(os.path.dirname(basedir), 'cache_texto')
+    TEXTO_CACHE_MAX_MB = 500  # Se expulsan los menos usados al superarlo
+
+    # Lectura de páginas del intérprete de pólizas
+    EXTRACCION_PEREZOSA = False  # Dejar de leer páginas al encontrar los campos de la póliza
+    EXTRACCION_MAX_PAGINAS = 0  # Páginas leídas como máximo por PDF (0 = todas)
+    EXTRACCION_PLANTILLAS = True  # Leer por región los campos de compañías con plantilla de diseño
+    EXTRACCION_ORDEN_ADAPTATIVO = True  # Probar primero los patrones con más aciertos de cada compañía
+    EXTRACCION_COMPANIA_REMITENTE = True  # Usar la compañía aprendida del remitente en vez de buscarla en el texto
+
+    # Procesos aislados de interpretación (ver app/extractor/aislamiento.py)
+    EXTRACCION_TIMEOUT_SEGUNDOS = 60  # Tiempo máximo por PDF
+    EXTRACCION_MAX_MEMORIA_MB = 1024  # RSS máximo del proceso que lee el PDF
+    EXTRACCION_MAX_TAREAS_PROCESO = 50  # PDFs por proceso antes de reemplazarlo
+
+    # Pre-extracción en segundo plano de los PDFs nuevos (baja prioridad)
+    PREEXTRACCION_AUTOMATICA = os.environ.get('PREEXTRACCION_AUTOMATICA', 'false').lower() == 'true'
+    PREEXTRACCION_LOCK = os.path.join(os.path.dirname(basedir), 'preextraccion.lock')  # Un solo proceso la ejecuta
+    PREEXTRACCION_INTERVALO_SEGUNDOS = 30  # Espera cuando no quedan PDFs pendientes
+    PREEXTRACCION_LOTE = 20  # PDFs por vuelta
+    PREEXTRACCION_PAUSA_SEGUNDOS = 0.5  # Pausa entre PDF y PDF
+
+    # Procesar lote del intérprete (en segundo plano)
+    LOTE_PDF_PROCESOS = None  # Procesos del pool (None = uno por núcleo)
+    LOTE_PDF_COMMIT = 25  # Pólizas creadas por commit
+
+    # Re-extracción de los PDFs interpretados con una versión anterior del parser
+    REEXTRACCION_PROCESOS = 2  # Procesos del pool
+    REEXTRACCION_LOTE = 50  # PDFs por commit
+
+    # Escaneo automático incremental de las cuentas activas
+    ESCANEO_AUTOMATICO = os.environ.get('ESCANEO_AUTOMATICO', 'false').lower() == 'true'
+    ESCANEO_AUTOMATICO_INTERVALO_MINUTOS = 60  # Cadencia por cuenta
+    ESCANEO_AUTOMATICO_DISPERSION = 0.2  # Fracción del intervalo para repartir los inicios
+    ESCANEO_AUTOMATICO_REVISION_SEGUNDOS = 60  # Cada cuánto se revisan las cuentas pendientes
+    ESCANEO_AUTOMATICO_CARPETAS = ['INBOX']  # Si el usuario no tiene escaneos previos
+
     # Clave de encriptación para credenciales Gmail (32 bytes para AES-256)
     ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY') or 'clave-encriptacion-32-bytes-xx!'
 
@@ -8,7 +8,9 @@ from flask_login import login_required, current_user
 from app import db
 from app.models import (Cliente, PolizaCliente, EnvioWhatsApp, PlantillaMensaje,
                         ArchivoDescargado, Escaneo, Compania, LogActividad,
-                        Pago, Interaccion, AlertaVencimiento, Siniestro)
+                        Pago, Interaccion, AlertaVencimiento, Siniestro, ExtraccionPdf,
+                        DiferenciaExtraccion, PlantillaDisenoPdf, EstadisticaPatron,
+                        ClaveParserCompania, FirmaTextoPdf)
 from app.distribucion.forms import (ClienteForm, AsignarPolizaForm, PlantillaMensajeForm,
                                      EnvioForm, FiltroClientesForm, PolizaCompletaForm,
                                      InteraccionForm, PagoForm, GenerarCuotasForm,
@@ -1318,11 +1320,28 @@ def todos_siniestros():
 def interprete_pdf():
     """Panel principal del intérprete de pólizas PDF."""
     from app.extractor.pdf_parser import ExtractorDatosPoliza
+    from app.extractor.reextraccion import consulta_obsoletas
+
+    # Archivos por tipo de documento: por defecto solo pólizas (y sin clasificar)
+    tipo = request.args.get('tipo', 'poliza')
+    conteo = dict(db.session.query(
+        ArchivoDescargado.tipo_documento, db.func.count(ArchivoDescargado.id)
+    ).join(Escaneo).filter(
+        Escaneo.usuario_id == current_user.id
+    ).group_by(ArchivoDescargado.tipo_documento).all())
+    conteo_tipos = {clave: conteo.get(clave, 0) for clave, _ in ArchivoDescargado.TIPOS_DOCUMENTO}
+    conteo_tipos['poliza'] += conteo.get(None, 0)
+    conteo_tipos['todos'] = sum(conteo.values())
 
     # Obtener archivos del usuario
-    archivos = ArchivoDescargado.query.join(Escaneo).filter(
+    consulta = ArchivoDescargado.query.join(Escaneo).filter(
         Escaneo.usuario_id == current_user.id
-    ).order_by(ArchivoDescargado.fecha_descarga.desc()).all()
+    )
+    if tipo == 'poliza':
+        consulta = consulta.filter(ArchivoDescargado.filtro_polizas())
+    elif tipo in conteo_tipos and tipo != 'todos':
+        consulta = consulta.filter(ArchivoDescargado.tipo_documento == tipo)
+    archivos = consulta.order_by(ArchivoDescargado.fecha_descarga.desc()).all()
 
     # Clasificar archivos
     pendientes = []  # Sin póliza asociada
@@ -1339,18 +1358,69 @@ def interprete_pdf():
         else:
             pendientes.append(archivo)
 
+    # Extracciones ya calculadas (durante el escaneo o en una visita anterior)
+    hashes = [a.hash_archivo for a in pendientes if a.hash_archivo]
+    extracciones = {}
+    duplicados = {}  # Copias casi idénticas de otro PDF: hash -> similitud
+    if hashes:
+        extracciones = {
+            e.hash_archivo: e for e in
+            ExtraccionPdf.query.filter(ExtraccionPdf.hash_archivo.in_(hashes)).all()
+        }
+        duplicados = {
+            f.hash_archivo: f.similitud for f in
+            FirmaTextoPdf.query.filter(FirmaTextoPdf.hash_archivo.in_(hashes),
+                                       FirmaTextoPdf.duplicado_de.isnot(None)).all()
+        }
+
     # Estadísticas
     stats = {
         'total': len(archivos),
         'pendientes': len(pendientes),
         'procesados': len(procesados),
-        'requieren_revision': sum(1 for p in procesados if p['poliza'].requiere_revision)
+        'requieren_revision': sum(1 for p in procesados if p['poliza'].requiere_revision),
+        'obsoletas': consulta_obsoletas(current_user.id).count(),
+        'diferencias': _diferencias_pendientes_usuario().count(),
     }
 
     return render_template('distribucion/interprete_pdf.html',
                           pendientes=pendientes,
                           procesados=procesados,
-                          stats=stats)
+                          extracciones=extracciones,
+                          duplicados=duplicados,
+                          stats=stats,
+                          tipo_filtro=tipo,
+                          conteo_tipos=conteo_tipos,
+                          tipos_documento=ArchivoDescargado.TIPOS_DOCUMENTO)
+
+
+@distribucion_bp.route('/interprete-pdf/tipo/<int:archivo_id>', methods=['POST'])
+@login_required
+def cambiar_tipo_documento(archivo_id):
+    """Corrige a mano el tipo de documento asignado por el clasificador."""
+    archivo = ArchivoDescargado.query.join(Escaneo).filter(
+        ArchivoDescargado.id == archivo_id,
+        Escaneo.usuario_id == current_user.id
+    ).first_or_404()
+
+    tipo = request.form.get('tipo_documento')
+    if tipo not in dict(ArchivoDescargado.TIPOS_DOCUMENTO):
+        flash('Tipo de documento no válido.', 'danger')
+        return redirect(request.referrer or url_for('distribucion.interprete_pdf'))
+
+    archivo.tipo_documento = tipo
+    if archivo.hash_archivo:
+        # El mismo PDF recibido varias veces comparte el tipo
+        ArchivoDescargado.query.filter(
+            ArchivoDescargado.hash_archivo == archivo.hash_archivo,
+            ArchivoDescargado.escaneo_id.in_(
+                db.session.query(Escaneo.id).filter(Escaneo.usuario_id == current_user.id)
+            )
+        ).update({'tipo_documento': tipo}, synchronize_session=False)
+    db.session.commit()
+
+    flash(f'{archivo.nombre_archivo}: marcado como {archivo.etiqueta_tipo_documento()}.', 'success')
+    return redirect(request.referrer or url_for('distribucion.interprete_pdf'))
 
 
 @distribucion_bp.route('/interprete-pdf/extraer/<int:archivo_id>')
@@ -1358,7 +1428,8 @@ def interprete_pdf():
 def extraer_pdf(archivo_id):
     """Extrae y muestra los datos de un PDF para revisión."""
     import os
-    from app.extractor.pdf_parser import ExtractorDatosPoliza
+    from app.extractor.pdf_parser import interpretar_pdf_archivo, opciones_extraccion
+    from app.extractor.aislamiento import ejecutar_aislado, ErrorExtraccion
 
     archivo = ArchivoDescargado.query.join(Escaneo).filter(
         ArchivoDescargado.id == archivo_id,
@@ -1372,10 +1443,39 @@ def extraer_pdf(archivo_id):
     datos_extraidos = {}
     error_extraccion = None
 
-    if os.path.exists(archivo.ruta_archivo):
+    # ?completo=1 lee todas las páginas aunque la extracción guardada sea parcial
+    completo = request.args.get('completo') == '1'
+
+    # Usar la extracción guardada si el PDF ya fue interpretado con los patrones actuales
+    extraccion = ExtraccionPdf.obtener(archivo.hash_archivo)
+    if extraccion and extraccion.es_fallida() and not completo:
+        # Ya falló (colgado, sin memoria o dañado): no se reintenta salvo con ?completo=1
+        error_extraccion = f"No se pudo interpretar el PDF ({extraccion.etiqueta_estado()}): {extraccion.error}"
+    elif extraccion and extraccion.es_vigente() and not completo:
+        datos_extraidos = extraccion.obtener_datos()
+    elif os.path.exists(archivo.ruta_archivo):
+        config = current_app.config
         try:
-            extractor = ExtractorDatosPoliza()
-            datos_extraidos = extractor.extraer_datos(archivo.ruta_archivo)
+            # En un proceso aislado: un PDF problemático no bloquea al worker web
+            datos_extraidos = ejecutar_aislado(
+                config, interpretar_pdf_archivo, archivo.ruta_archivo, archivo.hash_archivo,
+                config.get('TEXTO_CACHE_FOLDER'), config.get('TEXTO_CACHE_MAX_MB', 500) * 1024 * 1024,
+                opciones_extraccion(config), completo=completo, compania_id=archivo.compania_id
+            )
+            if datos_extraidos and archivo.hash_archivo:
+                ExtraccionPdf.guardar(archivo.hash_archivo, datos_extraidos)
+                # La extracción anterior era obsoleta o parcial: dejar registradas
+                # las diferencias, como haría la re-extracción en bloque
+                if extraccion and poliza_existente:
+                    DiferenciaExtraccion.registrar(poliza_existente, datos_extraidos,
+                                                   datos_extraidos.get('version_parser'))
+                db.session.commit()
+        except ErrorExtraccion as e:
+            if archivo.hash_archivo:
+                ExtraccionPdf.registrar_fallo(archivo.hash_archivo, e.estado, str(e))
+                db.session.commit()
+            etiqueta = dict(ExtraccionPdf.ESTADOS).get(e.estado, e.estado)
+            error_extraccion = f"No se pudo interpretar el PDF ({etiqueta}): {e}"
         except Exception as e:
             error_extraccion = str(e)
     else:
@@ -1391,6 +1491,7 @@ def extraer_pdf(archivo_id):
                           archivo=archivo,
                           datos=datos_extraidos,
                           poliza_existente=poliza_existente,
+                          casi_identico=None if poliza_existente else _casi_identico(archivo),
                           clientes=clientes,
                           companias=companias,
                           error=error_extraccion,
@@ -1508,6 +1609,16 @@ def guardar_extraccion(archivo_id):
         db.session.commit()
         flash(f'Póliza {nueva_poliza.numero_poliza or nueva_poliza.id} creada correctamente.', 'success')
 
+    # Una póliza nueva confirmada enseña al intérprete (orden de patrones y compañía del remitente)
+    if accion != 'actualizar':
+        _aprender_de_confirmacion(archivo, request.form.get('compania_clave'), datos_poliza)
+
+    # Los datos confirmados enseñan el diseño de la compañía
+    if request.form.get('aprender_plantilla') == 'on':
+        campos = _aprender_plantilla(archivo, request.form.get('compania_clave'), datos_poliza)
+        if campos:
+            flash(f'Plantilla de diseño actualizada ({campos} campo(s)).', 'info')
+
     # Registrar actividad
     LogActividad.registrar(
         current_user.id,
@@ -1534,15 +1645,125 @@ def guardar_extraccion(archivo_id):
     return redirect(url_for('distribucion.interprete_pdf'))
 
 
+def _aprender_plantilla(archivo, compania_clave, valores):
+    """
+    Aprende la plantilla de diseño de la compañía a partir de los valores
+    confirmados de un PDF. Devuelve cuántos campos se ubicaron (0 si ninguno).
+    """
+    import os
+    import fitz
+    from app.extractor.pdf_parser import ExtractorDatosPoliza
+    from app.extractor.regiones import aprender_plantilla
+
+    if compania_clave not in ExtractorDatosPoliza.COMPANIAS or not os.path.exists(archivo.ruta_archivo):
+        return 0
+    try:
+        doc = fitz.open(archivo.ruta_archivo)
+        try:
+            plantilla = aprender_plantilla(doc, valores)
+        finally:
+            doc.close()
+    except Exception as e:
+        print(f"Error al aprender plantilla de {compania_clave}: {e}")
+        return 0
+    if not plantilla:
+        return 0
+
+    PlantillaDisenoPdf.aprender(compania_clave, plantilla, current_user.id)
+    db.session.commit()
+    return len(plantilla['campos'])
+
+
+def _casi_identico(archivo):
+    """
+    Otro PDF del usuario casi idéntico a este (ver app/extractor/duplicados.py),
+    con preferencia por uno que ya tenga póliza: {'archivo', 'poliza'} o None.
+    """
+    grupo = FirmaTextoPdf.hashes_grupo(archivo.hash_archivo)
+    if not grupo:
+        return None
+    otros = ArchivoDescargado.query.join(Escaneo).filter(
+        ArchivoDescargado.hash_archivo.in_(grupo),
+        Escaneo.usuario_id == current_user.id
+    ).order_by(ArchivoDescargado.fecha_descarga).all()
+    if not otros:
+        return None
+
+    polizas = {
+        poliza.archivo_id: poliza for poliza in
+        PolizaCliente.query.filter(PolizaCliente.archivo_id.in_([otro.id for otro in otros])).all()
+    }
+    otro = next((otro for otro in otros if otro.id in polizas), otros[0])
+    return {'archivo': otro, 'poliza': polizas.get(otro.id)}
+
+
+def _texto_pdf(archivo):
+    """
+    Texto completo del PDF de un archivo, o None. Casi siempre está en la
+    caché; si no, se lee en un proceso aislado.
+    """
+    import os
+    from app.extractor.pdf_parser import leer_texto_pdf
+    from app.extractor.aislamiento import ejecutar_aislado
+    from app.extractor.cache_texto import cache_texto_app
+
+    if not os.path.exists(archivo.ruta_archivo):
+        return None
+    cache = cache_texto_app(current_app)
+    texto = cache.obtener(archivo.hash_archivo) if cache and archivo.hash_archivo else None
+    if texto is None:
+        config = current_app.config
+        try:
+            texto = ejecutar_aislado(
+                config, leer_texto_pdf, archivo.ruta_archivo, archivo.hash_archivo,
+                config.get('TEXTO_CACHE_FOLDER'), config.get('TEXTO_CACHE_MAX_MB', 500) * 1024 * 1024
+            )
+        except Exception as e:
+            print(f"Error al leer el texto de {archivo.nombre_archivo}: {e}")
+            return None
+    return texto or None
+
+
+def _aprender_de_confirmacion(archivo, compania_clave, valores):
+    """
+    Lo que el intérprete aprende de una póliza nueva confirmada: los aciertos
+    de sus patrones contra los valores confirmados y a qué compañía del
+    intérprete corresponde la Compania del remitente.
+    """
+    from app.extractor.pdf_parser import ExtractorDatosPoliza
+    from app.extractor.orden_patrones import evaluar_patrones, SIN_COMPANIA
+
+    config = current_app.config
+    aprender_orden = config.get('EXTRACCION_ORDEN_ADAPTATIVO', False)
+    # La compañía del remitente solo cuenta si el usuario la mantuvo al confirmar
+    aprender_remitente = (config.get('EXTRACCION_COMPANIA_REMITENTE', False) and archivo.compania_id
+                          and valores.get('compania_id') == archivo.compania_id)
+    if not (aprender_orden or aprender_remitente):
+        return
+    texto = _texto_pdf(archivo)
+    if not texto:
+        return
+
+    if aprender_orden:
+        if compania_clave not in ExtractorDatosPoliza.COMPANIAS:
+            compania_clave = SIN_COMPANIA
+        EstadisticaPatron.registrar(compania_clave, evaluar_patrones(texto, compania_clave, valores))
+    if aprender_remitente:
+        # Detectada en el texto, no tomada de la pista: la clave no se confirma a sí misma
+        clave = ExtractorDatosPoliza().detectar_compania(texto)
+        if clave:
+            ClaveParserCompania.registrar(archivo.compania_id, clave)
+    db.session.commit()
+
+
 @distribucion_bp.route('/interprete-pdf/lote', methods=['POST'])
 @login_required
 def procesar_lote_pdf():
-    """Procesa múltiples PDFs automáticamente."""
-    import os
-    from app.extractor.pdf_parser import ExtractorDatosPoliza
+    """Lanza en segundo plano la interpretación de múltiples PDFs."""
+    from app.extractor.lote_pdf import crear_lote
 
     cliente_id = request.form.get('cliente_id')
-    archivo_ids = request.form.getlist('archivo_ids')
+    archivo_ids = [archivo_id for archivo_id in request.form.getlist('archivo_ids') if archivo_id.isdigit()]
 
     if not cliente_id:
         flash('Debe seleccionar un cliente para asignar las pólizas.', 'warning')
@@ -1557,56 +1778,51 @@ def procesar_lote_pdf():
         flash('Cliente no válido.', 'danger')
         return redirect(url_for('distribucion.interprete_pdf'))
 
-    procesados = 0
-    errores = 0
+    lote = crear_lote(current_app._get_current_object(), current_user.id, cliente.id, archivo_ids)
+    lote.ejecutar()
 
-    for archivo_id in archivo_ids:
-        archivo = ArchivoDescargado.query.join(Escaneo).filter(
-            ArchivoDescargado.id == archivo_id,
-            Escaneo.usuario_id == current_user.id
-        ).first()
+    LogActividad.registrar(
+        current_user.id,
+        'lote_pdf',
+        f'Lote de {len(archivo_ids)} PDF(s) para {cliente.nombre_completo}',
+        request
+    )
 
-        if not archivo:
-            errores += 1
-            continue
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({
+            'id': lote.id,
+            'estado_url': url_for('distribucion.estado_lote_pdf', lote_id=lote.id)
+        }), 202
 
-        # Verificar que no tenga póliza
-        if PolizaCliente.query.filter_by(archivo_id=archivo.id).first():
-            continue
+    return redirect(url_for('distribucion.lote_pdf', lote_id=lote.id))
 
-        # Extraer datos
-        if not os.path.exists(archivo.ruta_archivo):
-            errores += 1
-            continue
 
-        try:
-            extractor = ExtractorDatosPoliza()
-            datos = extractor.extraer_datos(archivo.ruta_archivo)
-            datos_poliza = extractor.datos_para_poliza(datos)
-
-            # Crear póliza
-            nueva_poliza = PolizaCliente(
-                cliente_id=cliente.id,
-                archivo_id=archivo.id,
-                compania_id=archivo.compania_id,
-                fecha_extraccion=datetime.utcnow(),
-                **datos_poliza
-            )
-            db.session.add(nueva_poliza)
-            procesados += 1
+@distribucion_bp.route('/interprete-pdf/lote/<lote_id>')
+@login_required
+def lote_pdf(lote_id):
+    """Progreso y resultado por archivo de un lote."""
+    from app.extractor.lote_pdf import obtener_lote
 
-        except Exception as e:
-            errores += 1
-            continue
+    lote = obtener_lote(lote_id, current_user.id)
+    if not lote:
+        flash('El lote no existe o ya expiró.', 'warning')
+        return redirect(url_for('distribucion.interprete_pdf'))
 
-    db.session.commit()
+    return render_template('distribucion/lote_pdf.html',
+                          lote=lote.obtener_estado(),
+                          cliente=Cliente.query.get(lote.cliente_id))
 
-    if procesados > 0:
-        flash(f'{procesados} póliza(s) creada(s) correctamente.', 'success')
-    if errores > 0:
-        flash(f'{errores} archivo(s) con errores.', 'warning')
 
-    return redirect(url_for('distribucion.interprete_pdf'))
+@distribucion_bp.route('/interprete-pdf/lote/<lote_id>/estado')
+@login_required
+def estado_lote_pdf(lote_id):
+    """Estado de un lote en JSON (progreso y resultado de cada archivo)."""
+    from app.extractor.lote_pdf import obtener_lote
+
+    lote = obtener_lote(lote_id, current_user.id)
+    if not lote:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+    return jsonify(lote.obtener_estado())
 
 
 @distribucion_bp.route('/interprete-pdf/reextraer/<int:poliza_id>')
@@ -1614,7 +1830,8 @@ def procesar_lote_pdf():
 def reextraer_pdf(poliza_id):
     """Re-extrae datos de un PDF ya procesado para comparación."""
     import os
-    from app.extractor.pdf_parser import ExtractorDatosPoliza
+    from app.extractor.pdf_parser import interpretar_pdf_archivo, opciones_extraccion
+    from app.extractor.aislamiento import ejecutar_aislado, ErrorExtraccion
 
     poliza = PolizaCliente.query.join(Cliente).filter(
         PolizaCliente.id == poliza_id,
@@ -1630,12 +1847,119 @@ def reextraer_pdf(poliza_id):
         flash('Archivo PDF no encontrado.', 'danger')
         return redirect(url_for('distribucion.interprete_pdf'))
 
-    # Re-extraer datos
-    extractor = ExtractorDatosPoliza()
-    datos_nuevos = extractor.extraer_datos(archivo.ruta_archivo)
+    # Re-extraer datos (todas las páginas: se compara con la póliza guardada)
+    config = current_app.config
+    try:
+        datos_nuevos = ejecutar_aislado(
+            config, interpretar_pdf_archivo, archivo.ruta_archivo, archivo.hash_archivo,
+            config.get('TEXTO_CACHE_FOLDER'), config.get('TEXTO_CACHE_MAX_MB', 500) * 1024 * 1024,
+            opciones_extraccion(config), completo=True, compania_id=archivo.compania_id
+        )
+    except ErrorExtraccion as e:
+        etiqueta = dict(ExtraccionPdf.ESTADOS).get(e.estado, e.estado)
+        flash(f'No se pudo interpretar el PDF ({etiqueta}): {e}', 'danger')
+        return redirect(url_for('distribucion.interprete_pdf'))
 
     return render_template('distribucion/comparar_extraccion.html',
                           poliza=poliza,
                           archivo=archivo,
                           datos_nuevos=datos_nuevos,
                           tipos_seguro=PolizaCliente.TIPOS_SEGURO)
+
+
+def _diferencias_pendientes_usuario():
+    """Consulta de las diferencias de extracción pendientes en pólizas del usuario."""
+    return DiferenciaExtraccion.query.join(PolizaCliente).join(Cliente).filter(
+        Cliente.usuario_id == current_user.id,
+        DiferenciaExtraccion.estado == 'pendiente'
+    )
+
+
+@distribucion_bp.route('/interprete-pdf/reextraer-obsoletas', methods=['POST'])
+@login_required
+def reextraer_obsoletas():
+    """Re-extrae en segundo plano los PDFs interpretados con patrones anteriores."""
+    from app.extractor.reextraccion import crear_reextraccion
+
+    reextraccion = crear_reextraccion(current_app._get_current_object(), current_user.id)
+    if reextraccion is None:
+        flash('Ya hay una re-extracción en curso.', 'warning')
+    else:
+        reextraccion.ejecutar()
+        LogActividad.registrar(current_user.id, 'reextraccion_pdf',
+                               'Re-extracción de PDFs con versión anterior del parser', request)
+        flash('Re-extracción iniciada. Las diferencias aparecerán aquí a medida que se procesen.', 'info')
+
+    return redirect(url_for('distribucion.diferencias_extraccion'))
+
+
+@distribucion_bp.route('/interprete-pdf/reextraccion/estado')
+@login_required
+def estado_reextraccion():
+    """Progreso de la última re-extracción del usuario."""
+    from app.extractor.reextraccion import obtener_reextraccion
+
+    reextraccion = obtener_reextraccion(current_user.id)
+    if not reextraccion:
+        return jsonify({'estado': None})
+    return jsonify(reextraccion.obtener_estado())
+
+
+@distribucion_bp.route('/interprete-pdf/diferencias')
+@login_required
+def diferencias_extraccion():
+    """Diferencias pendientes entre las pólizas guardadas y la re-extracción."""
+    from app.extractor.reextraccion import consulta_obsoletas, obtener_reextraccion
+
+    diferencias = _diferencias_pendientes_usuario().order_by(
+        DiferenciaExtraccion.poliza_id, DiferenciaExtraccion.id
+    ).all()
+
+    # Agrupadas por póliza, en el orden de la consulta
+    por_poliza = {}
+    for diferencia in diferencias:
+        por_poliza.setdefault(diferencia.poliza_id, {
+            'poliza': diferencia.poliza,
+            'diferencias': []
+        })['diferencias'].append(diferencia)
+
+    reextraccion = obtener_reextraccion(current_user.id)
+
+    return render_template('distribucion/diferencias_extraccion.html',
+                          grupos=list(por_poliza.values()),
+                          total=len(diferencias),
+                          obsoletas=consulta_obsoletas(current_user.id).count(),
+                          reextraccion=reextraccion.obtener_estado() if reextraccion else None,
+                          version_parser=ExtraccionPdf.version_actual())
+
+
+@distribucion_bp.route('/interprete-pdf/diferencias/revisar', methods=['POST'])
+@login_required
+def revisar_diferencias():
+    """Aplica o descarta en bloque las diferencias seleccionadas."""
+    accion = request.form.get('accion')
+    ids = request.form.getlist('diferencia_ids')
+
+    if accion not in ('aplicar', 'descartar') or not ids:
+        flash('Seleccione al menos una diferencia.', 'warning')
+        return redirect(url_for('distribucion.diferencias_extraccion'))
+
+    diferencias = _diferencias_pendientes_usuario().filter(
+        DiferenciaExtraccion.id.in_(ids)
+    ).all()
+
+    for diferencia in diferencias:
+        if accion == 'aplicar':
+            diferencia.aplicar(current_user.id)
+        else:
+            diferencia.descartar()
+    db.session.commit()
+
+    if accion == 'aplicar':
+        LogActividad.registrar(current_user.id, 'diferencias_aplicadas',
+                               f'{len(diferencias)} diferencia(s) de extracción aplicadas', request)
+        flash(f'{len(diferencias)} cambio(s) aplicado(s) a las pólizas.', 'success')
+    else:
+        flash(f'{len(diferencias)} diferencia(s) descartada(s).', 'info')
+
+    return redirect(url_for('distribucion.diferencias_extraccion'))
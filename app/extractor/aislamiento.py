@@ -0,0 +1,347 @@
+"""
+Interpretación de PDFs en procesos aislados, con límites por archivo.
+
+Un PDF malformado o enorme puede dejar a PyMuPDF girando minutos o
+consumiendo memoria sin control. PoolExtraccion reparte los PDFs en
+procesos propios y vigila cada uno desde el proceso principal:
+
+- tiempo: si un PDF supera el límite, el proceso se mata (timeout);
+- memoria: si el RSS del proceso supera el límite, se mata (oom);
+- reciclado: cada proceso se reemplaza tras unas cuantas tareas, así la
+  memoria que MuPDF no devuelve no se acumula.
+
+Tiene la misma forma que ProcessPoolExecutor (submit devuelve un Future,
+shutdown, uso con with), así que los lotes, la re-extracción y el escaneo
+lo usan sin cambiar su lógica. Un archivo que falla lanza ErrorExtraccion
+con su estado (timeout, oom o corrupt) y el resto del lote sigue.
+"""
+
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as TiempoAgotado
+from multiprocessing.connection import wait as esperar_conexiones
+from threading import Thread, Lock, Event
+
+
+ESTADO_OK = 'ok'
+ESTADO_TIMEOUT = 'timeout'
+ESTADO_OOM = 'oom'
+ESTADO_CORRUPTO = 'corrupt'
+
+# Cada cuánto se revisan tiempo y memoria de los procesos ocupados
+INTERVALO_CONTROL = 0.05
+
+# Espera al cerrar un proceso antes de matarlo
+ESPERA_CIERRE = 2
+
+# Margen sobre el timeout del pool al esperar un resultado en ejecutar_aislado
+MARGEN_ESPERA = 10
+
+
+class ErrorExtraccion(Exception):
+    """Fallo al interpretar un PDF en un proceso aislado."""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def limites_extraccion(config):
+    """Límites configurados (argumentos de PoolExtraccion)."""
+    return {
+        'timeout': config.get('EXTRACCION_TIMEOUT_SEGUNDOS', 60),
+        'max_memoria_mb': config.get('EXTRACCION_MAX_MEMORIA_MB', 1024),
+        'max_tareas': config.get('EXTRACCION_MAX_TAREAS_PROCESO', 50),
+    }
+
+
+def _rss_bytes(pid):
+    """Memoria residente de un proceso (Linux), o None si no se puede leer."""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _bucle_trabajador(conexion, inicializador):
+    """Proceso de trabajo: ejecuta tareas hasta recibir None."""
+    if inicializador:
+        inicializador()
+    while True:
+        try:
+            tarea = conexion.recv()
+        except EOFError:
+            break
+        if tarea is None:
+            break
+        funcion, args, kwargs = tarea
+        try:
+            respuesta = (ESTADO_OK, funcion(*args, **kwargs))
+        except MemoryError:
+            respuesta = (ESTADO_OOM, 'Memoria agotada al leer el PDF')
+        except Exception as e:
+            respuesta = (ESTADO_CORRUPTO, str(e) or e.__class__.__name__)
+        try:
+            conexion.send(respuesta)
+        except Exception as e:
+            conexion.send((ESTADO_CORRUPTO, f'Resultado no serializable: {e}'))
+    conexion.close()
+
+
+class _Trabajador:
+    """Un proceso de trabajo y la tarea que tiene en curso."""
+
+    def __init__(self, contexto, inicializador):
+        self.conexion, extremo = contexto.Pipe()
+        self.proceso = contexto.Process(target=_bucle_trabajador, args=(extremo, inicializador),
+                                        daemon=True)
+        self.proceso.start()
+        extremo.close()
+        self.tareas = 0
+        self.futuro = None
+        self.inicio = None
+
+    def asignar(self, futuro, funcion, args, kwargs):
+        self.conexion.send((funcion, args, kwargs))
+        self.futuro = futuro
+        self.inicio = time.monotonic()
+        self.tareas += 1
+
+    def liberar(self):
+        futuro = self.futuro
+        self.futuro = None
+        self.inicio = None
+        return futuro
+
+    def matar(self):
+        self.proceso.kill()
+        self.proceso.join()
+        self.conexion.close()
+
+    def cerrar(self):
+        try:
+            self.conexion.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.proceso.join(ESPERA_CIERRE)
+        if self.proceso.is_alive():
+            self.proceso.kill()
+            self.proceso.join()
+        self.conexion.close()
+
+
+class PoolExtraccion:
+    """
+    Pool de procesos aislados para interpretar PDFs.
+
+    Las funciones enviadas deben ser de módulo (se envían por pickle) y
+    no usar la sesión de BD, como en ProcessPoolExecutor.
+    """
+
+    def __init__(self, procesos=1, timeout=60, max_memoria_mb=1024, max_tareas=50,
+                 inicializador=None):
+        self.procesos = max(1, procesos)
+        self.timeout = timeout  # Segundos por PDF (0 = sin límite)
+        self.max_memoria = max_memoria_mb * 1024 * 1024 if max_memoria_mb else 0
+        self.max_tareas = max_tareas  # Tareas por proceso antes de reciclarlo (0 = sin límite)
+        self.inicializador = inicializador
+        self._contexto = multiprocessing.get_context()
+        self._trabajadores = []
+        self._cola = deque()
+        self._lock = Lock()
+        self._hay_trabajo = Event()
+        self._cerrado = False
+        self._hilo = Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+
+    def submit(self, funcion, *args, **kwargs):
+        """Encola una tarea. Devuelve un Future con el resultado o ErrorExtraccion."""
+        futuro = Future()
+        with self._lock:
+            if self._cerrado:
+                raise RuntimeError('El pool de extracción está cerrado')
+            self._cola.append((futuro, funcion, args, kwargs))
+        self._hay_trabajo.set()
+        return futuro
+
+    @property
+    def cerrado(self):
+        """True tras shutdown o si el hilo de control se detuvo por un error."""
+        return self._cerrado
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """Cierra el pool; con cancel_futures descarta las tareas sin empezar."""
+        with self._lock:
+            self._cerrado = True
+            if cancel_futures:
+                while self._cola:
+                    self._cola.popleft()[0].cancel()
+        self._hay_trabajo.set()
+        if wait:
+            self._hilo.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown(wait=True)
+        return False
+
+    def _siguiente_tarea(self):
+        with self._lock:
+            while self._cola:
+                tarea = self._cola.popleft()
+                if tarea[0].set_running_or_notify_cancel():
+                    return tarea
+        return None
+
+    def _asignar_tareas(self):
+        """Da tareas a los procesos libres, creando procesos hasta el máximo."""
+        for trabajador in [t for t in self._trabajadores if t.futuro is None]:
+            tarea = self._siguiente_tarea()
+            if not tarea:
+                return
+            self._entregar(trabajador, tarea)
+        while len(self._trabajadores) < self.procesos:
+            tarea = self._siguiente_tarea()
+            if not tarea:
+                return
+            trabajador = _Trabajador(self._contexto, self.inicializador)
+            self._trabajadores.append(trabajador)
+            self._entregar(trabajador, tarea)
+
+    def _entregar(self, trabajador, tarea):
+        """
+        Envía la tarea al proceso. Si el proceso ya no existe (lo mató el
+        sistema mientras estaba libre) se reemplaza y se reintenta una vez;
+        una tarea que no se puede enviar falla solo su Future.
+        """
+        futuro = tarea[0]
+        for intento in range(2):
+            try:
+                trabajador.asignar(*tarea)
+                return
+            except OSError:
+                trabajador.matar()
+                self._trabajadores.remove(trabajador)
+                if intento:
+                    futuro.set_exception(RuntimeError('No se pudo enviar el PDF al proceso de extracción'))
+                    return
+                trabajador = _Trabajador(self._contexto, self.inicializador)
+                self._trabajadores.append(trabajador)
+            except Exception as e:
+                # Argumentos que no se pueden enviar (pickle): el proceso sigue sano
+                futuro.set_exception(e)
+                return
+
+    def _descartar(self, trabajador, estado, mensaje):
+        """Mata un proceso con su tarea en curso y la marca como fallida."""
+        trabajador.matar()
+        self._trabajadores.remove(trabajador)
+        trabajador.liberar().set_exception(ErrorExtraccion(estado, mensaje))
+
+    def _recibir(self, trabajador):
+        try:
+            estado, resultado = trabajador.conexion.recv()
+        except (EOFError, OSError):
+            # El proceso murió (segfault de MuPDF o lo mató el sistema por memoria)
+            trabajador.proceso.join()
+            codigo = trabajador.proceso.exitcode
+            self._trabajadores.remove(trabajador)
+            estado = ESTADO_OOM if codigo == -9 else ESTADO_CORRUPTO
+            trabajador.liberar().set_exception(
+                ErrorExtraccion(estado, f'El proceso de extracción terminó inesperadamente ({codigo})')
+            )
+            return
+
+        futuro = trabajador.liberar()
+        if estado == ESTADO_OK:
+            futuro.set_result(resultado)
+        else:
+            futuro.set_exception(ErrorExtraccion(estado, resultado))
+
+        # Reciclado: un proceso con muchas tareas se reemplaza por uno nuevo
+        if self.max_tareas and trabajador.tareas >= self.max_tareas:
+            trabajador.cerrar()
+            self._trabajadores.remove(trabajador)
+
+    def _vigilar(self, trabajador):
+        """Mata el proceso si su tarea excede el tiempo o la memoria."""
+        if self.timeout and time.monotonic() - trabajador.inicio > self.timeout:
+            self._descartar(trabajador, ESTADO_TIMEOUT,
+                            f'Tiempo agotado ({self.timeout} s)')
+            return
+        if self.max_memoria:
+            rss = _rss_bytes(trabajador.proceso.pid)
+            if rss and rss > self.max_memoria:
+                self._descartar(trabajador, ESTADO_OOM,
+                                f'Memoria excedida ({rss // (1024 * 1024)} MB)')
+
+    def _bucle(self):
+        """
+        Hilo de control. Si falla, el pool queda cerrado y todas las tareas
+        pendientes fallan: nadie queda esperando un Future que no llega.
+        """
+        try:
+            self._controlar()
+        except Exception as e:
+            print(f"  [PDF] Error en el control del pool de extracción: {e}")
+            with self._lock:
+                self._cerrado = True
+                tareas = [tarea[0] for tarea in self._cola]
+                self._cola.clear()
+            tareas += [t.futuro for t in self._trabajadores if t.futuro is not None]
+            for trabajador in self._trabajadores:
+                try:
+                    trabajador.matar()
+                except Exception:
+                    pass
+            self._trabajadores = []
+            for futuro in tareas:
+                if not futuro.done():
+                    futuro.set_exception(RuntimeError(f'El pool de extracción se detuvo: {e}'))
+
+    def _controlar(self):
+        """Asigna tareas, recoge resultados y vigila límites."""
+        while True:
+            self._asignar_tareas()
+            ocupados = [t for t in self._trabajadores if t.futuro is not None]
+            if not ocupados:
+                with self._lock:
+                    terminado = self._cerrado and not self._cola
+                if terminado:
+                    break
+                self._hay_trabajo.wait(INTERVALO_CONTROL)
+                self._hay_trabajo.clear()
+                continue
+
+            listos = esperar_conexiones([t.conexion for t in ocupados], timeout=INTERVALO_CONTROL)
+            for trabajador in ocupados:
+                if trabajador.conexion in listos:
+                    self._recibir(trabajador)
+                else:
+                    self._vigilar(trabajador)
+
+        for trabajador in self._trabajadores:
+            trabajador.cerrar()
+        self._trabajadores = []
+
+
+def ejecutar_aislado(config, funcion, *args, **kwargs):
+    """
+    Ejecuta una sola interpretación en un proceso aislado y espera el
+    resultado. Para peticiones web: un PDF problemático no bloquea al
+    worker de gunicorn más allá del timeout. Lanza ErrorExtraccion.
+    """
+    limites = limites_extraccion(config)
+    pool = PoolExtraccion(procesos=1, **limites)
+    espera = limites['timeout'] + MARGEN_ESPERA if limites['timeout'] else None
+    try:
+        return pool.submit(funcion, *args, **kwargs).result(timeout=espera)
+    except TiempoAgotado:
+        raise ErrorExtraccion(ESTADO_TIMEOUT, f"Tiempo agotado ({limites['timeout']} s)")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,387 @@
+"""
+Banco de pruebas del intérprete de pólizas.
+
+Genera con PyMuPDF un corpus sintético de pólizas (de cada compañía de
+ExtractorDatosPoliza.COMPANIAS, con distinta cantidad de páginas y valores
+plantados conocidos) y mide el extractor sobre él: PDFs por segundo, tiempo
+de lectura del texto frente a tiempo de patrones, tiempo y tasa de acierto
+de cada patrón y precisión campo a campo contra los valores plantados.
+
+El resultado es un diccionario serializable a JSON, para guardar cada
+corrida y compararla con las anteriores (ver benchmark_parser.py).
+"""
+
+import json
+import os
+import platform
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import fitz  # PyMuPDF
+
+from app.extractor.pdf_parser import ExtractorDatosPoliza
+from app.extractor.cache_texto import VERSION_PYMUPDF
+
+
+ARCHIVO_MANIFIESTO = 'corpus.json'
+
+# Número de póliza con el formato que espera el patrón de cada compañía
+FORMATOS_NUMERO = {
+    'mapfre': lambda r: f'{r.randint(2020, 2026)}-{r.randint(100000, 999999)}',
+    'la_caja': lambda r: str(r.randint(10000, 99999999)),
+    'federacion_patronal': lambda r: f'{r.choice("ABCH")}{r.randint(100000, 9999999)}',
+    'sancor': lambda r: str(r.randint(1000000, 99999999)),
+    'allianz': lambda r: str(r.randint(1000000000, 9999999999)),
+    'zurich': lambda r: f'ZU{r.randint(100000, 99999999)}',
+    'sura': lambda r: str(r.randint(10000000, 999999999)),
+    'la_segunda': lambda r: str(r.randint(100000, 9999999)),
+}
+
+# Variantes de etiqueta por campo, en el formato en que aparecen en las pólizas
+ETIQUETAS = {
+    'numero_poliza': ['Póliza: {}', 'Póliza Nº {}', 'POLIZA N° {}'],
+    'fecha_vigencia_desde': ['Vigencia desde: {}', 'Inicio de vigencia: {}', 'Desde el {}'],
+    'fecha_vigencia_hasta': ['Vigencia hasta: {}', 'Vencimiento: {}', 'Hasta el {}'],
+    'prima_anual': ['Prima total: $ {}', 'Premio: $ {}', 'Total a pagar: $ {}'],
+    'suma_asegurada': ['Suma asegurada: $ {}', 'Capital asegurado: $ {}'],
+    'asegurado_nombre': ['Asegurado: {}', 'Tomador: {}'],
+    'asegurado_documento': ['DNI: {}', 'Documento: {}'],
+    'vehiculo_marca': ['Marca: {}'],
+    'vehiculo_modelo': ['Modelo: {}'],
+    'vehiculo_anio': ['Año: {}'],
+    'vehiculo_patente': ['Patente: {}', 'Dominio: {}'],
+    'vehiculo_chasis': ['Chasis: {}'],
+    'vehiculo_motor': ['Motor: {}'],
+}
+
+# Palabra clave de cada tipo de seguro plantado (ver PALABRAS_TIPO_SEGURO)
+RAMOS = {
+    'auto': 'Seguro de automotor',
+    'hogar': 'Seguro integral de hogar',
+    'vida': 'Seguro de vida colectivo',
+}
+
+NOMBRES = ['Juan', 'María', 'Carlos', 'Lucía', 'Jorge', 'Ana', 'Raúl', 'Sofía']
+APELLIDOS = ['Pérez', 'Gómez', 'Fernández', 'Rodríguez', 'López', 'Martínez', 'Díaz', 'Núñez']
+VEHICULOS = [('Ford', 'Ranger XL'), ('Toyota', 'Hilux SRV'), ('Fiat', 'Cronos Drive'),
+             ('Volkswagen', 'Amarok'), ('Chevrolet', 'Onix LT')]
+
+# Texto de relleno de las páginas de anexos (condiciones generales)
+RELLENO = [
+    'Las condiciones generales de la presente forman parte del contrato.',
+    'El asegurador indemnizará los daños según las cláusulas particulares.',
+    'Quedan excluidos los siniestros ocurridos fuera del territorio nacional.',
+    'El tomador deberá comunicar cualquier agravación del riesgo.',
+    'Cláusula de cobertura adicional para granizo y cristales.',
+]
+
+LINEAS_POR_PAGINA = 55
+
+
+def _monto(valor):
+    """Monto con formato argentino: 12.345,67."""
+    entero, decimales = f'{valor:.2f}'.split('.')
+    return f'{int(entero):,}'.replace(',', '.') + ',' + decimales
+
+
+def _valores(r, compania):
+    """Valores plantados de una póliza, ya normalizados como los compara el banco."""
+    desde = date(2024, 1, 1) + timedelta(days=r.randint(0, 700))
+    ramo = r.choice(list(RAMOS))
+    valores = {
+        'compania_detectada': compania,
+        'tipo_seguro': ramo,
+        'numero_poliza': FORMATOS_NUMERO[compania](r),
+        'fecha_vigencia_desde': desde.isoformat(),
+        'fecha_vigencia_hasta': (desde + timedelta(days=365)).isoformat(),  # replace(year=...) falla el 29/02
+        'prima_anual': f'{Decimal(r.randint(5000, 900000)) / 100:.2f}',
+        'suma_asegurada': f'{Decimal(r.randint(1000, 50000) * 1000):.2f}',
+        'asegurado_nombre': f'{r.choice(NOMBRES)} {r.choice(APELLIDOS)}',
+        'asegurado_documento': str(r.randint(10000000, 45000000)),
+    }
+    if ramo == 'auto':
+        marca, modelo = r.choice(VEHICULOS)
+        valores.update({
+            'vehiculo_marca': marca,
+            'vehiculo_modelo': modelo,
+            'vehiculo_anio': str(r.randint(2005, 2025)),
+            'vehiculo_patente': f'{"".join(r.choice("ABCDEFGH") for _ in range(2))}'
+                                f'{r.randint(100, 999)}{"".join(r.choice("JKLMN") for _ in range(2))}',
+            'vehiculo_chasis': ''.join(r.choice('ABCDEFGHJKLMNPRSTUVWXYZ0123456789') for _ in range(17)),
+            'vehiculo_motor': f'MT{r.randint(100000, 999999)}',
+        })
+    return valores
+
+
+def _texto_campo(r, campo, valor):
+    """Línea del PDF con el valor en el formato del documento."""
+    if campo in ('fecha_vigencia_desde', 'fecha_vigencia_hasta'):
+        valor = datetime.strptime(valor, '%Y-%m-%d').strftime('%d/%m/%Y')
+    elif campo in ('prima_anual', 'suma_asegurada'):
+        valor = _monto(Decimal(valor))
+    return r.choice(ETIQUETAS[campo]).format(valor)
+
+
+def _escribir_pagina(doc, lineas):
+    pagina = doc.new_page()
+    pagina.insert_text((40, 50), '\n'.join(lineas), fontsize=9)
+
+
+def generar_pdf(r, compania, paginas):
+    """Genera una póliza sintética. Devuelve (bytes del PDF, valores plantados)."""
+    valores = _valores(r, compania)
+    nombre = ExtractorDatosPoliza.COMPANIAS[compania]['patrones_nombre'][0]
+
+    portada = [nombre.upper() + ' SEGUROS', RAMOS[valores['tipo_seguro']], '']
+    for campo in ('numero_poliza', 'asegurado_nombre', 'asegurado_documento',
+                  'fecha_vigencia_desde', 'fecha_vigencia_hasta', 'prima_anual', 'suma_asegurada'):
+        portada.append(_texto_campo(r, campo, valores[campo]))
+
+    # Los datos del vehículo van en la segunda página si la hay
+    vehiculo = [_texto_campo(r, campo, valores[campo])
+                for campo in ETIQUETAS if campo.startswith('vehiculo_') and campo in valores]
+
+    doc = fitz.open()
+    if paginas > 1:
+        _escribir_pagina(doc, portada)
+        _escribir_pagina(doc, ['Detalle del bien asegurado', ''] + vehiculo)
+    else:
+        _escribir_pagina(doc, portada + [''] + vehiculo)
+    for numero in range(2, paginas):
+        _escribir_pagina(doc, [f'Anexo {numero - 1}'] +
+                         [r.choice(RELLENO) for _ in range(LINEAS_POR_PAGINA)])
+    contenido = doc.tobytes()
+    doc.close()
+    return contenido, valores
+
+
+def generar_corpus(directorio, por_compania=10, max_paginas=40, semilla=1):
+    """
+    Escribe el corpus y su manifiesto (corpus.json con los valores plantados).
+
+    Con la misma semilla se generan los mismos PDFs, así dos corridas del
+    banco comparan exactamente los mismos documentos.
+    """
+    r = random.Random(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    documentos = []
+    for compania in ExtractorDatosPoliza.COMPANIAS:
+        for indice in range(por_compania):
+            # Mayoría de pólizas cortas y algunas largas (flotas con anexos)
+            paginas = r.choice([1, 1, 2, 3, 5]) if r.random() < 0.8 else r.randint(6, max_paginas)
+            contenido, valores = generar_pdf(r, compania, paginas)
+            archivo = f'{compania}_{indice:03d}.pdf'
+            with open(os.path.join(directorio, archivo), 'wb') as f:
+                f.write(contenido)
+            documentos.append({'archivo': archivo, 'paginas': paginas, 'valores': valores})
+
+    manifiesto = {
+        'semilla': semilla,
+        'por_compania': por_compania,
+        'max_paginas': max_paginas,
+        'documentos': documentos,
+    }
+    with open(os.path.join(directorio, ARCHIVO_MANIFIESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    return manifiesto
+
+
+def _normalizar(valor):
+    """Valor extraído comparable con el plantado."""
+    if valor is None:
+        return None
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return f'{valor:.2f}'
+    return ' '.join(str(valor).split()).upper()
+
+
+class BancoParser:
+    """Mide ExtractorDatosPoliza sobre un corpus generado con generar_corpus."""
+
+    def __init__(self, directorio, perezosa=False, max_paginas=0):
+        self.directorio = directorio
+        self.perezosa = perezosa
+        self.max_paginas = max_paginas
+        with open(os.path.join(directorio, ARCHIVO_MANIFIESTO), encoding='utf-8') as f:
+            self.manifiesto = json.load(f)
+
+    def ejecutar(self, repeticiones=1):
+        """Corre el banco y devuelve el informe."""
+        tiempo_texto = 0.0
+        tiempo_patrones = 0.0
+        pdfs = 0
+        campos = {}  # campo -> {'aciertos', 'total', 'fallos' (ejemplos)}
+        companias = {}
+        patrones = self._patrones_vacios()
+
+        for repeticion in range(repeticiones):
+            for documento in self.manifiesto['documentos']:
+                ruta = os.path.join(self.directorio, documento['archivo'])
+                extractor = ExtractorDatosPoliza(perezosa=self.perezosa, max_paginas=self.max_paginas)
+
+                inicio = time.perf_counter()
+                texto = extractor.extraer_texto_pdf(ruta)
+                medio = time.perf_counter()
+                datos = extractor._interpretar_texto(texto) if texto else {}
+                fin = time.perf_counter()
+
+                tiempo_texto += medio - inicio
+                tiempo_patrones += fin - medio
+                pdfs += 1
+
+                # Precisión y perfil de patrones: una sola vez por documento
+                if repeticion == 0:
+                    self._comparar(documento, datos, campos, companias)
+                    self._perfilar_patrones(texto, datos, patrones)
+
+        total = tiempo_texto + tiempo_patrones
+        documentos = len(self.manifiesto['documentos'])
+        return {
+            'fecha': datetime.utcnow().isoformat(timespec='seconds'),
+            'version_parser': ExtractorDatosPoliza.VERSION_PARSER,
+            'version_pymupdf': VERSION_PYMUPDF,
+            'python': platform.python_version(),
+            'configuracion': {
+                'perezosa': self.perezosa,
+                'max_paginas': self.max_paginas,
+                'repeticiones': repeticiones,
+                'corpus': {clave: self.manifiesto[clave]
+                           for clave in ('semilla', 'por_compania', 'max_paginas')},
+                'documentos': documentos,
+                'paginas': sum(d['paginas'] for d in self.manifiesto['documentos']),
+            },
+            'rendimiento': {
+                'pdfs': pdfs,
+                'segundos': round(total, 4),
+                'pdfs_por_segundo': round(pdfs / total, 2) if total else None,
+                'segundos_get_text': round(tiempo_texto, 4),
+                'segundos_patrones': round(tiempo_patrones, 4),
+                'fraccion_get_text': round(tiempo_texto / total, 3) if total else None,
+            },
+            'precision': {
+                'global': self._tasa(sum(c['aciertos'] for c in campos.values()),
+                                     sum(c['total'] for c in campos.values())),
+                'campos': {campo: {**c, 'tasa': self._tasa(c['aciertos'], c['total'])}
+                           for campo, c in sorted(campos.items())},
+                'companias': {clave: {**c, 'tasa': self._tasa(c['aciertos'], c['total'])}
+                              for clave, c in sorted(companias.items())},
+            },
+            'patrones': self._resumen_patrones(patrones, documentos),
+        }
+
+    @staticmethod
+    def _tasa(aciertos, total):
+        return round(aciertos / total, 3) if total else None
+
+    def _comparar(self, documento, datos, campos, companias):
+        """Suma aciertos por campo y por compañía contra los valores plantados."""
+        compania = documento['valores']['compania_detectada']
+        por_compania = companias.setdefault(compania, {'aciertos': 0, 'total': 0})
+        for campo, esperado in documento['valores'].items():
+            obtenido = _normalizar(datos.get(campo))
+            acierto = obtenido == _normalizar(esperado)
+            resumen = campos.setdefault(campo, {'aciertos': 0, 'total': 0, 'fallos': []})
+            resumen['total'] += 1
+            por_compania['total'] += 1
+            if acierto:
+                resumen['aciertos'] += 1
+                por_compania['aciertos'] += 1
+            elif len(resumen['fallos']) < 5:
+                resumen['fallos'].append({'archivo': documento['archivo'],
+                                          'esperado': esperado, 'obtenido': obtenido})
+
+    def _patrones_vacios(self):
+        """Acumuladores por patrón: genéricos de cada campo y específicos de compañía."""
+        patrones = {}
+        for campo, compilados in ExtractorDatosPoliza.ESCANER.compilados.items():
+            for prioridad, compilado in enumerate(compilados):
+                patrones[(campo, prioridad)] = {
+                    'campo': campo, 'prioridad': prioridad, 'patron': compilado.pattern,
+                    'compilado': compilado, 'segundos': 0.0, 'evaluados': 0,
+                    'coincidencias': 0, 'elegido': 0,
+                }
+        for compania, compilado in ExtractorDatosPoliza.PATRONES_POLIZA_COMPANIA.items():
+            patrones[('numero_poliza', compania)] = {
+                'campo': 'numero_poliza', 'prioridad': compania, 'patron': compilado.pattern,
+                'compilado': compilado, 'segundos': 0.0, 'evaluados': 0,
+                'coincidencias': 0, 'elegido': 0,
+            }
+        return patrones
+
+    def _perfilar_patrones(self, texto, datos, patrones):
+        """
+        Tiempo de re.search de cada patrón sobre el texto del documento.
+
+        Es una medida aislada por patrón (el escáner real recorre el texto una
+        sola vez), útil para encontrar los patrones caros o que nunca aciertan.
+        'elegido' cuenta las veces que el patrón fue el primero en coincidir,
+        es decir, el que habría dado el valor del campo.
+        """
+        if not texto:
+            return
+        for campo, compilados in ExtractorDatosPoliza.ESCANER.compilados.items():
+            elegido = False
+            for prioridad in range(len(compilados)):
+                if self._medir_patron(patrones[(campo, prioridad)], texto) and not elegido:
+                    patrones[(campo, prioridad)]['elegido'] += 1
+                    elegido = True
+
+        # El patrón específico solo se aplica si se detectó esa compañía
+        compania = datos.get('compania_detectada')
+        if ('numero_poliza', compania) in patrones:
+            clave = ('numero_poliza', compania)
+            if self._medir_patron(patrones[clave], texto):
+                patrones[clave]['elegido'] += 1
+
+    @staticmethod
+    def _medir_patron(acumulado, texto):
+        inicio = time.perf_counter()
+        coincide = acumulado['compilado'].search(texto) is not None
+        acumulado['segundos'] += time.perf_counter() - inicio
+        acumulado['evaluados'] += 1
+        if coincide:
+            acumulado['coincidencias'] += 1
+        return coincide
+
+    def _resumen_patrones(self, patrones, documentos):
+        resumen = []
+        for acumulado in patrones.values():
+            evaluados = acumulado['evaluados']
+            resumen.append({
+                'campo': acumulado['campo'],
+                'prioridad': acumulado['prioridad'],
+                'patron': acumulado['patron'],
+                'evaluados': evaluados,
+                'milisegundos': round(acumulado['segundos'] * 1000, 3),
+                'microsegundos_por_pdf': round(acumulado['segundos'] * 1e6 / evaluados, 2) if evaluados else None,
+                'coincidencias': acumulado['coincidencias'],
+                'tasa_coincidencia': self._tasa(acumulado['coincidencias'], evaluados),
+                'elegido': acumulado['elegido'],
+            })
+        return resumen
+
+
+def comparar_informes(anterior, actual):
+    """
+    Diferencias entre dos informes: rendimiento y precisión por campo.
+
+    Devuelve una lista de (métrica, valor anterior, valor actual).
+    """
+    filas = [
+        ('version_parser', anterior.get('version_parser'), actual.get('version_parser')),
+    ]
+    for clave in ('pdfs_por_segundo', 'segundos_get_text', 'segundos_patrones'):
+        filas.append((clave, anterior['rendimiento'].get(clave), actual['rendimiento'].get(clave)))
+    filas.append(('precision.global', anterior['precision'].get('global'), actual['precision'].get('global')))
+    campos = sorted(set(anterior['precision']['campos']) | set(actual['precision']['campos']))
+    for campo in campos:
+        filas.append((
+            f'precision.{campo}',
+            anterior['precision']['campos'].get(campo, {}).get('tasa'),
+            actual['precision']['campos'].get(campo, {}).get('tasa'),
+        ))
+    return filas
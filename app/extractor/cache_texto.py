@@ -0,0 +1,172 @@
+"""
+Caché en disco del texto extraído de los PDFs.
+
+Guarda el texto que devuelve PyMuPDF, comprimido con zlib, en un archivo
+por PDF: <directorio>/<hash[:2]>/<hash>-<version>.txt.z. La clave incluye la
+versión de PyMuPDF porque otra versión puede extraer el texto distinto. El
+tamaño total se limita expulsando primero los archivos usados hace más
+tiempo (cada lectura actualiza la fecha de modificación).
+
+Junto al texto se guardan los textos leídos por región con la plantilla de
+la compañía (<hash>-<version>-<huella de la plantilla>.reg.z), así un PDF
+cuyo texto sale de la caché tampoco se abre para leer las regiones.
+"""
+
+import json
+import os
+import tempfile
+import zlib
+from threading import Lock
+
+import fitz  # PyMuPDF
+
+
+VERSION_PYMUPDF = getattr(fitz, 'VersionBind', None) or getattr(fitz, '__version__', 'desconocida')
+
+# Al superar el máximo se expulsa hasta quedar en esta fracción
+FRACCION_TRAS_EXPULSION = 0.9
+
+
+class CacheTexto:
+    """Texto extraído por hash de archivo, comprimido y con expulsión LRU."""
+
+    def __init__(self, directorio, max_bytes=500 * 1024 * 1024, version=VERSION_PYMUPDF):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.version = version
+        self._lock = Lock()
+        self._tamano_total = None  # Se calcula al primer guardado
+
+    def ruta(self, hash_archivo):
+        return os.path.join(self.directorio, hash_archivo[:2],
+                            f'{hash_archivo}-{self.version}.txt.z')
+
+    def ruta_regiones(self, hash_archivo, huella):
+        return os.path.join(self.directorio, hash_archivo[:2],
+                            f'{hash_archivo}-{self.version}-{huella}.reg.z')
+
+    def obtener(self, hash_archivo):
+        """Texto guardado para el hash, o None."""
+        if not hash_archivo:
+            return None
+        ruta = self.ruta(hash_archivo)
+        try:
+            with open(ruta, 'rb') as f:
+                texto = zlib.decompress(f.read()).decode('utf-8', errors='surrogatepass')
+            os.utime(ruta)  # Marca de uso reciente para la expulsión
+            return texto
+        except (OSError, zlib.error, UnicodeDecodeError):
+            return None
+
+    def obtener_regiones(self, hash_archivo, huella):
+        """Textos por región guardados para el hash y la plantilla, o None."""
+        if not hash_archivo:
+            return None
+        ruta = self.ruta_regiones(hash_archivo, huella)
+        try:
+            with open(ruta, 'rb') as f:
+                textos = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            os.utime(ruta)
+            return textos
+        except (OSError, zlib.error, ValueError):
+            return None
+
+    def guardar(self, hash_archivo, texto):
+        """Guarda el texto de un PDF. Nunca lanza: la caché es opcional."""
+        if not hash_archivo or texto is None:
+            return
+        self._escribir(self.ruta(hash_archivo),
+                       zlib.compress(texto.encode('utf-8', errors='surrogatepass'), 6))
+
+    def guardar_regiones(self, hash_archivo, huella, textos):
+        """Guarda los textos por región ({} si la plantilla no se aplica al PDF)."""
+        if not hash_archivo or textos is None:
+            return
+        self._escribir(self.ruta_regiones(hash_archivo, huella),
+                       zlib.compress(json.dumps(textos).encode('utf-8'), 6))
+
+    def _escribir(self, ruta, datos):
+        """Escribe una entrada ya comprimida y expulsa si se pasa del máximo."""
+        temporal = None
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            anterior = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+            # Escritura atómica: otro proceso nunca lee un archivo a medias
+            fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+        except OSError:
+            # Disco lleno o similar: no dejar el temporal, que la expulsión no ve
+            if temporal:
+                try:
+                    os.unlink(temporal)
+                except OSError:
+                    pass
+            return
+
+        with self._lock:
+            if self._tamano_total is None:
+                self._tamano_total = self._medir()
+            else:
+                self._tamano_total += len(datos) - anterior
+            if self.max_bytes and self._tamano_total > self.max_bytes:
+                self._expulsar()
+
+    def _archivos(self):
+        """(mtime, tamaño, ruta) de cada entrada de la caché."""
+        archivos = []
+        if not os.path.isdir(self.directorio):
+            return archivos
+        for subdirectorio in os.scandir(self.directorio):
+            if not subdirectorio.is_dir():
+                continue
+            for entrada in os.scandir(subdirectorio.path):
+                if not entrada.name.endswith(('.txt.z', '.reg.z')):
+                    continue
+                try:
+                    estado = entrada.stat()
+                except OSError:
+                    continue
+                archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+        return archivos
+
+    def _medir(self):
+        return sum(tamano for _, tamano, _ in self._archivos())
+
+    def _expulsar(self):
+        """Borra los archivos menos usados hasta bajar del límite. Con el lock tomado."""
+        # Se vuelve a medir: otros procesos pueden compartir el directorio
+        archivos = sorted(self._archivos())
+        total = sum(tamano for _, tamano, _ in archivos)
+        objetivo = self.max_bytes * FRACCION_TRAS_EXPULSION
+        for _, tamano, ruta in archivos:
+            if total <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamano
+            except OSError:
+                continue
+        self._tamano_total = total
+
+
+# Una caché por directorio y proceso
+_caches = {}
+_lock_caches = Lock()
+
+
+def obtener_cache_texto(directorio, max_bytes):
+    """Caché de un directorio, creada la primera vez en cada proceso."""
+    with _lock_caches:
+        if directorio not in _caches:
+            _caches[directorio] = CacheTexto(directorio, max_bytes)
+    return _caches[directorio]
+
+
+def cache_texto_app(app):
+    """Caché de texto configurada para la aplicación, o None si está desactivada."""
+    directorio = app.config.get('TEXTO_CACHE_FOLDER')
+    if not directorio:
+        return None
+    return obtener_cache_texto(directorio, app.config.get('TEXTO_CACHE_MAX_MB', 500) * 1024 * 1024)
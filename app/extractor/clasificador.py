@@ -0,0 +1,149 @@
+"""
+Clasificador rápido de PDFs por la primera página.
+
+Muchos PDFs descargados no son pólizas (facturas, recibos de pago,
+folletos) y no vale la pena interpretarlos. El clasificador mira solo el
+texto de la primera página, los metadatos y la cantidad de páginas, y
+puntúa palabras clave por tipo más las anclas de ExtractorDatosPoliza
+(los campos de PATRONES que aparecen en la página). Cuesta una página de
+get_text, no el documento entero.
+"""
+
+import unicodedata
+
+import fitz  # PyMuPDF
+
+from app.extractor.pdf_parser import ExtractorDatosPoliza
+
+
+TIPO_POLIZA = 'poliza'
+TIPO_ENDOSO = 'endoso'
+TIPO_RECIBO = 'recibo'
+TIPO_OTRO = 'otro'
+
+# Palabras clave (sin tildes, en minúsculas) y su peso por tipo de documento.
+# 'poliza' no puntúa por sí sola: aparece también en endosos y recibos.
+PALABRAS_DOCUMENTO = {
+    TIPO_POLIZA: {
+        'frente de poliza': 3,
+        'condiciones particulares': 2,
+        'certificado de cobertura': 2,
+        'suma asegurada': 1,
+        'vigencia': 1,
+        'tomador': 1,
+        'coberturas': 1,
+        'riesgo cubierto': 1,
+    },
+    TIPO_ENDOSO: {
+        'endoso': 5,
+        'suplemento': 3,
+        'modificacion de poliza': 4,
+        'anexo modificatorio': 4,
+    },
+    TIPO_RECIBO: {
+        'recibo': 2,
+        'factura': 3,
+        'comprobante de pago': 4,
+        'constancia de pago': 4,
+        'cupon de pago': 4,
+        'importe abonado': 3,
+        'total pagado': 3,
+        'pago recibido': 3,
+    },
+    TIPO_OTRO: {
+        'promocion': 2,
+        'descuento': 2,
+        'oferta': 2,
+        'sorteo': 2,
+        'newsletter': 3,
+        'suscrib': 2,
+        'beneficios exclusivos': 3,
+    },
+}
+
+# Campos de PATRONES encontrados en la primera página: cada uno suma a póliza
+MAX_ANCLAS = 4
+
+# Documentos largos suelen ser pólizas (condiciones generales, anexos)
+PAGINAS_DOCUMENTO_LARGO = 3
+
+# Por debajo de este puntaje el documento queda sin clasificar (se interpreta):
+# una póliza sin palabras clave no debe perderse como 'otro'
+PUNTAJE_MINIMO = 3
+
+# Ante empate gana el primero
+ORDEN_DESEMPATE = [TIPO_POLIZA, TIPO_ENDOSO, TIPO_RECIBO, TIPO_OTRO]
+
+
+def _normalizar(texto):
+    """Minúsculas y sin tildes, para comparar palabras clave."""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def puntajes_documento(texto, paginas=1, metadatos=''):
+    """
+    Puntaje de cada tipo para el texto de la primera página.
+
+    Una palabra clave en los metadatos (título, asunto, palabras clave)
+    cuenta doble.
+    """
+    texto_normalizado = _normalizar(texto)
+    metadatos_normalizados = _normalizar(metadatos)
+
+    puntajes = {}
+    for tipo, palabras in PALABRAS_DOCUMENTO.items():
+        puntaje = 0
+        for palabra, peso in palabras.items():
+            if palabra in texto_normalizado:
+                puntaje += peso
+            if palabra in metadatos_normalizados:
+                puntaje += peso * 2
+        puntajes[tipo] = puntaje
+
+    campos = ExtractorDatosPoliza.ESCANER.buscar(texto or '')
+    anclas = sum(1 for valor in campos.values() if valor)
+    puntajes[TIPO_POLIZA] += min(anclas, MAX_ANCLAS)
+    if paginas >= PAGINAS_DOCUMENTO_LARGO:
+        puntajes[TIPO_POLIZA] += 1
+    return puntajes
+
+
+def clasificar_texto(texto, paginas=1, metadatos=''):
+    """
+    Tipo de documento para el texto de la primera página, o None si ningún
+    tipo llega a PUNTAJE_MINIMO.
+    """
+    puntajes = puntajes_documento(texto, paginas, metadatos)
+    tipo = max(ORDEN_DESEMPATE, key=lambda t: (puntajes[t], -ORDEN_DESEMPATE.index(t)))
+    if puntajes[tipo] < PUNTAJE_MINIMO:
+        return None
+    return tipo
+
+
+def clasificar_pdf(ruta_pdf=None, contenido=None):
+    """
+    Clasifica un PDF (desde disco o desde memoria) leyendo solo la primera
+    página. Devuelve None si el PDF no se puede abrir o el puntaje no
+    alcanza para decidir: queda sin clasificar y se interpreta.
+    """
+    try:
+        if contenido is not None:
+            doc = fitz.open(stream=contenido, filetype='pdf')
+        else:
+            doc = fitz.open(ruta_pdf)
+    except Exception as e:
+        print(f"Error al clasificar PDF {ruta_pdf or '(memoria)'}: {e}")
+        return None
+
+    try:
+        paginas = doc.page_count
+        texto = doc.load_page(0).get_text() if paginas else ''
+        metadatos = doc.metadata or {}
+        metadatos = ' '.join(metadatos.get(clave) or '' for clave in ('title', 'subject', 'keywords'))
+        return clasificar_texto(texto, paginas, metadatos)
+    except Exception as e:
+        print(f"Error al clasificar PDF {ruta_pdf or '(memoria)'}: {e}")
+        return None
+    finally:
+        doc.close()
@@ -0,0 +1,121 @@
+"""
+Caché de compañías por dominio del remitente, compartida por los escaneos.
+
+Evita una consulta a `companias` por cada PDF descargado: el mapa
+dominio -> compañía se carga entero al empezar un escaneo y solo se consulta
+la base de datos para dominios nuevos. Los contadores de documentos se
+acumulan en cada motor (ContadorCompanias) y se vuelcan con un UPDATE por
+compañía al confirmar cada lote.
+
+Una compañía creada durante un escaneo no entra en la caché compartida
+hasta que su lote se confirma: mientras tanto solo la conoce el motor que
+la creó, y si el lote se deshace los demás hilos nunca ven su id.
+"""
+
+from collections import Counter
+from threading import Lock
+
+
+class CacheCompanias:
+    """Mapa dominio -> (compania_id, nombre) protegido por un lock."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._por_dominio = {}
+
+    def calentar(self):
+        """Carga todas las compañías con dominio en una sola consulta."""
+        from app import db
+        from app.models import Compania
+
+        filas = db.session.query(Compania.dominio_email, Compania.id, Compania.nombre).filter(
+            Compania.dominio_email.isnot(None)
+        ).all()
+        with self._lock:
+            self._por_dominio = {dominio: (compania_id, nombre) for dominio, compania_id, nombre in filas}
+
+    def obtener(self, remitente, contador):
+        """
+        Devuelve (compania_id, nombre) para el remitente, o None.
+
+        Si el dominio no está en caché ni entre las compañías nuevas del
+        motor (`contador`), se busca en la base de datos. Una compañía que
+        no existe se crea en la sesión del hilo que llama (flush, sin
+        commit) y queda pendiente en el contador: pasa a la caché compartida
+        con ContadorCompanias.publicar, después del commit del lote.
+        """
+        from app import db
+        from app.models import Compania
+
+        dominio = Compania.extraer_dominio(remitente)
+        if not dominio:
+            return None
+
+        with self._lock:
+            encontrada = self._por_dominio.get(dominio)
+        if encontrada:
+            return encontrada
+        encontrada = contador.nuevas.get(dominio)
+        if encontrada:
+            return encontrada
+
+        compania = Compania.query.filter_by(dominio_email=dominio).first()
+        if compania:
+            encontrada = (compania.id, compania.nombre)
+            with self._lock:
+                self._por_dominio[dominio] = encontrada
+            return encontrada
+
+        compania = Compania.detectar_o_crear(remitente)
+        if not compania:
+            return None
+        db.session.flush()
+        encontrada = (compania.id, compania.nombre)
+        contador.nuevas[dominio] = encontrada
+        return encontrada
+
+    def publicar(self, nuevas):
+        """Agrega a la caché compañías ya confirmadas en la base de datos."""
+        with self._lock:
+            self._por_dominio.update(nuevas)
+
+    def olvidar(self, compania_id):
+        """Quita de la caché una compañía que ya no existe."""
+        with self._lock:
+            self._por_dominio = {d: v for d, v in self._por_dominio.items() if v[0] != compania_id}
+
+
+class ContadorCompanias:
+    """
+    Documentos nuevos por compañía pendientes de volcar, y compañías creadas
+    en el lote en curso (dominio -> (compania_id, nombre)). Uno por motor.
+    """
+
+    def __init__(self):
+        self._pendientes = Counter()
+        self.nuevas = {}
+
+    def sumar(self, compania_id, cantidad=1):
+        self._pendientes[compania_id] += cantidad
+
+    def volcar(self):
+        """Aplica los contadores con un UPDATE por compañía. El commit lo hace quien llama."""
+        from app.models import Compania
+
+        pendientes, self._pendientes = self._pendientes, Counter()
+        for compania_id, cantidad in pendientes.items():
+            if not Compania.sumar_documentos(compania_id, cantidad):
+                cache_companias.olvidar(compania_id)
+
+    def publicar(self):
+        """Pasa las compañías nuevas a la caché compartida. Llamar después del commit."""
+        nuevas, self.nuevas = self.nuevas, {}
+        cache_companias.publicar(nuevas)
+
+    def descartar(self):
+        """Olvida las compañías nuevas de un lote deshecho."""
+        self.nuevas = {}
+
+
+# Caché global compartida por todos los hilos de escaneo
+cache_companias = CacheCompanias()
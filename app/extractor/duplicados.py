@@ -0,0 +1,151 @@
+"""
+Detección de PDFs casi idénticos (MinHash sobre el texto).
+
+Las compañías regeneran y reenvían la misma póliza: otra fecha de emisión
+en los metadatos, otra compresión, otro orden de objetos. El SHA-256 del
+archivo cambia y ExtraccionPdf no la reconoce, aunque el texto sea el
+mismo. Aquí cada PDF recibe una firma MinHash de los shingles (grupos de
+TAMANO_SHINGLE palabras) de sus primeras páginas; la fracción de
+posiciones iguales entre dos firmas estima la similitud de Jaccard de sus
+textos.
+
+Dos pólizas distintas de una misma compañía comparten casi todo el texto
+fijo y solo difieren en los números (póliza, fechas, montos, documento,
+patente); una renovación puede cambiar apenas las fechas. El texto solo
+no las separa, así que además de la firma cada PDF guarda la huella de
+sus números: dos PDFs son la misma póliza si sus firmas llegan a
+UMBRAL_SIMILITUD y tienen exactamente los mismos números. Una copia con
+otra fecha de emisión impresa se vuelve a interpretar, que es lo seguro.
+
+Para no comparar contra todas las firmas guardadas, la firma se parte en
+BANDAS (LSH): dos PDFs son candidatos si coinciden en al menos una banda
+completa, y solo los candidatos se comparan firma contra firma. Las
+bandas se guardan en una tabla indexada (BandaFirmaPdf), así la búsqueda
+es una consulta por índice y no crece con la cantidad de PDFs.
+
+Las funciones de firma no usan la base de datos y pueden correr en los
+procesos del intérprete; el registro y la búsqueda están en FirmaTextoPdf.
+"""
+
+import hashlib
+import random
+import re
+import struct
+import unicodedata
+
+import fitz  # PyMuPDF
+
+
+NUM_PERMUTACIONES = 128
+BANDAS = 16  # De NUM_PERMUTACIONES // BANDAS filas: candidatos desde ~0,7 de similitud
+TAMANO_SHINGLE = 5  # Palabras por shingle
+PAGINAS_FIRMA = 2  # Páginas leídas: el frente de póliza identifica el documento
+MIN_SHINGLES = 10  # Con menos texto (PDF escaneado) no hay firma
+
+# Similitud estimada a partir de la cual dos PDFs son la misma póliza
+UMBRAL_SIMILITUD = 0.9
+
+_PRIMO = (1 << 61) - 1
+_aleatorio = random.Random(20240611)  # Semilla fija: las firmas guardadas siguen valiendo
+_COEFICIENTES = [
+    (_aleatorio.randrange(1, _PRIMO), _aleatorio.randrange(0, _PRIMO))
+    for _ in range(NUM_PERMUTACIONES)
+]
+
+
+def _hash64(texto):
+    return int.from_bytes(hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _palabras(texto):
+    """
+    Palabras en minúsculas y sin tildes. Fechas, montos y patentes
+    ('12/03/2025', '1.234,56', 'AB-123') quedan como una sola palabra.
+    """
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    limpio = ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+    return re.findall(r'\w+(?:[/.,:\-]\w+)*', limpio)
+
+
+def shingles(palabras):
+    """Conjunto de hashes de 64 bits de los shingles de las palabras."""
+    return {
+        _hash64(' '.join(palabras[i:i + TAMANO_SHINGLE]))
+        for i in range(max(0, len(palabras) - TAMANO_SHINGLE + 1))
+    }
+
+
+def huella_numeros(palabras):
+    """Hash de las palabras con dígitos, sin orden ni repeticiones."""
+    numeros = sorted({palabra for palabra in palabras if any(c.isdigit() for c in palabra)})
+    return hashlib.blake2b('\n'.join(numeros).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def firma_texto(texto):
+    """
+    (firma, huella_numeros) del texto, o None si es muy corto. La firma es
+    una lista de NUM_PERMUTACIONES enteros.
+    """
+    palabras = _palabras(texto)
+    elementos = shingles(palabras)
+    if len(elementos) < MIN_SHINGLES:
+        return None
+    firma = [min([(a * h + b) % _PRIMO for h in elementos]) for a, b in _COEFICIENTES]
+    return firma, huella_numeros(palabras)
+
+
+def firma_pdf(ruta_pdf=None, contenido=None):
+    """
+    (firma, huella_numeros) de las primeras PAGINAS_FIRMA páginas de un PDF.
+
+    Recibe la ruta o los bytes y no usa la base de datos: se ejecuta en
+    los procesos del intérprete. Devuelve None si el PDF no tiene texto.
+    """
+    if contenido is not None:
+        doc = fitz.open(stream=contenido, filetype='pdf')
+    else:
+        doc = fitz.open(ruta_pdf)
+    try:
+        texto = '\n'.join(
+            doc.load_page(numero).get_text() for numero in range(min(PAGINAS_FIRMA, doc.page_count))
+        )
+    finally:
+        doc.close()
+    return firma_texto(texto)
+
+
+def bandas(firma):
+    """
+    Un valor por banda de la firma, para el índice LSH.
+
+    El número de banda entra en el hash, así los valores de distintas
+    bandas no se confunden. Se devuelven con signo para caber en un BIGINT.
+    """
+    filas = NUM_PERMUTACIONES // BANDAS
+    valores = []
+    for banda in range(BANDAS):
+        porcion = firma[banda * filas:(banda + 1) * filas]
+        digest = hashlib.blake2b(
+            struct.pack(f'<H{filas}Q', banda, *porcion), digest_size=8
+        ).digest()
+        valores.append(int.from_bytes(digest, 'big', signed=True))
+    return valores
+
+
+def similitud(firma_a, firma_b):
+    """Similitud de Jaccard estimada: fracción de posiciones iguales."""
+    if not firma_a or not firma_b or len(firma_a) != len(firma_b):
+        return 0.0
+    return sum(1 for a, b in zip(firma_a, firma_b) if a == b) / len(firma_a)
+
+
+def empaquetar(firma):
+    """Firma -> bytes para guardar en la base de datos."""
+    return struct.pack(f'<{len(firma)}Q', *firma)
+
+
+def desempaquetar(datos):
+    """Bytes guardados -> firma."""
+    if not datos:
+        return None
+    return list(struct.unpack(f'<{len(datos) // 8}Q', datos))
@@ -0,0 +1,259 @@
+"""
+Escáner de campos en una sola pasada para el intérprete de pólizas.
+
+Los patrones se compilan una vez. Casi todos empiezan por una palabra fija
+("Póliza", "Vigencia", "Prima"...): con esas palabras (anclas) se arma una
+única expresión que recorre el texto una vez y, en cada posición donde
+aparece un ancla, se prueban solo los patrones que empiezan por esa letra.
+Los patrones sin un ancla útil se buscan por separado, y solo si hace falta.
+
+El resultado es el mismo que buscar cada patrón de cada campo en orden de
+prioridad: gana el primer patrón de la lista que aparece en el texto y, de
+ese patrón, su primera coincidencia.
+"""
+
+import hashlib
+import json
+import re
+from collections import defaultdict
+
+
+FLAGS_PATRONES = re.IGNORECASE | re.MULTILINE
+
+# Un ancla de menos letras coincide en demasiados sitios para ser útil
+MIN_LETRAS_ANCLA = 3
+
+# Letra suelta o clase de dos caracteres ([Pp], [oó]) seguida o no de cuantificador
+PATRON_PIEZA = re.compile(r'\[([^\]\\\-^])([^\]\\\-])\]|([^\W\d_])')
+CUANTIFICADORES = '?*+{'
+
+
+def huella_patrones(*colecciones):
+    """
+    Huella corta (12 hex) de un conjunto de patrones y palabras clave.
+
+    Acepta diccionarios y listas con expresiones compiladas o cadenas; de
+    cada expresión cuentan el texto y los flags. Cambiar, añadir o reordenar
+    un patrón cambia la huella.
+    """
+    def serializar(valor):
+        if isinstance(valor, re.Pattern):
+            return [valor.pattern, int(valor.flags)]
+        raise TypeError(f'No serializable: {type(valor).__name__}')
+
+    contenido = json.dumps(colecciones, default=serializar, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:12]
+
+
+def _alternativa_global(patron):
+    """True si el patrón tiene un | fuera de grupos (entonces no hay prefijo fijo)."""
+    profundidad = 0
+    en_clase = False
+    escapado = False
+    for c in patron:
+        if escapado:
+            escapado = False
+        elif c == '\\':
+            escapado = True
+        elif en_clase:
+            en_clase = c != ']'
+        elif c == '[':
+            en_clase = True
+        elif c == '(':
+            profundidad += 1
+        elif c == ')':
+            profundidad -= 1
+        elif c == '|' and profundidad == 0:
+            return True
+    return False
+
+
+def ancla_patron(patron):
+    """
+    Prefijo fijo de un patrón, normalizado a minúsculas.
+
+    Returns:
+        Lista de piezas (expresiones sin IGNORECASE, para buscar sobre el
+        texto en minúsculas), una por letra fija. Vacía si no hay prefijo.
+    """
+    if _alternativa_global(patron):
+        return []
+    piezas = []
+    pos = 0
+    while pos < len(patron):
+        m = PATRON_PIEZA.match(patron, pos)
+        if not m:
+            break
+        siguiente = patron[m.end():m.end() + 1]
+        if siguiente and siguiente in CUANTIFICADORES:
+            break
+        if m.group(3):
+            piezas.append(m.group(3).lower())
+        else:
+            a, b = m.group(1).lower(), m.group(2).lower()
+            piezas.append(a if a == b else a + b)
+        pos = m.end()
+    return piezas
+
+
+def _expresion_pieza(pieza):
+    """Una pieza del ancla como expresión regular."""
+    if len(pieza) == 1:
+        return re.escape(pieza)
+    return '[' + ''.join(re.escape(c) for c in pieza) + ']'
+
+
+class EscanerCampos:
+    """
+    Busca todos los campos de un diccionario {campo: [patrones]} recorriendo
+    el texto una sola vez. Cada patrón debe tener un grupo de captura.
+    """
+
+    def __init__(self, patrones, flags=FLAGS_PATRONES):
+        self.campos = list(patrones)
+        self.compilados = {
+            campo: [re.compile(patron, flags) for patron in lista]
+            for campo, lista in patrones.items()
+        }
+
+        # letra inicial -> [(campo, prioridad, patron compilado)]
+        self._por_letra = defaultdict(list)
+        # Patrones sin ancla útil: (campo, prioridad, patron compilado)
+        self._sin_ancla = []
+        anclas = defaultdict(set)  # letra inicial -> restos de ancla
+
+        for campo, lista in self.compilados.items():
+            for prioridad, compilado in enumerate(lista):
+                piezas = ancla_patron(compilado.pattern)
+                if len(piezas) < MIN_LETRAS_ANCLA:
+                    self._sin_ancla.append((campo, prioridad, compilado))
+                    continue
+                resto = ''.join(_expresion_pieza(pieza) for pieza in piezas[1:])
+                for letra in piezas[0]:
+                    self._por_letra[letra].append((campo, prioridad, compilado))
+                    anclas[letra].add(resto)
+
+        # Alternativas agrupadas por primera letra: el motor de re descarta
+        # rápido las posiciones que no empiezan por ninguna. Lookahead para
+        # no consumir texto (un ancla puede empezar dentro de otra).
+        alternativas = '|'.join(
+            f'{re.escape(letra)}(?:{"|".join(sorted(restos, key=len, reverse=True))})'
+            for letra, restos in sorted(anclas.items())
+        )
+        self._anclas = re.compile(f'(?=(?:{alternativas}))') if alternativas else None
+        self._anclas_ignorecase = re.compile(f'(?=(?:{alternativas}))', re.IGNORECASE) \
+            if alternativas else None
+
+    def buscar(self, texto):
+        """
+        Devuelve {campo: valor o None}, con el grupo 1 ya sin espacios.
+
+        Mismo resultado que probar los patrones de cada campo en orden con
+        re.search y quedarse con el primero que coincide.
+        """
+        mejores = {}  # campo -> (prioridad, valor)
+        resueltos = 0  # campos con su patrón de prioridad 0 ya encontrado
+
+        if self._anclas is not None:
+            minusculas = texto.lower()
+            # lower() puede cambiar la longitud con algunos caracteres Unicode
+            if len(minusculas) == len(texto):
+                escaneo = self._anclas.finditer(minusculas)
+            else:
+                minusculas = None
+                escaneo = self._anclas_ignorecase.finditer(texto)
+
+            for encontrado in escaneo:
+                pos = encontrado.start()
+                letra = minusculas[pos] if minusculas is not None else texto[pos].lower()
+                for campo, prioridad, compilado in self._por_letra.get(letra, ()):
+                    actual = mejores.get(campo)
+                    if actual is not None and actual[0] <= prioridad:
+                        continue
+                    match = compilado.match(texto, pos)
+                    if match:
+                        mejores[campo] = (prioridad, match.group(1).strip())
+                        if prioridad == 0:
+                            resueltos += 1
+                if resueltos == len(self.campos):
+                    break
+
+        for campo, prioridad, compilado in self._sin_ancla:
+            actual = mejores.get(campo)
+            if actual is not None and actual[0] <= prioridad:
+                continue
+            match = compilado.search(texto)
+            if match:
+                mejores[campo] = (prioridad, match.group(1).strip())
+
+        return {campo: mejores[campo][1] if campo in mejores else None for campo in self.campos}
+
+
+# Marca de fin de palabra en los nodos del trie
+FIN = ''
+
+
+def _trie_a_regex(nodo):
+    """
+    Expresión que coincide donde empieza alguna palabra del trie.
+
+    Basta con llegar a la primera palabra completa de cada rama: las más
+    largas que la contienen se recogen después recorriendo el trie.
+    """
+    if FIN in nodo:
+        return ''
+    alternativas = [re.escape(c) + _trie_a_regex(hijo) for c, hijo in sorted(nodo.items())]
+    if len(alternativas) == 1:
+        return alternativas[0]
+    return '(?:' + '|'.join(alternativas) + ')'
+
+
+class AutomataPalabras:
+    """
+    Detecta palabras clave agrupadas por prioridad en una sola pasada.
+
+    Recibe {clave: [palabras]} en orden de prioridad y responde lo mismo que
+    recorrer las claves en orden y devolver la primera con alguna palabra
+    contenida en el texto (sin distinguir mayúsculas). Las palabras forman un
+    trie que se compila en una sola expresión regular, así el recorrido del
+    texto lo hace el motor de re y no un bucle Python carácter a carácter.
+    """
+
+    def __init__(self, grupos):
+        self.claves = list(grupos)
+        self._trie = {}
+        for prioridad, palabras in enumerate(grupos.values()):
+            for palabra in palabras:
+                palabra = palabra.lower()
+                if not palabra:
+                    continue
+                nodo = self._trie
+                for c in palabra:
+                    nodo = nodo.setdefault(c, {})
+                # Una palabra repetida en varios grupos cuenta para el primero
+                nodo[FIN] = min(nodo.get(FIN, prioridad), prioridad)
+        self._inicios = re.compile(f'(?={_trie_a_regex(self._trie)})') if self._trie else None
+
+    def _prioridades_en(self, texto, pos):
+        """Prioridades de todas las palabras que empiezan en pos."""
+        nodo = self._trie
+        for i in range(pos, len(texto)):
+            nodo = nodo.get(texto[i])
+            if nodo is None:
+                return
+            if FIN in nodo:
+                yield nodo[FIN]
+
+    def primera(self, texto):
+        """Clave de mayor prioridad con alguna palabra en el texto, o None."""
+        if self._inicios is None:
+            return None
+        minusculas = texto.lower()
+        mejor = None
+        for encontrado in self._inicios.finditer(minusculas):
+            for prioridad in self._prioridades_en(minusculas, encontrado.start()):
+                if mejor is None or prioridad < mejor:
+                    mejor = prioridad
+            if mejor == 0:
+                break
+        return self.claves[mejor] if mejor is not None else None
@@ -0,0 +1,247 @@
+"""
+Simulación (dry run) de un escaneo.
+
+Estima el coste de un escaneo antes de lanzarlo: por cada cuenta y carpeta
+hace el SEARCH y lee en lote RFC822.SIZE, BODYSTRUCTURE y el Message-ID (los
+mismos FETCH del prefiltro), sin descargar ningún cuerpo. Informa cuántos
+correos encajan, cuántos ya están en CorreoProcesado y cuántos PDFs y bytes
+se descargarían, más una duración estimada según el ritmo de los escaneos
+anteriores.
+"""
+
+import imaplib
+import uuid
+from datetime import datetime
+from threading import Thread, Lock
+
+
+# Escaneos completados que se usan para medir el ritmo
+ESCANEOS_RITMO = 20
+
+
+def ritmo_historico(usuario_id=None):
+    """
+    Correos por segundo de los últimos escaneos completados, o None.
+
+    Se mide sobre correos_escaneados (nuevos y ya procesados), igual que se
+    cuentan los candidatos de la estimación.
+    """
+    from app.models import Escaneo
+
+    consulta = Escaneo.query.filter(
+        Escaneo.estado == 'completado',
+        Escaneo.fecha_fin.isnot(None),
+        Escaneo.correos_escaneados > 0
+    )
+    if usuario_id is not None:
+        consulta = consulta.filter(Escaneo.usuario_id == usuario_id)
+    recientes = consulta.order_by(Escaneo.fecha_fin.desc()).limit(ESCANEOS_RITMO).all()
+
+    correos = 0
+    segundos = 0
+    for escaneo in recientes:
+        duracion = (escaneo.fecha_fin - escaneo.fecha_inicio).total_seconds()
+        if duracion > 0:
+            correos += escaneo.correos_escaneados
+            segundos += duracion
+    if not segundos:
+        # Sin historial propio se usa el de todos los usuarios
+        return ritmo_historico() if usuario_id is not None else None
+    return correos / segundos
+
+
+class EstimacionEscaneo:
+    """Estimación en segundo plano de un escaneo para un usuario."""
+
+    ESTADO_EN_PROGRESO = 'en_progreso'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+
+    def __init__(self, app, usuario_id):
+        self.id = uuid.uuid4().hex
+        self.app = app
+        self.usuario_id = usuario_id
+        self.estado = self.ESTADO_EN_PROGRESO
+        self.resultados = []  # Una fila por cuenta y carpeta
+        self.cuenta_actual = None
+        self.error = None
+        self.ritmo = None
+        self.fecha_inicio = datetime.utcnow()
+        self.fecha_fin = None
+
+    def ejecutar(self, cuenta_ids, config):
+        """Lanza la estimación en un hilo separado."""
+        thread = Thread(target=self._estimar_con_contexto, args=(cuenta_ids, config))
+        thread.daemon = True
+        thread.start()
+
+    def _estimar_con_contexto(self, cuenta_ids, config):
+        with self.app.app_context():
+            try:
+                self._estimar(cuenta_ids, config)
+                self.estado = self.ESTADO_COMPLETADO
+            except Exception as e:
+                self.error = str(e)
+                self.estado = self.ESTADO_ERROR
+            finally:
+                self.cuenta_actual = None
+                self.fecha_fin = datetime.utcnow()
+
+    def _estimar(self, cuenta_ids, config):
+        from app.models import CuentaGmail
+        from app.extractor.motor import MotorExtractorWeb, semaforo_sesiones_imap
+
+        cuentas = CuentaGmail.query.filter(CuentaGmail.id.in_(cuenta_ids)).all()
+        # Motor sin escaneo: solo se usan sus utilidades de lectura de metadatos
+        motor = MotorExtractorWeb(None, self.app)
+        self.ritmo = ritmo_historico(self.usuario_id)
+
+        for cuenta in cuentas:
+            self.cuenta_actual = cuenta.correo_gmail
+            # Las simulaciones cuentan para el límite global de sesiones IMAP
+            with semaforo_sesiones_imap(self.app):
+                try:
+                    mail = imaplib.IMAP4_SSL(motor.SERVIDOR_IMAP, motor.PUERTO_IMAP)
+                    mail.login(cuenta.correo_gmail, cuenta.obtener_contrasena_app())
+                except Exception as e:
+                    self.resultados.append(self._fila(cuenta, None, error=f'Conexión: {e}'))
+                    continue
+                try:
+                    for carpeta in config.get('carpetas', ['INBOX']):
+                        self.resultados.append(self._estimar_carpeta(motor, mail, cuenta, carpeta, config))
+                finally:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+
+    def _fila(self, cuenta, carpeta, error=None):
+        return {
+            'cuenta': cuenta.correo_gmail,
+            'carpeta': carpeta,
+            'candidatos': 0,
+            'ya_procesados': 0,
+            'pendientes': 0,
+            'correos_con_pdf': 0,
+            'pdfs': 0,
+            'bytes_pdf': 0,
+            'bytes_correos': 0,
+            'sin_metadatos': 0,
+            'error': error,
+        }
+
+    def _estimar_carpeta(self, motor, mail, cuenta, carpeta, config):
+        """Cuenta candidatos, ya procesados y PDFs esperados de una carpeta."""
+        from app.models import CorreoProcesado
+
+        fila = self._fila(cuenta, carpeta)
+        try:
+            # EXAMINE (readonly): la simulación no marca nada como leído
+            resultado, _ = mail.select(f'"{carpeta}"', readonly=True)
+            if resultado != 'OK':
+                fila['error'] = 'No se pudo seleccionar la carpeta'
+                return fila
+
+            # Mismos criterios que un escaneo manual
+            criterios = []
+            if config.get('fecha_desde'):
+                criterios.append(f'SINCE {config["fecha_desde"].strftime("%d-%b-%Y")}')
+            if config.get('fecha_hasta'):
+                criterios.append(f'BEFORE {config["fecha_hasta"].strftime("%d-%b-%Y")}')
+            resultado, mensajes = mail.search(None, ' '.join(criterios) if criterios else 'ALL')
+            if resultado != 'OK':
+                fila['error'] = 'Falló la búsqueda'
+                return fila
+        except Exception as e:
+            fila['error'] = str(e)
+            return fila
+
+        ids_mensajes = mensajes[0].split()
+        fila['candidatos'] = len(ids_mensajes)
+
+        forzar_escaneo = config.get('forzar_escaneo', False)
+        palabras_clave = config.get('palabras_clave', [])
+        max_tamano_adjunto = config.get(
+            'max_tamano_adjunto', self.app.config.get('ESCANEO_MAX_TAMANO_ADJUNTO', 0)
+        )
+        tamano_lote = self.app.config.get('ESCANEO_LOTE_METADATOS', 500)
+
+        for inicio in range(0, len(ids_mensajes), tamano_lote):
+            ids_lote = ids_mensajes[inicio:inicio + tamano_lote]
+            metadatos = motor._obtener_metadatos_lote(mail, ids_lote)
+            fila['sin_metadatos'] += len(ids_lote) - len(metadatos)
+
+            procesados = set()
+            if not forzar_escaneo:
+                procesados = CorreoProcesado.filtrar_procesados(
+                    cuenta.id, carpeta,
+                    {meta['message_id'] for meta in metadatos.values() if meta['message_id']}
+                )
+
+            for meta in metadatos.values():
+                if meta['message_id'] and meta['message_id'] in procesados:
+                    fila['ya_procesados'] += 1
+                    continue
+                fila['pendientes'] += 1
+                fila['bytes_correos'] += meta['tamano']
+
+                if not motor.coincide_palabras_clave(meta['asunto'], meta['remitente'], palabras_clave):
+                    continue
+                tamanos = [
+                    tamano for tamano, _ in meta['partes_pdf']
+                    if not max_tamano_adjunto or tamano <= max_tamano_adjunto
+                ]
+                if tamanos:
+                    fila['correos_con_pdf'] += 1
+                    fila['pdfs'] += len(tamanos)
+                    fila['bytes_pdf'] += sum(tamanos)
+
+        # Sin metadatos no se sabe si ya se procesaron: se cuentan como pendientes
+        fila['pendientes'] += fila['sin_metadatos']
+        return fila
+
+    def totales(self):
+        """Suma de todas las filas y duración estimada."""
+        totales = {clave: sum(fila[clave] for fila in self.resultados)
+                   for clave in ('candidatos', 'ya_procesados', 'pendientes',
+                                 'correos_con_pdf', 'pdfs', 'bytes_pdf', 'bytes_correos')}
+        totales['duracion_estimada_segundos'] = (
+            int(totales['candidatos'] / self.ritmo) if self.ritmo else None
+        )
+        return totales
+
+    def obtener_estado(self):
+        """Estado serializable para la interfaz."""
+        return {
+            'id': self.id,
+            'estado': self.estado,
+            'cuenta_actual': self.cuenta_actual,
+            'error': self.error,
+            'resultados': self.resultados,
+            'totales': self.totales(),
+            'ritmo_correos_segundo': round(self.ritmo, 2) if self.ritmo else None,
+        }
+
+
+# Última estimación de cada usuario (usuario_id -> EstimacionEscaneo)
+estimaciones_activas = {}
+_lock_estimaciones = Lock()
+
+
+def crear_estimacion(app, usuario_id):
+    """
+    Crea la estimación de un usuario, o None si ya tiene una en curso.
+    Reemplaza a la anterior terminada.
+    """
+    with _lock_estimaciones:
+        anterior = estimaciones_activas.get(usuario_id)
+        if anterior and anterior.estado == EstimacionEscaneo.ESTADO_EN_PROGRESO:
+            return None
+        estimacion = EstimacionEscaneo(app, usuario_id)
+        estimaciones_activas[usuario_id] = estimacion
+        return estimacion
+
+
+def obtener_estimacion(usuario_id):
+    """Devuelve la última estimación de un usuario, o None."""
+    return estimaciones_activas.get(usuario_id)
@@ -0,0 +1,186 @@
+"""
+Lectura de metadatos IMAP en lote (FETCH sin descargar el cuerpo).
+Permite decidir qué correos descargar usando RFC822.SIZE y BODYSTRUCTURE.
+"""
+
+import re
+from email.parser import BytesHeaderParser
+
+
+PATRON_LITERAL = re.compile(rb'\{(\d+)\}$')
+
+# Tokens de paréntesis (distintos de una cadena "(" entre comillas)
+ABRE = ('parentesis', '(')
+CIERRA = ('parentesis', ')')
+
+
+class ErrorRespuestaIMAP(Exception):
+    """Respuesta FETCH que no se pudo interpretar."""
+
+
+def _segmentos(datos):
+    """Aplana la respuesta de imaplib en segmentos de texto y literales."""
+    for item in datos:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            yield ('texto', item[0])
+            yield ('literal', item[1])
+        else:
+            yield ('texto', item)
+
+
+def _tokenizar(datos):
+    """Convierte la respuesta FETCH en una lista de tokens."""
+    tokens = []
+    for tipo, segmento in _segmentos(datos):
+        if tipo == 'literal':
+            tokens.append(segmento)
+            continue
+
+        texto = segmento.decode('utf-8', errors='replace')
+        # El marcador {N} anuncia el literal del segmento siguiente
+        if PATRON_LITERAL.search(segmento):
+            texto = texto[:texto.rfind('{')]
+
+        i = 0
+        largo = len(texto)
+        while i < largo:
+            c = texto[i]
+            if c.isspace():
+                i += 1
+            elif c in '()':
+                tokens.append(ABRE if c == '(' else CIERRA)
+                i += 1
+            elif c == '"':
+                i += 1
+                valor = []
+                while i < largo and texto[i] != '"':
+                    if texto[i] == '\\' and i + 1 < largo:
+                        i += 1
+                    valor.append(texto[i])
+                    i += 1
+                tokens.append(''.join(valor))
+                i += 1
+            else:
+                inicio = i
+                profundidad = 0
+                while i < largo:
+                    c = texto[i]
+                    if c == '[':
+                        profundidad += 1
+                    elif c == ']':
+                        profundidad -= 1
+                    elif profundidad == 0 and (c.isspace() or c in '()"'):
+                        break
+                    i += 1
+                atomo = texto[inicio:i]
+                tokens.append(None if atomo.upper() == 'NIL' else ('atomo', atomo))
+    return tokens
+
+
+def _leer_valor(tokens, pos):
+    """Lee un valor (lista anidada, átomo, cadena o literal) desde pos."""
+    token = tokens[pos]
+    if token == ABRE:
+        lista = []
+        pos += 1
+        while pos < len(tokens) and tokens[pos] != CIERRA:
+            valor, pos = _leer_valor(tokens, pos)
+            lista.append(valor)
+        return lista, pos + 1
+    if isinstance(token, tuple) and token[0] == 'atomo':
+        return token[1], pos + 1
+    return token, pos + 1
+
+
+def parsear_respuesta_fetch(datos):
+    """
+    Interpreta la respuesta de mail.fetch() para varios mensajes.
+
+    Returns:
+        dict {numero_secuencia (bytes): {ATRIBUTO: valor}}. Los nombres de
+        atributo se normalizan a mayúsculas; BODY[...] devuelve bytes.
+    """
+    tokens = _tokenizar(datos)
+    resultado = {}
+    pos = 0
+    while pos < len(tokens):
+        token = tokens[pos]
+        if not isinstance(token, tuple) or token[0] != 'atomo':
+            pos += 1
+            continue
+        numero = token[1]
+        pos += 1
+        if pos >= len(tokens) or tokens[pos] != ABRE:
+            raise ErrorRespuestaIMAP(f'Respuesta FETCH inesperada para {numero}')
+        items, pos = _leer_valor(tokens, pos)
+        atributos = {}
+        for i in range(0, len(items) - 1, 2):
+            clave = items[i]
+            if isinstance(clave, str):
+                atributos[clave.upper().replace('BODY.PEEK[', 'BODY[')] = items[i + 1]
+        resultado[numero.encode()] = atributos
+    return resultado
+
+
+def _texto(valor):
+    """Normaliza un valor de BODYSTRUCTURE a str en minúsculas."""
+    if isinstance(valor, bytes):
+        valor = valor.decode('utf-8', errors='replace')
+    return (valor or '').lower()
+
+
+def partes_pdf(estructura):
+    """
+    Recorre un BODYSTRUCTURE y devuelve las partes application/pdf.
+
+    Returns:
+        Lista de tuplas (tamano_estimado_bytes, nombre) por cada parte PDF,
+        incluyendo las de mensajes adjuntos (message/rfc822).
+    """
+    partes = []
+    if not isinstance(estructura, list) or not estructura:
+        return partes
+
+    # Multipart: las subpartes son las listas iniciales
+    if isinstance(estructura[0], list):
+        for subparte in estructura:
+            if not isinstance(subparte, list):
+                break
+            partes.extend(partes_pdf(subparte))
+        return partes
+
+    if len(estructura) < 7:
+        return partes
+
+    tipo = _texto(estructura[0])
+    subtipo = _texto(estructura[1])
+
+    if tipo == 'message' and subtipo == 'rfc822' and len(estructura) > 8:
+        return partes_pdf(estructura[8])
+
+    if tipo == 'application' and subtipo == 'pdf':
+        try:
+            tamano = int(estructura[6])
+        except (TypeError, ValueError):
+            tamano = 0
+        # El tamaño informado es el codificado; base64 ocupa ~4/3
+        if _texto(estructura[5]) == 'base64':
+            tamano = tamano * 3 // 4
+
+        nombre = None
+        parametros = estructura[2] if isinstance(estructura[2], list) else []
+        for i in range(0, len(parametros) - 1, 2):
+            if _texto(parametros[i]) in ('name', 'name*'):
+                nombre = parametros[i + 1]
+        partes.append((tamano, nombre))
+
+    return partes
+
+
+def parsear_cabeceras(bloque):
+    """Parsea el bloque BODY[HEADER.FIELDS (...)] devuelto por el servidor."""
+    if isinstance(bloque, str):
+        bloque = bloque.encode('utf-8', errors='replace')
+    return BytesHeaderParser().parsebytes(bloque or b'')
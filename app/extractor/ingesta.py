@@ -0,0 +1,331 @@
+"""
+Ingesta offline de correos desde exportaciones mbox, Maildir o archivos .eml.
+Reutiliza la lógica del motor: memoria de correos procesados, detección de
+compañía, guardado de PDFs y registro en CorreoProcesado.
+"""
+
+import os
+import mmap
+import email
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from app.extractor.motor import MotorExtractorWeb, extraer_adjuntos_pdf
+from app.extractor.digests import ConjuntoDigests
+from app.extractor.companias import cache_companias
+
+
+# Tamaño de cada tarea enviada a los procesos
+BYTES_POR_TAREA_MBOX = 16 * 1024 * 1024
+ARCHIVOS_POR_TAREA = 200
+
+# Cada cuántos correos se hace commit e informa progreso
+CORREOS_POR_COMMIT = 500
+
+# Instancia usada por los procesos hijos para las funciones de parseo
+_motor_analisis = None
+
+
+def detectar_formato(ruta):
+    """Devuelve 'mbox', 'maildir' o 'eml' según la ruta indicada."""
+    if os.path.isfile(ruta):
+        return 'eml' if ruta.lower().endswith('.eml') else 'mbox'
+    if all(os.path.isdir(os.path.join(ruta, d)) for d in ('cur', 'new')):
+        return 'maildir'
+    return 'eml'
+
+
+def tareas_mbox(ruta):
+    """
+    Divide un mbox en grupos de rangos (inicio, fin) de bytes por mensaje.
+
+    Usa mmap para buscar los separadores "From " sin cargar el archivo en
+    memoria; cada proceso hijo vuelve a mapear el archivo y lee sus rangos.
+    """
+    if os.path.getsize(ruta) == 0:
+        return
+
+    with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:5] == b'From ':
+            inicio = 0
+        else:
+            inicio = mm.find(b'\nFrom ')
+            if inicio == -1:
+                return
+            inicio += 1
+
+        tarea = []
+        bytes_tarea = 0
+        while True:
+            siguiente = mm.find(b'\nFrom ', inicio)
+            fin = len(mm) if siguiente == -1 else siguiente + 1
+            tarea.append((inicio, fin))
+            bytes_tarea += fin - inicio
+
+            if bytes_tarea >= BYTES_POR_TAREA_MBOX:
+                yield tarea
+                tarea = []
+                bytes_tarea = 0
+
+            if siguiente == -1:
+                break
+            inicio = fin
+
+        if tarea:
+            yield tarea
+
+
+def tareas_archivos(ruta, formato):
+    """Agrupa los archivos de un Maildir o de un árbol de .eml en tareas."""
+    if os.path.isfile(ruta):
+        yield [ruta]
+        return
+
+    tarea = []
+    for directorio, _, archivos in os.walk(ruta):
+        if formato == 'maildir' and os.path.basename(directorio) not in ('cur', 'new'):
+            continue
+        for nombre in sorted(archivos):
+            if formato == 'eml' and not nombre.lower().endswith('.eml'):
+                continue
+            tarea.append(os.path.join(directorio, nombre))
+            if len(tarea) >= ARCHIVOS_POR_TAREA:
+                yield tarea
+                tarea = []
+    if tarea:
+        yield tarea
+
+
+def analizar_correo(correo_crudo, palabras_clave=None, max_tamano_adjunto=0):
+    """
+    Parsea un correo crudo y devuelve lo necesario para registrarlo.
+
+    Se ejecuta en los procesos hijos: no usa la base de datos. Los correos
+    que no coinciden con las palabras clave no extraen adjuntos.
+    """
+    global _motor_analisis
+    if _motor_analisis is None:
+        _motor_analisis = MotorExtractorWeb(None, None)
+    motor = _motor_analisis
+
+    msg = email.message_from_bytes(correo_crudo)
+
+    message_id = msg.get('Message-ID', '') or msg.get('Message-Id', '')
+    if not message_id:
+        message_id = hashlib.md5(correo_crudo[:1000]).hexdigest()
+
+    asunto = motor.decodificar_cabecera(msg['Subject'])
+    remitente = motor.decodificar_cabecera(msg['From'])
+    coincide = motor.coincide_palabras_clave(asunto, remitente, palabras_clave)
+
+    pdfs = []
+    omitidos = 0
+    if coincide:
+        for _, contenido in extraer_adjuntos_pdf(msg):
+            if max_tamano_adjunto and len(contenido) > max_tamano_adjunto:
+                omitidos += 1
+                continue
+            pdfs.append(contenido)
+
+    return {
+        'message_id': message_id,
+        'asunto': asunto,
+        'remitente': remitente,
+        'fecha_correo': motor.parsear_fecha_correo(msg['Date']),
+        'pdfs': pdfs,
+        'omitidos': omitidos,
+    }
+
+
+def procesar_tarea_mbox(ruta, rangos, palabras_clave, max_tamano_adjunto):
+    """Analiza un grupo de mensajes de un mbox (ejecutado en un proceso hijo)."""
+    resultados = []
+    with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for inicio, fin in rangos:
+            # Saltar la línea separadora "From remitente fecha"
+            salto = mm.find(b'\n', inicio, fin)
+            if salto == -1:
+                continue
+            resultados.append(analizar_correo(mm[salto + 1:fin], palabras_clave, max_tamano_adjunto))
+    return resultados
+
+
+def procesar_tarea_archivos(rutas, palabras_clave, max_tamano_adjunto):
+    """Analiza un grupo de archivos de correo (ejecutado en un proceso hijo)."""
+    resultados = []
+    for ruta in rutas:
+        try:
+            with open(ruta, 'rb') as f:
+                resultados.append(analizar_correo(f.read(), palabras_clave, max_tamano_adjunto))
+        except OSError:
+            continue
+    return resultados
+
+
+class IngestorCorreos:
+    """
+    Importa una exportación de correo a la cuenta indicada.
+
+    El parseo se reparte entre procesos; el registro en base de datos y el
+    guardado de archivos se hacen en el proceso principal con el motor.
+    """
+
+    def __init__(self, app, cuenta, carpeta, palabras_clave=None, forzar=False,
+                 procesos=None, interpretar_pdfs=False, informar=print):
+        self.app = app
+        self.cuenta = cuenta
+        self.carpeta = carpeta[:100]
+        self.palabras_clave = palabras_clave or []
+        self.forzar = forzar
+        self.procesos = procesos or os.cpu_count() or 1
+        self.interpretar_pdfs = interpretar_pdfs
+        self.informar = informar
+
+        self.motor = None
+        self.escaneo = None
+        self.procesados = ConjuntoDigests()
+        self.correos = 0
+        self.correos_nuevos = 0
+        self.correos_saltados = 0
+        self.correos_con_pdf = 0
+        self.pdfs = 0
+        self.pdfs_omitidos = 0
+        self.fecha_mas_reciente = None
+
+    def ejecutar(self, ruta, directorio_salida):
+        """Ejecuta la ingesta completa. Debe llamarse dentro del contexto de la app."""
+        from app import db
+        from app.models import Escaneo, CorreoProcesado, HistorialEscaneoCarpeta
+
+        formato = detectar_formato(ruta)
+        os.makedirs(directorio_salida, exist_ok=True)
+
+        self.escaneo = Escaneo(
+            usuario_id=self.cuenta.usuario_id,
+            cuenta_gmail_id=self.cuenta.id,
+            estado='en_progreso',
+            palabras_clave=','.join(self.palabras_clave),
+            carpetas=self.carpeta,
+            cuentas_escaneadas=str(self.cuenta.id)
+        )
+        db.session.add(self.escaneo)
+        db.session.commit()
+
+        self.motor = MotorExtractorWeb(self.escaneo.id, self.app)
+        self.motor.cuenta_actual = self.cuenta.correo_gmail
+        self.motor._iniciar_interpretacion({'interpretar_pdfs': self.interpretar_pdfs})
+        cache_companias.calentar()
+
+        # Memoria de correos ya procesados: una sola consulta en lugar de una por correo.
+        # Los Message-ID se comparan truncados como se guardan (255 caracteres).
+        if not self.forzar:
+            self.procesados.update(
+                message_id[:255] for (message_id,) in db.session.query(CorreoProcesado.message_id).filter_by(
+                    cuenta_gmail_id=self.cuenta.id, carpeta=self.carpeta
+                ).yield_per(10000)
+            )
+
+        self.informar(f"Ingestando {ruta} ({formato}) con {self.procesos} procesos...")
+        max_tamano = self.app.config.get('ESCANEO_MAX_TAMANO_ADJUNTO', 0)
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.procesos) as pool:
+                if formato == 'mbox':
+                    tareas = (pool.submit(procesar_tarea_mbox, ruta, rangos,
+                                          self.palabras_clave, max_tamano)
+                              for rangos in tareas_mbox(ruta))
+                else:
+                    tareas = (pool.submit(procesar_tarea_archivos, rutas,
+                                          self.palabras_clave, max_tamano)
+                              for rutas in tareas_archivos(ruta, formato))
+                self._consumir(tareas, directorio_salida)
+
+            self.motor._finalizar_interpretacion()
+
+            if self.correos_nuevos > 0 or self.correos_saltados > 0:
+                HistorialEscaneoCarpeta.actualizar_historial(
+                    self.cuenta.id, self.carpeta, self.fecha_mas_reciente,
+                    self.correos_nuevos, self.correos_con_pdf, self.pdfs
+                )
+            self.escaneo.estado = 'completado'
+            self.motor.contador_companias.volcar()
+        except Exception as e:
+            self.motor._finalizar_interpretacion(esperar=False)
+            self.escaneo.estado = 'error'
+            self.escaneo.mensaje_error = f"Error en ingesta: {e}"
+            raise
+        finally:
+            self.escaneo.correos_escaneados = self.correos
+            self.escaneo.pdfs_descargados = self.pdfs
+            self.escaneo.fecha_fin = datetime.utcnow()
+            db.session.commit()
+            self.motor.contador_companias.publicar()
+
+        self.informar(
+            f"Ingesta finalizada: {self.correos} correos, {self.correos_saltados} ya procesados, "
+            f"{self.pdfs} PDFs ({self.pdfs_omitidos} omitidos por tamaño)"
+        )
+        return self.escaneo
+
+    def _consumir(self, tareas, directorio_salida):
+        """Mantiene una ventana acotada de tareas en curso y registra sus resultados."""
+        ventana = self.procesos * 2
+        en_curso = set()
+
+        for futuro in tareas:
+            en_curso.add(futuro)
+            if len(en_curso) >= ventana:
+                terminados, en_curso = wait(en_curso, return_when=FIRST_COMPLETED)
+                for terminado in terminados:
+                    self._registrar_resultados(terminado.result(), directorio_salida)
+
+        for terminado in wait(en_curso)[0]:
+            self._registrar_resultados(terminado.result(), directorio_salida)
+
+    def _registrar_resultados(self, resultados, directorio_salida):
+        """Registra en la base de datos los correos analizados por un proceso hijo."""
+        from app import db
+        from app.models import CorreoProcesado
+
+        for datos in resultados:
+            self.correos += 1
+            if self.correos % CORREOS_POR_COMMIT == 0:
+                self.motor._recoger_interpretaciones()
+                self.escaneo.correos_escaneados = self.correos
+                self.escaneo.pdfs_descargados = self.pdfs
+                self.motor.confirmar_lote()
+                self.informar(f"  {self.correos} correos, {self.pdfs} PDFs "
+                              f"({self.motor.memoria_mb} MB)")
+
+            message_id = datos['message_id'][:255]  # Como se guarda en CorreoProcesado
+
+            if message_id in self.procesados:
+                self.correos_saltados += 1
+                continue
+            self.procesados.add(message_id)
+            self.correos_nuevos += 1
+
+            fecha_correo = datos['fecha_correo']
+            if self.fecha_mas_reciente is None or fecha_correo > self.fecha_mas_reciente:
+                self.fecha_mas_reciente = fecha_correo
+
+            self.pdfs_omitidos += datos['omitidos']
+            pdfs_este_correo = 0
+            for contenido in datos['pdfs']:
+                if self.motor.guardar_pdf(contenido, datos['remitente'], datos['asunto'],
+                                          fecha_correo, self.cuenta.correo_gmail,
+                                          directorio_salida):
+                    pdfs_este_correo += 1
+
+            self.pdfs += pdfs_este_correo
+            if pdfs_este_correo:
+                self.correos_con_pdf += 1
+
+            CorreoProcesado.registrar_procesado(
+                self.cuenta.id, message_id, self.carpeta, fecha_correo,
+                datos['remitente'][:255] if datos['remitente'] else None,
+                datos['asunto'][:500] if datos['asunto'] else None,
+                pdfs_este_correo > 0, pdfs_este_correo,
+                actualizar=self.forzar
+            )
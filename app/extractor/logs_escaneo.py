@@ -0,0 +1,157 @@
+"""
+Archivo persistente de los logs de cada escaneo.
+
+Cada escaneo escribe sus mensajes en un archivo de texto propio, solo por
+agregado, con una línea "fecha<TAB>mensaje" por entrada. Cuando el archivo
+supera el tamaño máximo se rota a escaneo_<id>.log.1, .2, ... (las partes más
+antiguas se borran) y los archivos de escaneos viejos se eliminan pasado el
+periodo de retención. La lectura es por páginas con un cursor de posición,
+sin cargar el archivo entero.
+"""
+
+import os
+import re
+import time
+from threading import Lock
+
+
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+PATRON_ESCAPE = re.compile(r'\\(.)')
+
+
+def ruta_log(directorio, escaneo_id, parte=0):
+    """Ruta del archivo de log (parte 0 = el actual, 1.. = rotadas)."""
+    nombre = f'escaneo_{int(escaneo_id)}.log'
+    if parte:
+        nombre += f'.{parte}'
+    return os.path.join(directorio, nombre)
+
+
+def partes_log(directorio, escaneo_id):
+    """Rutas existentes del log de un escaneo, de la más antigua a la actual."""
+    partes = []
+    parte = 1
+    while os.path.exists(ruta_log(directorio, escaneo_id, parte)):
+        partes.append(ruta_log(directorio, escaneo_id, parte))
+        parte += 1
+    partes.reverse()
+    actual = ruta_log(directorio, escaneo_id)
+    if os.path.exists(actual):
+        partes.append(actual)
+    return partes
+
+
+def _escapar(mensaje):
+    return mensaje.replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '')
+
+
+def _desescapar(texto):
+    return PATRON_ESCAPE.sub(lambda m: '\n' if m.group(1) == 'n' else m.group(1), texto)
+
+
+class RegistroEscaneo:
+    """Escritor del log de un escaneo, seguro entre hilos."""
+
+    def __init__(self, directorio, escaneo_id, max_bytes=5 * 1024 * 1024, max_partes=3):
+        self.directorio = directorio
+        self.escaneo_id = escaneo_id
+        self.max_bytes = max_bytes
+        self.max_partes = max_partes
+        self._lock = Lock()
+        os.makedirs(directorio, exist_ok=True)
+
+    def escribir(self, fecha, mensaje):
+        """Agrega una entrada al log. Nunca lanza: el log no debe parar el escaneo."""
+        linea = f'{fecha.strftime(FORMATO_FECHA)}\t{_escapar(mensaje)}\n'
+        linea = linea.encode('utf-8', errors='replace')
+        ruta = ruta_log(self.directorio, self.escaneo_id)
+        with self._lock:
+            try:
+                if self.max_bytes and os.path.exists(ruta) and \
+                        os.path.getsize(ruta) + len(linea) > self.max_bytes:
+                    self._rotar()
+                with open(ruta, 'ab') as f:
+                    f.write(linea)
+            except OSError:
+                pass
+
+    def _rotar(self):
+        """Desplaza las partes (.1 -> .2, ...) y descarta la más antigua."""
+        mas_antigua = ruta_log(self.directorio, self.escaneo_id, self.max_partes)
+        if os.path.exists(mas_antigua):
+            os.remove(mas_antigua)
+        for parte in range(self.max_partes - 1, -1, -1):
+            origen = ruta_log(self.directorio, self.escaneo_id, parte)
+            if os.path.exists(origen):
+                os.replace(origen, ruta_log(self.directorio, self.escaneo_id, parte + 1))
+
+
+def leer_pagina(directorio, escaneo_id, cursor=None, limite=200):
+    """
+    Lee hasta `limite` entradas desde el cursor.
+
+    El cursor "indice:posicion" señala una parte (por orden de antigüedad) y
+    un byte dentro de ella; None empieza por el principio. Devuelve
+    (entradas, siguiente_cursor, hay_mas). Con un escaneo en curso se puede
+    volver a pedir el mismo cursor para leer las entradas nuevas. Si una
+    rotación desplaza las partes entre dos páginas se pueden repetir o
+    saltar entradas de esa frontera.
+    """
+    partes = partes_log(directorio, escaneo_id)
+    indice, posicion = 0, 0
+    if cursor:
+        try:
+            indice, posicion = (int(x) for x in cursor.split(':', 1))
+        except ValueError:
+            indice, posicion = 0, 0
+
+    entradas = []
+    while indice < len(partes):
+        with open(partes[indice], 'rb') as f:
+            f.seek(posicion)
+            while len(entradas) < limite:
+                linea = f.readline()
+                # Una línea sin salto está a medio escribir: se leerá después
+                if not linea.endswith(b'\n'):
+                    break
+                posicion = f.tell()
+                fecha, _, mensaje = linea.decode('utf-8', errors='replace').rstrip('\n').partition('\t')
+                entradas.append({'fecha': fecha, 'mensaje': _desescapar(mensaje)})
+            fin_parte = posicion >= os.path.getsize(partes[indice])
+
+        ultima = indice == len(partes) - 1
+        if len(entradas) >= limite or not fin_parte or ultima:
+            return entradas, f'{indice}:{posicion}', not (fin_parte and ultima)
+        indice, posicion = indice + 1, 0
+
+    return entradas, cursor or '0:0', False
+
+
+def iterar_log(directorio, escaneo_id, tamano_bloque=64 * 1024):
+    """Genera el log completo en bloques de texto (para descargar en streaming)."""
+    for ruta in partes_log(directorio, escaneo_id):
+        with open(ruta, 'rb') as f:
+            while True:
+                bloque = f.read(tamano_bloque)
+                if not bloque:
+                    break
+                yield bloque
+
+
+def limpiar_logs_antiguos(directorio, dias_retencion):
+    """Borra los logs no modificados en los últimos `dias_retencion` días."""
+    if not dias_retencion or not os.path.isdir(directorio):
+        return 0
+    limite = time.time() - dias_retencion * 86400
+    borrados = 0
+    for nombre in os.listdir(directorio):
+        if not nombre.startswith('escaneo_'):
+            continue
+        ruta = os.path.join(directorio, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+                borrados += 1
+        except OSError:
+            continue
+    return borrados
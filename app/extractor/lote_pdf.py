@@ -0,0 +1,279 @@
+"""
+Interpretación por lotes de PDFs en segundo plano.
+
+Procesar lote crea una póliza por cada PDF seleccionado. En vez de hacerlo
+dentro de la petición, el trabajo corre en un hilo que reparte los PDFs en
+un pool de procesos aislados (uno por núcleo por defecto, con límite de
+tiempo y memoria por PDF), guarda cada póliza en cuanto llega su resultado
+con commits cada pocos archivos y deja el resultado de cada archivo a la
+vista del endpoint de estado.
+"""
+
+import os
+import uuid
+from concurrent.futures import as_completed
+from datetime import datetime, timedelta
+from threading import Thread, Lock
+
+from app.extractor.aislamiento import PoolExtraccion, ErrorExtraccion, limites_extraccion
+
+
+# Los lotes terminados se olvidan pasado este tiempo
+RETENCION_LOTES = timedelta(hours=1)
+
+
+class LoteInterpretacion:
+    """Crea en segundo plano las pólizas de un lote de PDFs para un cliente."""
+
+    ESTADO_EN_PROGRESO = 'en_progreso'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+
+    # Resultado de cada archivo
+    ARCHIVO_PENDIENTE = 'pendiente'
+    ARCHIVO_CREADA = 'creada'
+    ARCHIVO_OMITIDO = 'omitido'
+    ARCHIVO_ERROR = 'error'
+
+    def __init__(self, app, usuario_id, cliente_id, archivo_ids):
+        self.id = uuid.uuid4().hex
+        self.app = app
+        self.usuario_id = usuario_id
+        self.cliente_id = cliente_id
+        self.archivo_ids = [int(archivo_id) for archivo_id in archivo_ids]
+        self.estado = self.ESTADO_EN_PROGRESO
+        self.resultados = {}  # archivo_id -> dict con el resultado del archivo
+        self.error = None
+        self.fecha_inicio = datetime.utcnow()
+        self.fecha_fin = None
+
+    def ejecutar(self):
+        """Lanza el lote en un hilo separado."""
+        thread = Thread(target=self._procesar_con_contexto)
+        thread.daemon = True
+        thread.start()
+
+    def _procesar_con_contexto(self):
+        from app import db
+
+        with self.app.app_context():
+            try:
+                self._procesar()
+                self.estado = self.ESTADO_COMPLETADO
+            except Exception as e:
+                db.session.rollback()
+                self.error = str(e)
+                self.estado = self.ESTADO_ERROR
+            finally:
+                self.fecha_fin = datetime.utcnow()
+
+    def _resultado(self, archivo_id, nombre=None, estado=ARCHIVO_PENDIENTE, **extra):
+        resultado = self.resultados.setdefault(archivo_id, {
+            'archivo_id': archivo_id,
+            'nombre': nombre,
+            'estado': estado,
+            'poliza_id': None,
+            'numero_poliza': None,
+            'confianza': None,
+            'error': None,
+            'estado_extraccion': None,  # ok, timeout, oom o corrupt
+        })
+        resultado['estado'] = estado
+        resultado.update(extra)
+        return resultado
+
+    def _procesar(self):
+        from app import db
+        from app.models import ArchivoDescargado, Escaneo, PolizaCliente, ExtraccionPdf
+        from app.extractor.pdf_parser import interpretar_pdf_archivo, opciones_extraccion
+
+        archivos = {
+            archivo.id: archivo for archivo in ArchivoDescargado.query.join(Escaneo).filter(
+                ArchivoDescargado.id.in_(self.archivo_ids),
+                Escaneo.usuario_id == self.usuario_id
+            ).all()
+        }
+        con_poliza = {
+            archivo_id for (archivo_id,) in db.session.query(PolizaCliente.archivo_id).filter(
+                PolizaCliente.archivo_id.in_(list(archivos))
+            ).all()
+        }
+
+        pendientes = []
+        originales = set()  # Originales de los PDFs ya aceptados en el lote
+        for archivo_id in self.archivo_ids:
+            archivo = archivos.get(archivo_id)
+            if not archivo:
+                self._resultado(archivo_id, estado=self.ARCHIVO_ERROR, error='Archivo no encontrado')
+            elif archivo_id in con_poliza:
+                self._resultado(archivo_id, archivo.nombre_archivo, self.ARCHIVO_OMITIDO,
+                                error='Ya tiene póliza')
+            elif not archivo.es_poliza():
+                self._resultado(archivo_id, archivo.nombre_archivo, self.ARCHIVO_OMITIDO,
+                                error=f'No es una póliza ({archivo.etiqueta_tipo_documento()})')
+            elif not os.path.exists(archivo.ruta_archivo):
+                self._resultado(archivo_id, archivo.nombre_archivo, self.ARCHIVO_ERROR,
+                                error='Archivo no encontrado en el sistema')
+            else:
+                motivo = self._casi_identico(archivo, originales)
+                if motivo:
+                    self._resultado(archivo_id, archivo.nombre_archivo, self.ARCHIVO_OMITIDO, error=motivo)
+                    continue
+                self._resultado(archivo_id, archivo.nombre_archivo)
+                pendientes.append(archivo)
+        db.session.rollback()  # No dejar abierta la transacción de lectura
+        if not pendientes:
+            return
+
+        config = self.app.config
+        procesos = config.get('LOTE_PDF_PROCESOS') or os.cpu_count() or 2
+        cada = config.get('LOTE_PDF_COMMIT', 25)
+        sin_confirmar = 0
+
+        hashes = {archivo.id: archivo.hash_archivo for archivo in pendientes}
+        opciones = opciones_extraccion(config)
+
+        # Procesos aislados: reciben la ruta y devuelven un dict, sin usar la sesión
+        # de BD. Un PDF que se cuelga o agota la memoria solo falla ese archivo.
+        # Las pólizas se crean sin revisión: siempre con todas las páginas leídas.
+        with PoolExtraccion(procesos=min(procesos, len(pendientes)), **limites_extraccion(config)) as pool:
+            futuros = {
+                pool.submit(
+                    interpretar_pdf_archivo, archivo.ruta_archivo, archivo.hash_archivo,
+                    config.get('TEXTO_CACHE_FOLDER'),
+                    config.get('TEXTO_CACHE_MAX_MB', 500) * 1024 * 1024,
+                    opciones, completo=True, compania_id=archivo.compania_id
+                ): archivo.id
+                for archivo in pendientes
+            }
+            for futuro in as_completed(futuros):
+                archivo_id = futuros[futuro]
+                try:
+                    datos = futuro.result()
+                except ErrorExtraccion as e:
+                    if hashes[archivo_id]:
+                        ExtraccionPdf.registrar_fallo(hashes[archivo_id], e.estado, str(e))
+                    self._resultado(archivo_id, estado=self.ARCHIVO_ERROR, error=str(e),
+                                    estado_extraccion=e.estado)
+                    continue
+                except Exception as e:
+                    self._resultado(archivo_id, estado=self.ARCHIVO_ERROR, error=str(e))
+                    continue
+                if not datos:
+                    self._resultado(archivo_id, estado=self.ARCHIVO_ERROR, error='No se pudo leer el PDF')
+                    continue
+
+                self._crear_poliza(archivo_id, datos)
+                sin_confirmar += 1
+                # Commits incrementales: lo creado queda guardado aunque el lote falle después
+                if sin_confirmar >= cada:
+                    db.session.commit()
+                    sin_confirmar = 0
+        db.session.commit()
+
+    def _casi_identico(self, archivo, originales):
+        """
+        Motivo para omitir un PDF casi idéntico (otro hash, mismo texto) a uno
+        que ya tiene póliza o que ya está en el lote, o None. Los PDFs que la
+        pre-extracción todavía no firmó no se comparan.
+        """
+        from app import db
+        from app.models import ArchivoDescargado, Escaneo, PolizaCliente, FirmaTextoPdf
+
+        firma = FirmaTextoPdf.obtener(archivo.hash_archivo)
+        if not firma:
+            return None
+        original = firma.duplicado_de or firma.hash_archivo
+        if original in originales:
+            return 'Casi idéntico a otro PDF del lote'
+
+        grupo = FirmaTextoPdf.hashes_grupo(archivo.hash_archivo)
+        if grupo:
+            con_poliza = db.session.query(ArchivoDescargado.nombre_archivo).join(
+                PolizaCliente, PolizaCliente.archivo_id == ArchivoDescargado.id
+            ).join(Escaneo).filter(
+                ArchivoDescargado.hash_archivo.in_(grupo),
+                Escaneo.usuario_id == self.usuario_id
+            ).first()
+            if con_poliza:
+                return f'Casi idéntico a {con_poliza[0]}, que ya tiene póliza'
+        originales.add(original)
+        return None
+
+    def _crear_poliza(self, archivo_id, datos):
+        """Crea la póliza de un archivo. Un error solo afecta a ese archivo."""
+        from app import db
+        from app.models import ArchivoDescargado, PolizaCliente, ExtraccionPdf
+        from app.extractor.pdf_parser import ExtractorDatosPoliza
+
+        try:
+            with db.session.begin_nested():
+                # Pudo procesarse a mano mientras el lote corría
+                if PolizaCliente.query.filter_by(archivo_id=archivo_id).first():
+                    self._resultado(archivo_id, estado=self.ARCHIVO_OMITIDO, error='Ya tiene póliza')
+                    return
+                archivo = db.session.get(ArchivoDescargado, archivo_id)
+                if archivo.hash_archivo:
+                    ExtraccionPdf.guardar(archivo.hash_archivo, datos)
+                poliza = PolizaCliente(
+                    cliente_id=self.cliente_id,
+                    archivo_id=archivo_id,
+                    compania_id=archivo.compania_id,
+                    fecha_extraccion=datetime.utcnow(),
+                    **ExtractorDatosPoliza().datos_para_poliza(datos)
+                )
+                db.session.add(poliza)
+            self._resultado(archivo_id, estado=self.ARCHIVO_CREADA, poliza_id=poliza.id,
+                            numero_poliza=poliza.numero_poliza, confianza=datos.get('confianza'),
+                            estado_extraccion='ok')
+        except Exception as e:
+            self._resultado(archivo_id, estado=self.ARCHIVO_ERROR, error=str(e))
+
+    def contadores(self):
+        """Archivos por resultado."""
+        contadores = {estado: 0 for estado in (self.ARCHIVO_PENDIENTE, self.ARCHIVO_CREADA,
+                                               self.ARCHIVO_OMITIDO, self.ARCHIVO_ERROR)}
+        for resultado in list(self.resultados.values()):
+            contadores[resultado['estado']] += 1
+        return contadores
+
+    def obtener_estado(self):
+        """Estado serializable para la interfaz."""
+        contadores = self.contadores()
+        return {
+            'id': self.id,
+            'estado': self.estado,
+            'total': len(self.archivo_ids),
+            'procesados': len(self.archivo_ids) - contadores[self.ARCHIVO_PENDIENTE],
+            'contadores': contadores,
+            'archivos': [self.resultados[archivo_id] for archivo_id in self.archivo_ids
+                         if archivo_id in self.resultados],
+            'error': self.error,
+            'fecha_inicio': self.fecha_inicio.isoformat(),
+            'fecha_fin': self.fecha_fin.isoformat() if self.fecha_fin else None,
+        }
+
+
+# Lotes en curso y terminados recientes (lote_id -> LoteInterpretacion)
+lotes_activos = {}
+_lock_lotes = Lock()
+
+
+def crear_lote(app, usuario_id, cliente_id, archivo_ids):
+    """Crea un lote y olvida los terminados hace más de RETENCION_LOTES."""
+    with _lock_lotes:
+        limite = datetime.utcnow() - RETENCION_LOTES
+        for lote_id, lote in list(lotes_activos.items()):
+            if lote.fecha_fin and lote.fecha_fin < limite:
+                del lotes_activos[lote_id]
+        lote = LoteInterpretacion(app, usuario_id, cliente_id, archivo_ids)
+        lotes_activos[lote.id] = lote
+        return lote
+
+
+def obtener_lote(lote_id, usuario_id):
+    """Devuelve un lote del usuario, o None."""
+    lote = lotes_activos.get(lote_id)
+    if lote and lote.usuario_id == usuario_id:
+        return lote
+    return None
@@ -9,10 +9,94 @@ from email.header import decode_header
 import os
 import hashlib
 import re
-from datetime import datetime
-from threading import Thread, Event
+import sys
+from concurrent.futures import wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from threading import Event, Lock, BoundedSemaphore
 from time import sleep
 from flask import current_app
+from app.extractor.imap_metadatos import parsear_respuesta_fetch, parsear_cabeceras, partes_pdf
+from app.extractor.planificador import planificador_escaneos
+from app.extractor.digests import ConjuntoDigests
+from app.extractor.companias import cache_companias, ContadorCompanias
+from app.extractor.logs_escaneo import RegistroEscaneo, limpiar_logs_antiguos
+from app.extractor.aislamiento import PoolExtraccion, ErrorExtraccion, limites_extraccion
+
+
+def decodificar_cabecera(valor):
+    """Decodifica el valor de una cabecera de correo."""
+    if valor is None:
+        return ""
+    partes_decodificadas = decode_header(valor)
+    resultado = ""
+    for parte, codificacion in partes_decodificadas:
+        if isinstance(parte, bytes):
+            resultado += parte.decode(codificacion or 'utf-8', errors='replace')
+        else:
+            resultado += parte
+    return resultado
+
+
+def extraer_adjuntos_pdf(msg):
+    """
+    Recorre un mensaje y devuelve sus adjuntos PDF como (nombre, contenido).
+
+    Solo considera partes application/pdf con nombre terminado en .pdf.
+    """
+    adjuntos = []
+    for parte in msg.walk():
+        tipo_contenido = parte.get_content_type()
+        nombre_archivo = parte.get_filename()
+
+        if nombre_archivo and tipo_contenido == 'application/pdf':
+            nombre_archivo = decodificar_cabecera(nombre_archivo)
+
+            if not nombre_archivo.lower().endswith('.pdf'):
+                continue
+
+            contenido = parte.get_payload(decode=True)
+            if not contenido:
+                continue
+
+            adjuntos.append((nombre_archivo, contenido))
+    return adjuntos
+
+
+def memoria_proceso_mb():
+    """
+    Memoria residente (RSS) actual del proceso en MB.
+
+    Sin /proc (macOS, Windows) devuelve el pico de RSS, o None si no se
+    puede medir.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            paginas = int(f.read().split()[1])
+        return round(paginas * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss viene en bytes en macOS y en KB en Linux
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(pico / divisor, 1)
+
+
+# Límite global de sesiones IMAP abiertas a la vez (todos los escaneos)
+_sesiones_imap = None
+_lock_sesiones_imap = Lock()
+
+
+def semaforo_sesiones_imap(app):
+    """Devuelve el semáforo global de sesiones IMAP, creándolo la primera vez."""
+    global _sesiones_imap
+    with _lock_sesiones_imap:
+        if _sesiones_imap is None:
+            _sesiones_imap = BoundedSemaphore(app.config.get('ESCANEO_MAX_SESIONES_IMAP', 3))
+    return _sesiones_imap
 
 
 class MotorExtractorWeb:
@@ -22,8 +106,16 @@ class MotorExtractorWeb:
     PUERTO_IMAP = 993
     MAX_CUENTAS_SIMULTANEAS = 5
 
+    # Días que se repasan antes de la última fecha en un escaneo incremental
+    # (SINCE de IMAP solo compara fechas, sin hora)
+    MARGEN_INCREMENTAL_DIAS = 1
+
+    # Mensajes de log que se conservan en memoria por escaneo
+    MAX_LOGS = 1000
+
     # Estados del motor
     ESTADO_IDLE = 'idle'
+    ESTADO_EN_COLA = 'en_cola'
     ESTADO_EJECUTANDO = 'ejecutando'
     ESTADO_PAUSADO = 'pausado'
     ESTADO_DETENIDO = 'detenido'
@@ -32,7 +124,8 @@ class MotorExtractorWeb:
     def __init__(self, escaneo_id, app):
         self.escaneo_id = escaneo_id
         self.app = app
-        self.hashes_descargados = set()
+        self.hashes_descargados = ConjuntoDigests()  # 16 bytes por PDF
+        self.contador_companias = ContadorCompanias()
         self.detener_solicitado = False
         self.pausado = False
         self.evento_pausa = Event()
@@ -44,16 +137,38 @@ class MotorExtractorWeb:
         self.estado_motor = self.ESTADO_IDLE
         self.correo_actual = 0
         self.total_correos_carpeta = 0
+        self.pool_interpretacion = None
+        self.max_interpretaciones_pendientes = 0
+        self.interpretaciones_pendientes = {}  # hash_archivo -> Future
+        self.opciones_interpretacion = None  # opciones_extraccion, leídas una vez por escaneo
+        self.pdfs_interpretados = 0
+        self.pdfs_vinculados = 0  # Copias casi idénticas que tomaron la extracción del original
+        self.memoria_mb = None
+        self.memoria_pico_mb = None
+
+        # Copia persistente del log (logs solo guarda los últimos MAX_LOGS)
+        self.archivo_log = None
+        if escaneo_id and app:
+            self.archivo_log = RegistroEscaneo(
+                app.config.get('ESCANEO_LOGS_FOLDER', 'logs_escaneo'), escaneo_id,
+                app.config.get('ESCANEO_LOG_MAX_BYTES', 5 * 1024 * 1024),
+                app.config.get('ESCANEO_LOG_PARTES', 3)
+            )
 
     def registrar(self, mensaje):
         """Registra un mensaje de log."""
         prefijo = ""
         if self.cuenta_actual:
             prefijo = f"[{self.cuenta_actual}] "
+        ahora = datetime.now()
         self.logs.append({
-            'timestamp': datetime.now().strftime('%H:%M:%S'),
+            'timestamp': ahora.strftime('%H:%M:%S'),
             'mensaje': f"{prefijo}{mensaje}"
         })
+        if self.archivo_log:
+            self.archivo_log.escribir(ahora, f"{prefijo}{mensaje}")
+        if len(self.logs) > self.MAX_LOGS:
+            del self.logs[:len(self.logs) - self.MAX_LOGS]
 
     def probar_conexion(self, correo, contrasena):
         """Prueba la conexión a Gmail."""
@@ -76,21 +191,44 @@ class MotorExtractorWeb:
 
     def decodificar_cabecera(self, valor):
         """Decodifica el valor de una cabecera de correo."""
-        if valor is None:
-            return ""
-        partes_decodificadas = decode_header(valor)
-        resultado = ""
-        for parte, codificacion in partes_decodificadas:
-            if isinstance(parte, bytes):
-                resultado += parte.decode(codificacion or 'utf-8', errors='replace')
-            else:
-                resultado += parte
-        return resultado
+        return decodificar_cabecera(valor)
 
     def obtener_hash_archivo(self, contenido):
         """Genera hash del contenido del archivo."""
         return hashlib.sha256(contenido).hexdigest()
 
+    def fecha_desde_internaldate(self, valor):
+        """
+        Convierte el INTERNALDATE del servidor IMAP en datetime local.
+
+        Acepta el valor ya extraído ('17-Jul-1996 02:44:25 -0700') o la
+        línea de respuesta FETCH completa. Devuelve None si no está presente.
+        """
+        if not valor:
+            return None
+        if isinstance(valor, str):
+            valor = valor.encode('ascii', errors='replace')
+        if b'INTERNALDATE' not in valor:
+            valor = b'INTERNALDATE "' + valor + b'"'
+        tupla = imaplib.Internaldate2tuple(valor)
+        if not tupla:
+            return None
+        return datetime(*tupla[:6])
+
+    def fecha_desde_cabecera(self, fecha_str):
+        """Convierte la cabecera Date en datetime (None si no se puede parsear)."""
+        try:
+            tupla_fecha = email.utils.parsedate_tz(fecha_str)
+            if tupla_fecha:
+                return datetime.fromtimestamp(email.utils.mktime_tz(tupla_fecha))
+        except:
+            pass
+        return None
+
+    def parsear_fecha_correo(self, fecha_str):
+        """Convierte la cabecera Date en datetime (ahora si no se puede parsear)."""
+        return self.fecha_desde_cabecera(fecha_str) or datetime.now()
+
     def coincide_palabras_clave(self, asunto, remitente, palabras_clave):
         """Verifica si el correo coincide con alguna palabra clave."""
         if not palabras_clave:
@@ -98,20 +236,253 @@ class MotorExtractorWeb:
         texto = f"{asunto} {remitente}".lower()
         return any(pc.lower() in texto for pc in palabras_clave)
 
+    def guardar_pdf(self, contenido, remitente, asunto, fecha_correo, cuenta_origen, directorio_salida):
+        """
+        Guarda un PDF adjunto en disco y lo registra como ArchivoDescargado.
+
+        Aplica la deduplicación por hash del escaneo y la detección de
+        compañía por remitente. Devuelve True si el archivo era nuevo.
+        """
+        from app import db
+        from app.models import ArchivoDescargado
+        from app.extractor.clasificador import clasificar_pdf, TIPO_POLIZA
+
+        # Verificar duplicados
+        hash_archivo = self.obtener_hash_archivo(contenido)
+        if hash_archivo in self.hashes_descargados:
+            return False
+
+        self.hashes_descargados.add(hash_archivo)
+
+        # Detectar o crear compañía (caché por dominio; el contador se vuelca por lote)
+        compania = cache_companias.obtener(remitente, self.contador_companias)
+        if compania:
+            self.contador_companias.sumar(compania[0])
+
+        # Construir nombre de archivo
+        remitente_limpio = self.sanitizar_nombre(
+            remitente.split('<')[0].strip()[:30]
+        )
+        asunto_limpio = self.sanitizar_nombre(asunto[:40])
+        fecha_limpia = fecha_correo.strftime('%Y%m%d')
+
+        nuevo_nombre = f"{remitente_limpio}_{asunto_limpio}_{fecha_limpia}.pdf"
+        ruta_salida = os.path.join(directorio_salida, nuevo_nombre)
+
+        # Manejar conflictos
+        contador = 1
+        while os.path.exists(ruta_salida):
+            nuevo_nombre = f"{remitente_limpio}_{asunto_limpio}_{fecha_limpia}_{contador}.pdf"
+            ruta_salida = os.path.join(directorio_salida, nuevo_nombre)
+            contador += 1
+
+        # Guardar archivo
+        with open(ruta_salida, 'wb') as f:
+            f.write(contenido)
+
+        # Registrar en base de datos con compañía
+        archivo = ArchivoDescargado(
+            escaneo_id=self.escaneo_id,
+            nombre_archivo=nuevo_nombre,
+            ruta_archivo=ruta_salida,
+            tamano_bytes=len(contenido),
+            hash_archivo=hash_archivo,
+            remitente=remitente[:255],
+            asunto=asunto[:500],
+            fecha_correo=fecha_correo,
+            compania_id=compania[0] if compania else None,
+            nombre_compania_original=remitente.split('<')[0].strip()[:255],
+            cuenta_origen=cuenta_origen,
+            tipo_documento=clasificar_pdf(contenido=contenido)
+        )
+        db.session.add(archivo)
+        # Recibos, endosos y demás no se interpretan
+        if archivo.es_poliza():
+            self._encolar_interpretacion(hash_archivo, contenido, compania[0] if compania else None)
+
+        nombre_cia = compania[1] if compania else 'Desconocida'
+        tipo = '' if archivo.tipo_documento in (None, TIPO_POLIZA) else f" ({archivo.tipo_documento})"
+        self.registrar(f"Descargado: {nuevo_nombre} [{nombre_cia}]{tipo}")
+        return True
+
+    def _obtener_metadatos_lote(self, mail, ids_lote):
+        """
+        Obtiene fecha del servidor, tamaño, estructura MIME y cabeceras de
+        un lote de correos con un solo FETCH, sin descargar los cuerpos.
+
+        Returns:
+            dict {id_msg: metadatos}. Vacío si el servidor no responde bien;
+            en ese caso los correos se procesan descargando el cuerpo.
+        """
+        if not ids_lote:
+            return {}
+
+        try:
+            resultado, datos = mail.fetch(
+                b','.join(ids_lote),
+                '(INTERNALDATE RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (MESSAGE-ID FROM SUBJECT DATE)])'
+            )
+            if resultado != 'OK':
+                return {}
+            respuesta = parsear_respuesta_fetch(datos)
+        except Exception as e:
+            self.registrar(f"Prefiltro no disponible para este lote: {e}")
+            return {}
+
+        metadatos = {}
+        for id_msg, atributos in respuesta.items():
+            bloque = next((valor for clave, valor in atributos.items()
+                           if clave.startswith('BODY[HEADER')), b'')
+            cabeceras = parsear_cabeceras(bloque)
+            try:
+                tamano = int(atributos.get('RFC822.SIZE') or 0)
+            except ValueError:
+                tamano = 0
+
+            metadatos[id_msg] = {
+                'tamano': tamano,
+                'partes_pdf': partes_pdf(atributos.get('BODYSTRUCTURE')),
+                'message_id': cabeceras.get('Message-ID', '') or cabeceras.get('Message-Id', ''),
+                'asunto': self.decodificar_cabecera(cabeceras['Subject']),
+                'remitente': self.decodificar_cabecera(cabeceras['From']),
+                # Fecha del servidor; si no la hay, la cabecera Date (None si tampoco)
+                'fecha': (self.fecha_desde_internaldate(atributos.get('INTERNALDATE'))
+                          or self.fecha_desde_cabecera(cabeceras['Date'])),
+            }
+        return metadatos
+
+    def _iniciar_interpretacion(self, config):
+        """Crea el pool de procesos para interpretar PDFs durante el escaneo (opcional)."""
+        from app.extractor.pdf_parser import opciones_extraccion
+
+        if not config.get('interpretar_pdfs', self.app.config.get('ESCANEO_INTERPRETAR_PDFS', False)):
+            return
+
+        procesos = self.app.config.get('ESCANEO_PROCESOS_INTERPRETACION', 2)
+        # Procesos aislados: solo reciben bytes y devuelven un dict, sin usar la sesión
+        # de BD. Un PDF que se cuelga se corta por tiempo y no retiene el escaneo.
+        self.pool_interpretacion = PoolExtraccion(procesos=procesos, **limites_extraccion(self.app.config))
+        # Limitar los PDFs en cola para no acumular bytes en memoria
+        self.max_interpretaciones_pendientes = procesos * 4
+        # Plantillas, orden de patrones y claves por remitente: una sola lectura por escaneo
+        self.opciones_interpretacion = opciones_extraccion(self.app.config)
+        self.registrar(f"Interpretación de PDFs activada ({procesos} procesos)")
+
+    def _encolar_interpretacion(self, hash_archivo, contenido, compania_id=None):
+        """
+        Envía los bytes de un PDF recién descargado al pool de interpretación.
+
+        Antes lo firma (ver app/extractor/duplicados.py): una copia casi
+        idéntica de un PDF ya interpretado toma la extracción del original y
+        no se encola.
+        """
+        from app.models import ExtraccionPdf, FirmaTextoPdf
+        from app.extractor.pdf_parser import interpretar_pdf_bytes
+        from app.extractor.duplicados import firma_pdf
+
+        if not self.pool_interpretacion or hash_archivo in self.interpretaciones_pendientes:
+            return
+        extraccion = ExtraccionPdf.obtener(hash_archivo)
+        if extraccion and extraccion.es_vigente():
+            return
+
+        # Como el clasificador: solo las primeras páginas, en el hilo del escaneo
+        if not FirmaTextoPdf.obtener(hash_archivo):
+            try:
+                firma = firma_pdf(contenido=contenido)
+            except Exception:
+                firma = None  # La interpretación informará el error
+            original = FirmaTextoPdf.registrar(hash_archivo, firma).duplicado_de
+            if original and ExtraccionPdf.vincular_duplicado(hash_archivo, original):
+                self.pdfs_vinculados += 1
+                return
+
+        while len(self.interpretaciones_pendientes) >= self.max_interpretaciones_pendientes:
+            self._recoger_interpretaciones(bloquear=True)
+
+        self.interpretaciones_pendientes[hash_archivo] = self.pool_interpretacion.submit(
+            interpretar_pdf_bytes, contenido, hash_archivo,
+            self.app.config.get('TEXTO_CACHE_FOLDER'),
+            self.app.config.get('TEXTO_CACHE_MAX_MB', 500) * 1024 * 1024,
+            self.opciones_interpretacion, compania_id
+        )
+
+    def _recoger_interpretaciones(self, bloquear=False, todas=False):
+        """Guarda en ExtraccionPdf los resultados ya terminados del pool."""
+        from app.models import ExtraccionPdf
+
+        if not self.interpretaciones_pendientes:
+            return
+
+        futuros = list(self.interpretaciones_pendientes.values())
+        if todas:
+            wait(futuros)
+        elif bloquear:
+            wait(futuros, return_when=FIRST_COMPLETED)
+
+        for hash_archivo, futuro in list(self.interpretaciones_pendientes.items()):
+            if not futuro.done():
+                continue
+            del self.interpretaciones_pendientes[hash_archivo]
+            try:
+                datos = futuro.result()
+            except ErrorExtraccion as e:
+                ExtraccionPdf.registrar_fallo(hash_archivo, e.estado, str(e))
+                self.registrar(f"PDF {hash_archivo[:12]} no interpretado ({e.estado}): {e}")
+                continue
+            except Exception as e:
+                self.registrar(f"Error interpretando PDF {hash_archivo[:12]}: {e}")
+                continue
+            if datos:
+                ExtraccionPdf.guardar(hash_archivo, datos)
+                self.pdfs_interpretados += 1
+
+    def _finalizar_interpretacion(self, esperar=True):
+        """Espera los PDFs pendientes (si corresponde) y cierra el pool."""
+        from app import db
+
+        if not self.pool_interpretacion:
+            return
+
+        if esperar and self.interpretaciones_pendientes:
+            self.registrar(f"Esperando interpretación de {len(self.interpretaciones_pendientes)} PDF(s)...")
+            self._recoger_interpretaciones(todas=True)
+            db.session.commit()
+            self.registrar(f"PDFs interpretados: {self.pdfs_interpretados}")
+        if self.pdfs_vinculados:
+            self.registrar(f"Copias casi idénticas de PDFs ya interpretados: {self.pdfs_vinculados}")
+
+        self.pool_interpretacion.shutdown(wait=esperar, cancel_futures=not esperar)
+        self.pool_interpretacion = None
+        self.interpretaciones_pendientes = {}
+
     def ejecutar_escaneo_multi(self, cuentas, config, directorio_salida):
-        """Ejecuta el escaneo de múltiples cuentas en un hilo separado."""
+        """
+        Encola el escaneo de múltiples cuentas en el planificador global.
+
+        Se ejecuta en un hilo separado cuando hay hueco (ver planificador.py).
+        """
         # Extraer solo los IDs para evitar problemas de sesion SQLAlchemy
         # Los objetos se re-consultan dentro del hilo con el contexto correcto
         cuenta_ids = [c.id for c in cuentas]
-        thread = Thread(target=self._escanear_multi_con_contexto,
-                       args=(cuenta_ids, config, directorio_salida))
-        thread.daemon = True
-        thread.start()
+        usuario_id = cuentas[0].usuario_id if cuentas else None
+        planificador_escaneos.encolar(self, usuario_id, cuenta_ids, config, directorio_salida)
 
     def _escanear_multi_con_contexto(self, cuenta_ids, config, directorio_salida):
-        """Ejecuta el escaneo multi-cuenta dentro del contexto de la aplicación."""
-        with self.app.app_context():
-            self._escanear_multi(cuenta_ids, config, directorio_salida)
+        """
+        Ejecuta el escaneo multi-cuenta dentro del contexto de la aplicación.
+
+        Al salir el motor queda siempre en un estado terminal, aunque
+        _escanear_multi vuelva antes de empezar (escaneo o cuentas
+        inexistentes) o falle fuera de su try: el programador de escaneos
+        libera su hueco según ese estado.
+        """
+        try:
+            with self.app.app_context():
+                self._escanear_multi(cuenta_ids, config, directorio_salida)
+        finally:
+            if self.estado_motor not in (self.ESTADO_COMPLETADO, self.ESTADO_DETENIDO):
+                self.estado_motor = self.ESTADO_DETENIDO
 
     def _escanear_multi(self, cuenta_ids, config, directorio_salida):
         """Realiza el escaneo de múltiples cuentas de Gmail secuencialmente."""
@@ -131,6 +502,10 @@ class MotorExtractorWeb:
             db.session.commit()
             return
 
+        # El escaneo empieza ahora, no cuando se encoló
+        escaneo.fecha_inicio = datetime.utcnow()
+        db.session.commit()
+
         self.estado_motor = self.ESTADO_EJECUTANDO
         self.total_cuentas = len(cuentas)
         total_correos = 0
@@ -138,6 +513,10 @@ class MotorExtractorWeb:
 
         try:
             self.registrar(f"Iniciando escaneo de {self.total_cuentas} cuenta(s)")
+            self._iniciar_interpretacion(config)
+            cache_companias.calentar()
+            limpiar_logs_antiguos(self.app.config.get('ESCANEO_LOGS_FOLDER', 'logs_escaneo'),
+                                  self.app.config.get('ESCANEO_LOG_RETENCION_DIAS', 90))
 
             for index, cuenta in enumerate(cuentas):
                 # Verificar pausa/detención
@@ -171,16 +550,23 @@ class MotorExtractorWeb:
                 # Actualizar totales después de cada cuenta
                 escaneo.correos_escaneados = total_correos
                 escaneo.pdfs_descargados = total_pdfs
-                db.session.commit()
+                self.confirmar_lote()
+
+            # Los PDFs se interpretan antes de dar el escaneo por terminado
+            self._finalizar_interpretacion(esperar=not self.detener_solicitado)
 
             # Finalizar escaneo exitosamente
             escaneo.estado = 'cancelado' if self.detener_solicitado else 'completado'
             escaneo.fecha_fin = datetime.utcnow()
             escaneo.cuenta_actual = None
             self.estado_motor = self.ESTADO_COMPLETADO if not self.detener_solicitado else self.ESTADO_DETENIDO
+            self.contador_companias.volcar()
             db.session.commit()
+            self.contador_companias.publicar()
 
             self.registrar(f"Escaneo finalizado: {total_correos} correos, {total_pdfs} PDFs")
+            if self.memoria_pico_mb is not None:
+                self.registrar(f"Memoria del proceso: pico {self.memoria_pico_mb} MB")
 
         except Exception as e:
             # Capturar cualquier excepción y marcar como error
@@ -189,6 +575,14 @@ class MotorExtractorWeb:
             self.estado_motor = self.ESTADO_DETENIDO
 
             try:
+                self._finalizar_interpretacion(esperar=False)
+            except Exception:
+                pass
+
+            try:
+                # La sesión puede haber quedado invalidada por el error
+                db.session.rollback()
+                self.contador_companias.descartar()
                 escaneo.estado = 'error'
                 escaneo.mensaje_error = error_msg
                 escaneo.fecha_fin = datetime.utcnow()
@@ -202,7 +596,7 @@ class MotorExtractorWeb:
     def _escanear_cuenta(self, cuenta, config, directorio_salida, escaneo):
         """Escanea una cuenta individual de Gmail."""
         from app import db
-        from app.models import ArchivoDescargado, Compania, CorreoProcesado, HistorialEscaneoCarpeta
+        from app.models import CorreoProcesado, HistorialEscaneoCarpeta
 
         carpetas = config.get('carpetas', ['INBOX'])
         palabras_clave = config.get('palabras_clave', [])
@@ -212,9 +606,21 @@ class MotorExtractorWeb:
         # Opcion para forzar re-escaneo completo (ignorar memoria)
         forzar_escaneo = config.get('forzar_escaneo', False)
 
+        # Escaneo incremental (automático): solo correos desde el último escaneo
+        incremental = config.get('incremental', False) and not forzar_escaneo
+
+        # Límite de tamaño por adjunto PDF (0 o None = sin límite)
+        max_tamano_adjunto = config.get(
+            'max_tamano_adjunto', self.app.config.get('ESCANEO_MAX_TAMANO_ADJUNTO', 0)
+        )
+
         pdfs_encontrados = 0
         correos_escaneados = 0
 
+        # Respetar el límite global de sesiones IMAP simultáneas
+        if not self._esperar_sesion_imap():
+            return correos_escaneados, pdfs_encontrados
+
         try:
             correo = cuenta.correo_gmail
             contrasena = cuenta.obtener_contrasena_app()
@@ -224,6 +630,7 @@ class MotorExtractorWeb:
             self.registrar(f"Conectado")
 
             # Actualizar último escaneo de la cuenta
+            escaneo_anterior = cuenta.ultimo_escaneo
             cuenta.ultimo_escaneo = datetime.utcnow()
             db.session.commit()
 
@@ -242,9 +649,15 @@ class MotorExtractorWeb:
                     # Construir criterios de búsqueda (solo usa fechas del usuario, NO de memoria)
                     criterios = []
 
-                    # Las fechas son las que el usuario selecciono, no las de memoria
-                    if fecha_desde:
-                        criterios.append(f'SINCE {fecha_desde.strftime("%d-%b-%Y")}')
+                    # Las fechas son las que el usuario selecciono, no las de memoria;
+                    # solo el escaneo incremental parte de la última fecha conocida
+                    desde_carpeta = fecha_desde
+                    if incremental:
+                        desde_carpeta = self._fecha_desde_incremental(
+                            cuenta.id, carpeta, escaneo_anterior, fecha_desde
+                        )
+                    if desde_carpeta:
+                        criterios.append(f'SINCE {desde_carpeta.strftime("%d-%b-%Y")}')
                     if fecha_hasta:
                         criterios.append(f'BEFORE {fecha_hasta.strftime("%d-%b-%Y")}')
 
@@ -269,6 +682,13 @@ class MotorExtractorWeb:
                     pdfs_carpeta = 0
                     fecha_mas_reciente = None
 
+                    # Prefiltro: tamaño, estructura y cabeceras en lote, sin descargar cuerpos
+                    usar_prefiltro = config.get('prefiltro', self.app.config.get('ESCANEO_PREFILTRO', True))
+                    tamano_lote = self.app.config.get('ESCANEO_LOTE_METADATOS', 500)
+                    metadatos = {}
+                    correos_descartados = 0
+                    bytes_evitados = 0
+
                     for idx, id_msg in enumerate(ids_mensajes, 1):
                         # Verificar pausa
                         if not self.esperar_si_pausado():
@@ -277,16 +697,59 @@ class MotorExtractorWeb:
                         if self.detener_solicitado:
                             break
 
+                        if usar_prefiltro and (idx - 1) % tamano_lote == 0:
+                            metadatos = self._obtener_metadatos_lote(
+                                mail, ids_mensajes[idx - 1:idx - 1 + tamano_lote]
+                            )
+
                         correos_escaneados += 1
                         self.correo_actual = idx  # Posición dentro de la carpeta actual
 
                         # Actualizar progreso periódicamente (cada 10 correos)
                         if correos_escaneados % 10 == 0:
+                            self._recoger_interpretaciones()
                             escaneo.correos_escaneados = correos_escaneados  # CORREGIDO: asignar, no sumar
                             escaneo.pdfs_descargados = pdfs_encontrados      # CORREGIDO: asignar, no sumar
-                            db.session.commit()
+                            self.confirmar_lote()
+
+                        meta = metadatos.get(id_msg)
+                        if meta and meta['message_id']:
+                            # Saltar sin descargar el cuerpo: las cabeceras ya traen el Message-ID
+                            if not forzar_escaneo and CorreoProcesado.ya_procesado(cuenta.id, meta['message_id'], carpeta):
+                                correos_saltados += 1
+                                continue
+
+                            partes_validas = [
+                                tamano for tamano, _ in meta['partes_pdf']
+                                if not max_tamano_adjunto or tamano <= max_tamano_adjunto
+                            ]
+                            coincide = self.coincide_palabras_clave(
+                                meta['asunto'], meta['remitente'], palabras_clave
+                            )
 
-                        resultado, datos_msg = mail.fetch(id_msg, '(RFC822)')
+                            if not partes_validas or not coincide:
+                                fecha_correo = meta['fecha']
+                                if fecha_correo is None:
+                                    # Sin fecha del servidor ni cabecera: no mueve la marca incremental
+                                    fecha_correo = datetime.now()
+                                elif fecha_mas_reciente is None or fecha_correo > fecha_mas_reciente:
+                                    fecha_mas_reciente = fecha_correo
+                                correos_nuevos += 1
+
+                                if coincide:
+                                    correos_descartados += 1
+                                    bytes_evitados += meta['tamano']
+                                    if meta['partes_pdf']:
+                                        self.registrar(f"PDF omitido por tamaño: {meta['asunto'][:60]}")
+
+                                CorreoProcesado.registrar_procesado(
+                                    cuenta.id, meta['message_id'], carpeta, fecha_correo,
+                                    meta['remitente'][:255], meta['asunto'][:500], False, 0,
+                                    actualizar=forzar_escaneo
+                                )
+                                continue
+
+                        resultado, datos_msg = mail.fetch(id_msg, '(INTERNALDATE RFC822)')
                         if resultado != 'OK':
                             continue
 
@@ -310,22 +773,16 @@ class MotorExtractorWeb:
 
                         asunto = self.decodificar_cabecera(msg['Subject'])
                         remitente = self.decodificar_cabecera(msg['From'])
-                        fecha_str = msg['Date']
-
-                        # Parsear fecha
-                        try:
-                            tupla_fecha = email.utils.parsedate_tz(fecha_str)
-                            if tupla_fecha:
-                                fecha_correo = datetime.fromtimestamp(
-                                    email.utils.mktime_tz(tupla_fecha)
-                                )
-                            else:
-                                fecha_correo = datetime.now()
-                        except:
+                        # Fecha del servidor (INTERNALDATE): no depende de cabeceras mal formadas
+                        fecha_correo = (meta and meta['fecha']) or self.fecha_desde_internaldate(datos_msg[0][0])
+                        if fecha_correo is None:
+                            fecha_correo = self.fecha_desde_cabecera(msg['Date'])
+
+                        # Actualizar fecha más reciente de esta carpeta (un correo sin
+                        # fecha conocida queda con la actual y no mueve la marca)
+                        if fecha_correo is None:
                             fecha_correo = datetime.now()
-
-                        # Actualizar fecha más reciente de esta carpeta
-                        if fecha_mas_reciente is None or fecha_correo > fecha_mas_reciente:
+                        elif fecha_mas_reciente is None or fecha_correo > fecha_mas_reciente:
                             fecha_mas_reciente = fecha_correo
 
                         correos_nuevos += 1
@@ -335,7 +792,8 @@ class MotorExtractorWeb:
                             # Registrar como procesado aunque no coincida con filtro
                             CorreoProcesado.registrar_procesado(
                                 cuenta.id, message_id, carpeta, fecha_correo,
-                                remitente[:255], asunto[:500], False, 0
+                                remitente[:255], asunto[:500], False, 0,
+                                actualizar=forzar_escaneo
                             )
                             continue
 
@@ -343,77 +801,19 @@ class MotorExtractorWeb:
                         pdfs_este_correo = 0
 
                         # Procesar adjuntos
-                        for parte in msg.walk():
+                        for nombre_archivo, contenido in extraer_adjuntos_pdf(msg):
                             if self.detener_solicitado:
                                 break
 
-                            tipo_contenido = parte.get_content_type()
-                            nombre_archivo = parte.get_filename()
-
-                            if nombre_archivo and tipo_contenido == 'application/pdf':
-                                nombre_archivo = self.decodificar_cabecera(nombre_archivo)
-
-                                if not nombre_archivo.lower().endswith('.pdf'):
-                                    continue
-
-                                contenido = parte.get_payload(decode=True)
-                                if not contenido:
-                                    continue
-
-                                # Verificar duplicados
-                                hash_archivo = self.obtener_hash_archivo(contenido)
-                                if hash_archivo in self.hashes_descargados:
-                                    continue
-
-                                self.hashes_descargados.add(hash_archivo)
-
-                                # Detectar o crear compañía
-                                compania = Compania.detectar_o_crear(remitente)
-                                if compania:
-                                    compania.incrementar_contador()
-
-                                # Construir nombre de archivo
-                                remitente_limpio = self.sanitizar_nombre(
-                                    remitente.split('<')[0].strip()[:30]
-                                )
-                                asunto_limpio = self.sanitizar_nombre(asunto[:40])
-                                fecha_limpia = fecha_correo.strftime('%Y%m%d')
-
-                                nuevo_nombre = f"{remitente_limpio}_{asunto_limpio}_{fecha_limpia}.pdf"
-                                ruta_salida = os.path.join(directorio_salida, nuevo_nombre)
-
-                                # Manejar conflictos
-                                contador = 1
-                                while os.path.exists(ruta_salida):
-                                    nuevo_nombre = f"{remitente_limpio}_{asunto_limpio}_{fecha_limpia}_{contador}.pdf"
-                                    ruta_salida = os.path.join(directorio_salida, nuevo_nombre)
-                                    contador += 1
-
-                                # Guardar archivo
-                                with open(ruta_salida, 'wb') as f:
-                                    f.write(contenido)
-
-                                # Registrar en base de datos con compañía
-                                archivo = ArchivoDescargado(
-                                    escaneo_id=self.escaneo_id,
-                                    nombre_archivo=nuevo_nombre,
-                                    ruta_archivo=ruta_salida,
-                                    tamano_bytes=len(contenido),
-                                    hash_archivo=hash_archivo,
-                                    remitente=remitente[:255],
-                                    asunto=asunto[:500],
-                                    fecha_correo=fecha_correo,
-                                    compania_id=compania.id if compania else None,
-                                    nombre_compania_original=remitente.split('<')[0].strip()[:255],
-                                    cuenta_origen=correo
-                                )
-                                db.session.add(archivo)
+                            if max_tamano_adjunto and len(contenido) > max_tamano_adjunto:
+                                self.registrar(f"PDF omitido por tamaño: {nombre_archivo}")
+                                continue
 
+                            if self.guardar_pdf(contenido, remitente, asunto, fecha_correo,
+                                                correo, directorio_salida):
                                 pdfs_encontrados += 1
                                 pdfs_carpeta += 1
                                 pdfs_este_correo += 1
-                                nombre_cia = compania.nombre if compania else 'Desconocida'
-                                self.registrar(f"Descargado: {nuevo_nombre} [{nombre_cia}]")
 
                         # Registrar correo como procesado
                         # Usamos pdfs_este_correo (no pdfs_carpeta) para saber si ESTE correo tenia PDFs
@@ -424,7 +824,8 @@ class MotorExtractorWeb:
                             cuenta.id, message_id, carpeta, fecha_correo,
                             remitente[:255] if remitente else None,
                             asunto[:500] if asunto else None,
-                            tiene_pdfs, pdfs_este_correo
+                            tiene_pdfs, pdfs_este_correo,
+                            actualizar=forzar_escaneo
                         )
 
                     # Actualizar historial de la carpeta al terminar
@@ -433,11 +834,17 @@ class MotorExtractorWeb:
                             cuenta.id, carpeta, fecha_mas_reciente,
                             correos_nuevos, correos_con_pdf_carpeta, pdfs_carpeta
                         )
-                        db.session.commit()
+                        self.confirmar_lote()
 
                     if correos_saltados > 0:
                         self.registrar(f"Saltados {correos_saltados} correos ya procesados")
 
+                    if correos_descartados > 0:
+                        self.registrar(
+                            f"Prefiltro: {correos_descartados} correos sin PDF descartados "
+                            f"({bytes_evitados / (1024 * 1024):.1f} MB sin descargar)"
+                        )
+
                 except Exception as e:
                     self.registrar(f"Error en {carpeta}: {e}")
 
@@ -446,9 +853,79 @@ class MotorExtractorWeb:
 
         except Exception as e:
             self.registrar(f"Error: {e}")
+        finally:
+            semaforo_sesiones_imap(self.app).release()
 
         return correos_escaneados, pdfs_encontrados
 
+    def confirmar_lote(self):
+        """
+        Vuelca los contadores de compañías, hace commit, publica las
+        compañías nuevas en la caché compartida y libera el lote.
+        """
+        from app import db
+
+        self.contador_companias.volcar()
+        db.session.commit()
+        self.contador_companias.publicar()
+        self.liberar_lote()
+
+    def liberar_lote(self):
+        """
+        Expulsa de la sesión los registros ya confirmados del lote.
+
+        Llamar justo después de un commit. Los correos, archivos y
+        extracciones guardados no se vuelven a usar, así que la memoria del
+        escaneo no crece con el tamaño del buzón. Escaneo, cuentas y
+        compañías siguen en la sesión: tras el commit están expirados y
+        asignarles un valor no hace ninguna consulta.
+        """
+        from app import db
+        from app.models import CorreoProcesado, ArchivoDescargado, ExtraccionPdf
+
+        for objeto in list(db.session.identity_map.values()):
+            if isinstance(objeto, (CorreoProcesado, ArchivoDescargado, ExtraccionPdf)):
+                db.session.expunge(objeto)
+
+        self.memoria_mb = memoria_proceso_mb()
+        if self.memoria_mb is not None and (self.memoria_pico_mb is None
+                                            or self.memoria_mb > self.memoria_pico_mb):
+            self.memoria_pico_mb = self.memoria_mb
+
+    def _esperar_sesion_imap(self):
+        """Espera un hueco en el límite global de sesiones IMAP. False si se detuvo."""
+        semaforo = semaforo_sesiones_imap(self.app)
+        avisado = False
+        while not semaforo.acquire(timeout=1):
+            if self.detener_solicitado:
+                return False
+            if not avisado:
+                self.registrar("Esperando una sesión IMAP libre...")
+                avisado = True
+        return True
+
+    def _fecha_desde_incremental(self, cuenta_id, carpeta, escaneo_anterior, fecha_desde=None):
+        """
+        Calcula desde cuándo buscar en un escaneo incremental.
+
+        Usa la fecha más antigua entre el correo más reciente registrado en la
+        carpeta y el último escaneo de la cuenta, menos un margen. Si la
+        carpeta nunca se escaneó se recorre completa (o desde fecha_desde).
+        """
+        from app.models import HistorialEscaneoCarpeta
+
+        ultima_fecha = HistorialEscaneoCarpeta.obtener_ultima_fecha(cuenta_id, carpeta)
+        if not ultima_fecha:
+            return fecha_desde
+
+        if escaneo_anterior and escaneo_anterior < ultima_fecha:
+            ultima_fecha = escaneo_anterior
+
+        desde = ultima_fecha - timedelta(days=self.MARGEN_INCREMENTAL_DIAS)
+        if fecha_desde and fecha_desde > desde:
+            return fecha_desde
+        return desde
+
     # Mantener compatibilidad con escaneo individual
     def ejecutar_escaneo(self, cuenta, config, directorio_salida):
         """Ejecuta el escaneo de una sola cuenta (compatibilidad)."""
@@ -458,6 +935,7 @@ class MotorExtractorWeb:
         """Solicita detener el escaneo."""
         self.detener_solicitado = True
         self.estado_motor = self.ESTADO_DETENIDO
+        planificador_escaneos.retirar(self.escaneo_id)
         # Si está pausado, reanudar para que pueda terminar
         if self.pausado:
             self.reanudar()
@@ -498,7 +976,10 @@ class MotorExtractorWeb:
             'cuenta_index': self.cuenta_index,
             'total_cuentas': self.total_cuentas,
             'correo_actual': self.correo_actual,
-            'total_correos_carpeta': self.total_correos_carpeta
+            'total_correos_carpeta': self.total_correos_carpeta,
+            'pdfs_interpretados': self.pdfs_interpretados,
+            'memoria_mb': self.memoria_mb,
+            'memoria_pico_mb': self.memoria_pico_mb
         }
 
 
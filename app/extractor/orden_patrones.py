@@ -0,0 +1,205 @@
+"""
+Orden adaptativo de los patrones del intérprete según sus aciertos.
+
+Los patrones de cada campo de ExtractorDatosPoliza.PATRONES se prueban en
+un orden fijo, pero cada compañía escribe sus pólizas a su manera: el
+patrón que acierta con una suele fallar con otra. Cada póliza confirmada
+por el usuario cuenta, por compañía y campo, qué patrones habrían dado el
+valor confirmado (EstadisticaPatron). Con esas cuentas el intérprete
+prueba primero los patrones con más aciertos de esa compañía; el patrón de
+póliza específico de la compañía va siempre primero.
+
+El orden es una permutación de los patrones del código: un patrón que se
+borra del código deja de contar y uno nuevo entra en su posición original.
+"""
+
+import re
+from datetime import date
+
+
+# Clave de las estadísticas de PDFs sin compañía detectada
+SIN_COMPANIA = ''
+
+# Confirmaciones de un campo necesarias para reordenar sus patrones
+MIN_EVALUACIONES = 3
+
+# Campo de PATRONES -> campo confirmado de la póliza
+CAMPOS_CONFIRMADOS = {
+    'numero_poliza': 'numero_poliza',
+    'fecha_desde': 'fecha_vigencia_desde',
+    'fecha_hasta': 'fecha_vigencia_hasta',
+    'prima': 'prima_anual',
+    'suma_asegurada': 'suma_asegurada',
+    'asegurado_nombre': 'asegurado_nombre',
+    'asegurado_documento': 'asegurado_documento',
+    'vehiculo_marca': 'vehiculo_marca',
+    'vehiculo_modelo': 'vehiculo_modelo',
+    'vehiculo_anio': 'vehiculo_anio',
+    'vehiculo_patente': 'vehiculo_patente',
+    'vehiculo_chasis': 'vehiculo_chasis',
+    'vehiculo_motor': 'vehiculo_motor',
+}
+
+CAMPOS_FECHA = ('fecha_desde', 'fecha_hasta')
+CAMPOS_MONTO = ('prima', 'suma_asegurada')
+
+
+def _normalizar(texto):
+    """Sin espacios repetidos ni mayúsculas."""
+    return ' '.join(str(texto).split()).casefold()
+
+
+def valor_coincide(campo, texto, confirmado, extractor):
+    """True si el texto capturado por un patrón equivale al valor confirmado."""
+    if texto is None:
+        return False
+    if campo in CAMPOS_FECHA:
+        return isinstance(confirmado, date) and extractor._parsear_fecha(texto) == confirmado
+    if campo in CAMPOS_MONTO:
+        monto = extractor._parsear_monto(texto)
+        try:
+            return monto is not None and abs(float(monto) - float(confirmado)) < 0.005
+        except (TypeError, ValueError):
+            return False
+    if campo == 'vehiculo_anio':
+        return texto.isdigit() and int(texto) == confirmado
+    if campo in ('asegurado_documento', 'vehiculo_patente'):
+        return re.sub(r'[\s\-\.]', '', texto).casefold() == re.sub(r'[\s\-\.]', '', str(confirmado)).casefold()
+    return _normalizar(texto) == _normalizar(confirmado)
+
+
+def evaluar_patrones(texto, compania, valores):
+    """
+    Prueba cada patrón sobre el texto del PDF contra los valores confirmados.
+
+    Devuelve [(campo, patron, acierto)] solo de los campos con valor
+    confirmado. Para numero_poliza incluye el patrón específico de la
+    compañía, así sus aciertos también quedan a la vista.
+    """
+    from app.extractor.pdf_parser import ExtractorDatosPoliza
+
+    extractor = ExtractorDatosPoliza()
+    resultado = []
+    for campo, destino in CAMPOS_CONFIRMADOS.items():
+        confirmado = valores.get(destino)
+        if confirmado is None or confirmado == '':
+            continue
+        patrones = list(ExtractorDatosPoliza.ESCANER.compilados[campo])
+        if campo == 'numero_poliza' and compania in ExtractorDatosPoliza.PATRONES_POLIZA_COMPANIA:
+            patrones.insert(0, ExtractorDatosPoliza.PATRONES_POLIZA_COMPANIA[compania])
+        for compilado in patrones:
+            match = compilado.search(texto)
+            valor = match.group(1).strip() if match else None
+            resultado.append((campo, compilado.pattern,
+                              valor_coincide(campo, valor, confirmado, extractor)))
+    return resultado
+
+
+def tasa_aciertos(aciertos, evaluaciones):
+    """
+    Tasa de aciertos suavizada (Laplace): un patrón sin evaluar vale 0,5 y
+    unos pocos aciertos no lo ponen por delante de uno con historia.
+    """
+    return (aciertos + 1) / (evaluaciones + 2)
+
+
+def ordenar_patrones(patrones, cuentas):
+    """
+    Patrones de un campo ordenados por tasa de aciertos, de mayor a menor.
+
+    patrones es la lista del código y cuentas {patron: (aciertos,
+    evaluaciones)}. A igual tasa se respeta el orden del código.
+    """
+    def clave(indice):
+        aciertos, evaluaciones = cuentas.get(patrones[indice], (0, 0))
+        return (-tasa_aciertos(aciertos, evaluaciones), indice)
+
+    return [patrones[indice] for indice in sorted(range(len(patrones)), key=clave)]
+
+
+def calcular_orden(filas, patrones_base):
+    """
+    Orden de los patrones por compañía y campo a partir de las estadísticas.
+
+    filas son (compania_clave, campo, patron, aciertos, evaluaciones) y
+    patrones_base el dict PATRONES. Devuelve {compania: {campo: [patrones]}}
+    solo con los campos con MIN_EVALUACIONES confirmaciones cuyo orden
+    cambia respecto del código.
+    """
+    cuentas = {}
+    for compania, campo, patron, aciertos, evaluaciones in filas:
+        if campo in patrones_base:
+            cuentas.setdefault((compania, campo), {})[patron] = (aciertos or 0, evaluaciones or 0)
+
+    orden = {}
+    for (compania, campo), por_patron in cuentas.items():
+        base = patrones_base[campo]
+        confirmaciones = max((por_patron.get(patron, (0, 0))[1] for patron in base), default=0)
+        if confirmaciones < MIN_EVALUACIONES:
+            continue
+        ordenados = ordenar_patrones(base, por_patron)
+        if ordenados != list(base):
+            orden.setdefault(compania, {})[campo] = ordenados
+    return orden
+
+
+def intentos_esperados(patrones, cuentas):
+    """
+    Patrones probados en promedio hasta el primer acierto si se prueban en
+    este orden (tomando las tasas observadas como independientes).
+    """
+    intentos = 0.0
+    sin_acierto = 1.0
+    for patron in patrones:
+        intentos += sin_acierto
+        aciertos, evaluaciones = cuentas.get(patron, (0, 0))
+        sin_acierto *= 1 - (aciertos / evaluaciones if evaluaciones else 0)
+    return intentos
+
+
+def informe_patrones(filas, patrones_base, patrones_compania):
+    """
+    Estadísticas agrupadas por compañía y campo para el panel de administración.
+
+    patrones_compania es {compania: patron de póliza específico}. Cada grupo
+    trae sus patrones en el orden en que se prueban ahora, la posición que
+    tienen en el código y los intentos esperados con uno y otro orden. Un
+    patrón sin aciertos tras MIN_EVALUACIONES confirmaciones es candidato a
+    podarse.
+    """
+    grupos = {}
+    for compania, campo, patron, aciertos, evaluaciones in filas:
+        grupos.setdefault((compania, campo), {})[patron] = (aciertos or 0, evaluaciones or 0)
+
+    informe = []
+    for (compania, campo), cuentas in sorted(grupos.items()):
+        base = list(patrones_base.get(campo, []))
+        confirmaciones = max((evaluaciones for _, evaluaciones in cuentas.values()), default=0)
+        actual = ordenar_patrones(base, cuentas) if confirmaciones >= MIN_EVALUACIONES else base
+        especifico = patrones_compania.get(compania) if campo == 'numero_poliza' else None
+        if especifico:
+            base = [especifico] + base
+            actual = [especifico] + actual
+
+        patrones = []
+        for patron in actual + [patron for patron in cuentas if patron not in actual]:
+            aciertos, evaluaciones = cuentas.get(patron, (0, 0))
+            patrones.append({
+                'patron': patron,
+                'aciertos': aciertos,
+                'evaluaciones': evaluaciones,
+                'tasa': round(100 * aciertos / evaluaciones) if evaluaciones else 0,
+                'posicion': actual.index(patron) + 1 if patron in actual else None,
+                'posicion_codigo': base.index(patron) + 1 if patron in base else None,
+                'especifico': patron == especifico,
+                'sin_aciertos': evaluaciones >= MIN_EVALUACIONES and not aciertos,
+            })
+        informe.append({
+            'compania': compania,
+            'campo': campo,
+            'confirmaciones': confirmaciones,
+            'intentos_codigo': round(intentos_esperados(base, cuentas), 2),
+            'intentos_actual': round(intentos_esperados(actual, cuentas), 2),
+            'patrones': patrones,
+        })
+    return informe
@@ -8,6 +8,8 @@ import fitz  # PyMuPDF
 from decimal import Decimal
 from datetime import datetime
 import json
+from app.extractor.escaner import EscanerCampos, AutomataPalabras, FLAGS_PATRONES, huella_patrones
+from app.extractor.regiones import leer_regiones, plantilla_aplicable, huella_plantilla
 
 
 class ExtractorDatosPoliza:
@@ -91,6 +93,9 @@ class ExtractorDatosPoliza:
         ],
     }
 
+    # Todos los patrones compilados una vez, en un escáner de una sola pasada
+    ESCANER = EscanerCampos(PATRONES)
+
     # Companias conocidas y sus patrones especificos
     COMPANIAS = {
         'mapfre': {
@@ -127,40 +132,319 @@ class ExtractorDatosPoliza:
         },
     }
 
-    def __init__(self):
+    # Patrón de póliza específico de cada compañía, compilado
+    PATRONES_POLIZA_COMPANIA = {
+        nombre_clave: re.compile(config['patron_poliza'], FLAGS_PATRONES)
+        for nombre_clave, config in COMPANIAS.items() if 'patron_poliza' in config
+    }
+
+    # Palabras clave por tipo de seguro (el primero de la lista que aparece gana)
+    PALABRAS_TIPO_SEGURO = {
+        'auto': ['automotor', 'automovil', 'vehiculo', 'auto ', 'carro'],
+        'moto': ['motocicleta', 'moto ', 'ciclomotor'],
+        'hogar': ['hogar', 'vivienda', 'casa ', 'departamento', 'domicilio'],
+        'vida': ['vida', 'fallecimiento', 'muerte', 'sepelio'],
+        'salud': ['salud', 'medico', 'hospitalario', 'cobertura medica'],
+        'accidentes': ['accidentes personales', 'ap ', 'accidente personal'],
+        'responsabilidad': ['responsabilidad civil', 'rc ', 'terceros'],
+        'comercio': ['comercio', 'negocio', 'local comercial', 'pyme'],
+        'transporte': ['transporte', 'carga', 'mercaderia', 'flete'],
+        'caucion': ['caucion', 'fianza', 'garantia'],
+    }
+
+    # Detección de compañía y tipo de seguro en una pasada cada una
+    AUTOMATA_COMPANIAS = AutomataPalabras(
+        {nombre_clave: config['patrones_nombre'] for nombre_clave, config in COMPANIAS.items()}
+    )
+    AUTOMATA_TIPOS_SEGURO = AutomataPalabras(PALABRAS_TIPO_SEGURO)
+
+    # Versión del parser: cambia al tocar cualquier patrón o palabra clave.
+    # Se guarda con cada extracción para saber cuáles quedaron obsoletas.
+    VERSION_PARSER = huella_patrones(
+        ESCANER.compilados,
+        PATRONES_POLIZA_COMPANIA,
+        {nombre_clave: config['patrones_nombre'] for nombre_clave, config in COMPANIAS.items()},
+        PALABRAS_TIPO_SEGURO,
+    )
+
+    # Campos que cuentan para la confianza
+    CAMPOS_IMPORTANTES = [
+        'numero_poliza',
+        'fecha_vigencia_desde',
+        'fecha_vigencia_hasta',
+        'prima_anual',
+        'asegurado_nombre',
+    ]
+
+    # La lectura perezosa además espera estos campos, y los del vehículo en
+    # pólizas de auto o moto: los de la confianza suelen estar en la primera
+    # página y el resto en las siguientes
+    CAMPOS_LECTURA_PEREZOSA = ['suma_asegurada', 'asegurado_documento']
+    CAMPOS_VEHICULO = ['vehiculo_marca', 'vehiculo_modelo', 'vehiculo_anio',
+                       'vehiculo_patente', 'vehiculo_chasis', 'vehiculo_motor']
+
+    # Caracteres del final de la página anterior que la lectura perezosa
+    # vuelve a mirar con cada página nueva, por si un campo quedó partido
+    SOLAPE_LECTURA_PEREZOSA = 300
+
+    # Texto original de los campos que se leen por región
+    TEXTOS_REGION = {
+        'fecha_vigencia_desde': 'fecha_desde_texto',
+        'fecha_vigencia_hasta': 'fecha_hasta_texto',
+        'prima_anual': 'prima_texto',
+        'suma_asegurada': 'suma_asegurada_texto',
+    }
+
+    # Escáneres con los patrones reordenados por compañía (ver orden_patrones.py)
+    ESCANERES_ORDENADOS = {}
+    MAX_ESCANERES_ORDENADOS = 64
+
+    def __init__(self, cache_texto=None, perezosa=False, max_paginas=0, plantillas=None,
+                 orden_patrones=None, claves_companias=None):
         self.texto_completo = ""
         self.datos_extraidos = {}
         self.confianza = 0.0
         self.compania_detectada = None
+        self.cache_texto = cache_texto  # CacheTexto opcional (ver cache_texto.py)
+        self.perezosa = perezosa  # Dejar de leer páginas al encontrar los campos importantes
+        self.max_paginas = max_paginas  # Páginas leídas como máximo (0 = todas)
+        self.plantillas = plantillas or {}  # Clave de compañía -> plantilla de diseño (ver regiones.py)
+        self.orden_patrones = orden_patrones or {}  # Compañía -> campo -> patrones por aciertos
+        self.claves_companias = claves_companias or {}  # compania_id (remitente) -> clave de COMPANIAS
+        self.compania_pista = None  # Clave de la compañía del remitente del PDF en curso
+        self.paginas_leidas = None
+        self.paginas_total = None
+        self.valores_region = None  # Valores leídos con la plantilla de la compañía
+        self.textos_region = {}
+        self.plantilla_usada = None
+        self.regiones_leidas = None  # (compañía, textos) leídos con el PDF abierto, para la caché
+        self.error_lectura = None  # Motivo si el PDF no se pudo abrir o leer
+
+    def extraer_texto_pdf(self, ruta_pdf=None, contenido=None, hash_archivo=None, completo=False):
+        """
+        Extrae el texto de un archivo PDF (desde disco o desde memoria).
+
+        Lee página a página. En modo perezoso deja de leer en cuanto el texto
+        ya contiene los campos buscados (ver _tiene_campos_importantes), y
+        nunca pasa de max_paginas;
+        completo=True lee todas las páginas igualmente. Con caché y
+        hash_archivo, un PDF ya visto no se vuelve a abrir; solo se guarda en
+        la caché el texto de PDFs leídos hasta la última página.
+        """
+        self.paginas_leidas = None
+        self.paginas_total = None
+        self.valores_region = None
+        self.textos_region = {}
+        self.plantilla_usada = None
+        self.regiones_leidas = None
+        self.error_lectura = None
+        if self.cache_texto and hash_archivo:
+            texto = self.cache_texto.obtener(hash_archivo)
+            if texto is not None:
+                self.texto_completo = texto
+                return texto
 
-    def extraer_texto_pdf(self, ruta_pdf):
-        """Extrae todo el texto de un archivo PDF."""
         try:
-            doc = fitz.open(ruta_pdf)
-            texto = ""
-            for pagina in doc:
-                texto += pagina.get_text()
-            doc.close()
+            if contenido is not None:
+                doc = fitz.open(stream=contenido, filetype='pdf')
+            else:
+                doc = fitz.open(ruta_pdf)
+            try:
+                total = doc.page_count
+                limite = total
+                if not completo and self.max_paginas:
+                    limite = min(total, self.max_paginas)
+                paginas = []
+                encontrados = {}
+                for numero in range(limite):
+                    paginas.append(doc.load_page(numero).get_text())
+                    # La compañía sale de la primera página: si tiene plantilla,
+                    # sus campos se leen por región con el documento ya abierto
+                    if numero == 0 and self.plantillas:
+                        self._leer_plantilla(doc, self.compania_pista or self.detectar_compania(paginas[0]))
+                    if not completo and self.perezosa and numero + 1 < limite:
+                        ventana = paginas[-1]
+                        if numero:
+                            ventana = paginas[-2][-self.SOLAPE_LECTURA_PEREZOSA:] + ventana
+                        if self._tiene_campos_importantes(ventana, encontrados):
+                            break
+            finally:
+                doc.close()
+            texto = ''.join(paginas)
             self.texto_completo = texto
+            self.paginas_leidas = len(paginas)
+            self.paginas_total = total
+            if self.cache_texto and hash_archivo and len(paginas) == total:
+                self.cache_texto.guardar(hash_archivo, texto)
+                if self.regiones_leidas:
+                    compania, textos = self.regiones_leidas
+                    self.cache_texto.guardar_regiones(
+                        hash_archivo, huella_plantilla(self.plantillas[compania]), textos
+                    )
             return texto
         except Exception as e:
-            print(f"Error al leer PDF {ruta_pdf}: {e}")
+            print(f"Error al leer PDF {ruta_pdf or '(memoria)'}: {e}")
+            self.error_lectura = str(e) or e.__class__.__name__
             return ""
 
+    def _tiene_campos_importantes(self, ventana, encontrados):
+        """
+        True si lo leído hasta ahora (o la plantilla) ya da todos los
+        campos: los CAMPOS_IMPORTANTES, los CAMPOS_LECTURA_PEREZOSA y, si el
+        tipo de seguro es de vehículo, los CAMPOS_VEHICULO.
+
+        Solo se interpreta la ventana de la página nueva; lo hallado en las
+        anteriores se acumula en `encontrados` (primer valor de cada campo),
+        así cada página se recorre una vez y no todo el texto por página.
+        """
+        region = self.valores_region or {}
+        for campo, valor in self._interpretar_texto(ventana).items():
+            if valor and not (campo == 'tipo_seguro' and valor == 'otro'):
+                encontrados.setdefault(campo, valor)
+        campos = self.CAMPOS_IMPORTANTES + self.CAMPOS_LECTURA_PEREZOSA
+        if self._detectar_tipo_bien(encontrados) == 'vehiculo':
+            campos = campos + self.CAMPOS_VEHICULO
+        return all(encontrados.get(campo) or region.get(campo) for campo in campos)
+
+    def _leer_plantilla(self, doc, compania):
+        """
+        Lee por región los campos de la plantilla de la compañía, si la hay y
+        el tamaño de página coincide. Un error deja solo los patrones.
+        """
+        plantilla = self.plantillas.get(compania)
+        if not plantilla:
+            return
+        try:
+            textos = leer_regiones(doc, plantilla) if plantilla_aplicable(doc, plantilla) else {}
+        except Exception as e:
+            print(f"Error al leer plantilla de {compania}: {e}")
+            return
+        self.regiones_leidas = (compania, textos)
+        self._usar_regiones(compania, textos)
+
+    def _usar_regiones(self, compania, textos):
+        """Convierte los textos por región en valores; los que no se interpretan se descartan."""
+        valores = {}
+        for campo, texto in textos.items():
+            if campo in ('fecha_vigencia_desde', 'fecha_vigencia_hasta'):
+                valor = self._parsear_fecha(texto)
+            elif campo in ('prima_anual', 'suma_asegurada'):
+                valor = self._parsear_monto(texto)
+            elif campo == 'vehiculo_anio':
+                valor = int(texto) if texto and texto.isdigit() else None
+            else:
+                valor = texto or None
+            if valor is not None:
+                valores[campo] = (valor, texto)
+        if not valores:
+            return
+        self.valores_region = {campo: valor for campo, (valor, _) in valores.items()}
+        self.textos_region = {campo: texto for campo, (_, texto) in valores.items()}
+        self.plantilla_usada = compania
+
+    def _leer_plantilla_documento(self, ruta_pdf, contenido, hash_archivo, compania):
+        """
+        Regiones de un PDF cuyo texto vino de la caché. Salen de la caché si
+        ya se leyeron con esta plantilla; si no, se abre el PDF una vez y se
+        guardan para la próxima.
+        """
+        huella = huella_plantilla(self.plantillas[compania])
+        textos = self.cache_texto.obtener_regiones(hash_archivo, huella)
+        if textos is not None:
+            self._usar_regiones(compania, textos)
+            return
+
+        try:
+            if contenido is not None:
+                doc = fitz.open(stream=contenido, filetype='pdf')
+            else:
+                doc = fitz.open(ruta_pdf)
+        except Exception as e:
+            print(f"Error al abrir PDF {ruta_pdf or '(memoria)'}: {e}")
+            return
+        try:
+            self._leer_plantilla(doc, compania)
+        finally:
+            doc.close()
+        if self.regiones_leidas:
+            self.cache_texto.guardar_regiones(hash_archivo, huella, self.regiones_leidas[1])
+
+    @staticmethod
+    def _mismo_valor(a, b):
+        """Compara valores de patrones y de región (textos sin espacios ni mayúsculas de más)."""
+        if isinstance(a, str) and isinstance(b, str):
+            return ' '.join(a.split()).casefold() == ' '.join(b.split()).casefold()
+        return a == b
+
+    def _aplicar_regiones(self, datos):
+        """
+        Los valores leídos por región completan los campos que los patrones
+        no encontraron. Si ambos dan valores distintos se queda el de los
+        patrones: una región corrida (otro diseño con el mismo tamaño de
+        página) no debe pisar un valor bueno. Esos campos se anotan en
+        'campos_region_descartados' para la revisión.
+        """
+        if not self.valores_region:
+            return
+        usados = []
+        descartados = []
+        for campo, valor in self.valores_region.items():
+            actual = datos.get(campo)
+            if actual is None or actual == '':
+                datos[campo] = valor
+                if campo in self.TEXTOS_REGION:
+                    datos[self.TEXTOS_REGION[campo]] = self.textos_region[campo]
+                usados.append(campo)
+            elif self._mismo_valor(actual, valor):
+                usados.append(campo)
+            else:
+                descartados.append(campo)
+        datos['plantilla_compania'] = self.plantilla_usada
+        datos['campos_region'] = sorted(usados)
+        datos['campos_region_descartados'] = sorted(descartados)
+        datos['bien_asegurado_tipo'] = self._detectar_tipo_bien(datos)
+        datos['confianza'] = self._calcular_confianza(datos)
+
     def detectar_compania(self, texto=None):
         """Detecta la compania aseguradora del texto."""
         if texto is None:
             texto = self.texto_completo
 
-        texto_lower = texto.lower()
-
-        for nombre_clave, config in self.COMPANIAS.items():
-            for patron in config['patrones_nombre']:
-                if patron.lower() in texto_lower:
-                    self.compania_detectada = nombre_clave
-                    return nombre_clave
-
-        return None
+        nombre_clave = self.AUTOMATA_COMPANIAS.primera(texto)
+        if nombre_clave:
+            self.compania_detectada = nombre_clave
+        return nombre_clave
+
+    def _escaner_para(self, compania):
+        """
+        Escáner con el orden de patrones de la compañía: primero su patrón de
+        póliza específico y después los genéricos por aciertos. Sin compañía
+        ni estadísticas es el ESCANER de siempre.
+        """
+        from app.extractor.orden_patrones import SIN_COMPANIA
+
+        orden = self.orden_patrones.get(compania or SIN_COMPANIA) or {}
+        patron_compania = self.COMPANIAS.get(compania, {}).get('patron_poliza')
+        patrones = {}
+        for campo, lista in self.PATRONES.items():
+            ordenados = orden.get(campo)
+            # Solo una permutación de los patrones actuales (las estadísticas pueden ser viejas)
+            patrones[campo] = list(ordenados) if ordenados and sorted(ordenados) == sorted(lista) else list(lista)
+        if patron_compania:
+            patrones['numero_poliza'] = [patron_compania] + [
+                patron for patron in patrones['numero_poliza'] if patron != patron_compania
+            ]
+        if patrones == self.PATRONES:
+            return self.ESCANER
+
+        clave = tuple((campo, tuple(lista)) for campo, lista in patrones.items())
+        escaner = self.ESCANERES_ORDENADOS.get(clave)
+        if escaner is None:
+            if len(self.ESCANERES_ORDENADOS) >= self.MAX_ESCANERES_ORDENADOS:
+                self.ESCANERES_ORDENADOS.clear()
+            escaner = EscanerCampos(patrones)
+            self.ESCANERES_ORDENADOS[clave] = escaner
+        return escaner
 
     def _buscar_patron(self, patrones, texto=None):
         """Busca el primer match de una lista de patrones."""
@@ -168,7 +452,9 @@ class ExtractorDatosPoliza:
             texto = self.texto_completo
 
         for patron in patrones:
-            match = re.search(patron, texto, re.IGNORECASE | re.MULTILINE)
+            if isinstance(patron, str):
+                patron = re.compile(patron, FLAGS_PATRONES)
+            match = patron.search(texto)
             if match:
                 return match.group(1).strip()
         return None
@@ -198,41 +484,68 @@ class ExtractorDatosPoliza:
         except:
             return None
 
-    def extraer_datos(self, ruta_pdf):
-        """Extrae todos los datos disponibles del PDF."""
-        texto = self.extraer_texto_pdf(ruta_pdf)
+    def extraer_datos(self, ruta_pdf=None, contenido=None, hash_archivo=None, completo=False,
+                      compania_id=None):
+        """
+        Extrae todos los datos disponibles del PDF (ruta o bytes en memoria).
+
+        completo=True lee todas las páginas aunque el extractor sea perezoso.
+        compania_id es la Compania del remitente: si se aprendió a qué clave
+        de COMPANIAS corresponde, la compañía no se busca en el texto.
+        """
+        self.compania_pista = self.claves_companias.get(compania_id) if compania_id else None
+        texto = self.extraer_texto_pdf(ruta_pdf, contenido, hash_archivo, completo)
         if not texto:
             return {}
 
-        # Detectar compania
-        compania = self.detectar_compania(texto)
+        datos = self._interpretar_texto(texto)
+
+        # Campos del diseño conocido de la compañía; los patrones quedan de respaldo
+        compania = datos.get('compania_detectada')
+        if compania in self.plantillas and self.valores_region is None and self.paginas_leidas is None:
+            self._leer_plantilla_documento(ruta_pdf, contenido, hash_archivo, compania)
+        self._aplicar_regiones(datos)
+
+        # Páginas leídas (None si el texto vino de la caché, que siempre es completo)
+        datos['paginas_leidas'] = self.paginas_leidas
+        datos['paginas_total'] = self.paginas_total
+        datos['extraccion_parcial'] = bool(
+            self.paginas_total and self.paginas_leidas < self.paginas_total
+        )
+
+        self.datos_extraidos = datos
+        return datos
 
-        # Extraer con patrones genericos
+    def _interpretar_texto(self, texto):
+        """Aplica los patrones al texto y devuelve los datos con su confianza."""
+        # La compania del remitente, si se conoce; si no, se detecta en el texto
+        if self.compania_pista:
+            compania = self.compania_detectada = self.compania_pista
+        else:
+            compania = self.detectar_compania(texto)
+
+        # Extraer con patrones genericos (una sola pasada por el texto); con
+        # compania conocida su patron de poliza va primero
+        campos = self._escaner_para(compania).buscar(texto)
         datos = {
-            'numero_poliza': self._buscar_patron(self.PATRONES['numero_poliza']),
-            'fecha_desde_texto': self._buscar_patron(self.PATRONES['fecha_desde']),
-            'fecha_hasta_texto': self._buscar_patron(self.PATRONES['fecha_hasta']),
-            'prima_texto': self._buscar_patron(self.PATRONES['prima']),
-            'suma_asegurada_texto': self._buscar_patron(self.PATRONES['suma_asegurada']),
-            'asegurado_nombre': self._buscar_patron(self.PATRONES['asegurado_nombre']),
-            'asegurado_documento': self._buscar_patron(self.PATRONES['asegurado_documento']),
-            'vehiculo_marca': self._buscar_patron(self.PATRONES['vehiculo_marca']),
-            'vehiculo_modelo': self._buscar_patron(self.PATRONES['vehiculo_modelo']),
-            'vehiculo_anio': self._buscar_patron(self.PATRONES['vehiculo_anio']),
-            'vehiculo_patente': self._buscar_patron(self.PATRONES['vehiculo_patente']),
-            'vehiculo_chasis': self._buscar_patron(self.PATRONES['vehiculo_chasis']),
-            'vehiculo_motor': self._buscar_patron(self.PATRONES['vehiculo_motor']),
+            'numero_poliza': campos['numero_poliza'],
+            'fecha_desde_texto': campos['fecha_desde'],
+            'fecha_hasta_texto': campos['fecha_hasta'],
+            'prima_texto': campos['prima'],
+            'suma_asegurada_texto': campos['suma_asegurada'],
+            'asegurado_nombre': campos['asegurado_nombre'],
+            'asegurado_documento': campos['asegurado_documento'],
+            'vehiculo_marca': campos['vehiculo_marca'],
+            'vehiculo_modelo': campos['vehiculo_modelo'],
+            'vehiculo_anio': campos['vehiculo_anio'],
+            'vehiculo_patente': campos['vehiculo_patente'],
+            'vehiculo_chasis': campos['vehiculo_chasis'],
+            'vehiculo_motor': campos['vehiculo_motor'],
             'compania_detectada': compania,
+            'compania_por_remitente': bool(self.compania_pista),
+            'version_parser': self.VERSION_PARSER,
         }
 
-        # Si se detecto compania, intentar con patrones especificos
-        if compania and compania in self.COMPANIAS:
-            config = self.COMPANIAS[compania]
-            if 'patron_poliza' in config:
-                poliza_especifica = self._buscar_patron([config['patron_poliza']])
-                if poliza_especifica:
-                    datos['numero_poliza'] = poliza_especifica
-
         # Parsear fechas y montos
         datos['fecha_vigencia_desde'] = self._parsear_fecha(datos.get('fecha_desde_texto'))
         datos['fecha_vigencia_hasta'] = self._parsear_fecha(datos.get('fecha_hasta_texto'))
@@ -255,32 +568,11 @@ class ExtractorDatosPoliza:
         # Calcular confianza
         datos['confianza'] = self._calcular_confianza(datos)
 
-        self.datos_extraidos = datos
         return datos
 
     def _detectar_tipo_seguro(self, texto):
         """Detecta el tipo de seguro basado en palabras clave."""
-        texto_lower = texto.lower()
-
-        tipos = {
-            'auto': ['automotor', 'automovil', 'vehiculo', 'auto ', 'carro'],
-            'moto': ['motocicleta', 'moto ', 'ciclomotor'],
-            'hogar': ['hogar', 'vivienda', 'casa ', 'departamento', 'domicilio'],
-            'vida': ['vida', 'fallecimiento', 'muerte', 'sepelio'],
-            'salud': ['salud', 'medico', 'hospitalario', 'cobertura medica'],
-            'accidentes': ['accidentes personales', 'ap ', 'accidente personal'],
-            'responsabilidad': ['responsabilidad civil', 'rc ', 'terceros'],
-            'comercio': ['comercio', 'negocio', 'local comercial', 'pyme'],
-            'transporte': ['transporte', 'carga', 'mercaderia', 'flete'],
-            'caucion': ['caucion', 'fianza', 'garantia'],
-        }
-
-        for tipo, palabras in tipos.items():
-            for palabra in palabras:
-                if palabra in texto_lower:
-                    return tipo
-
-        return 'otro'
+        return self.AUTOMATA_TIPOS_SEGURO.primera(texto) or 'otro'
 
     def _detectar_tipo_bien(self, datos):
         """Detecta el tipo de bien asegurado."""
@@ -301,16 +593,8 @@ class ExtractorDatosPoliza:
 
     def _calcular_confianza(self, datos):
         """Calcula el nivel de confianza de la extraccion (0-1)."""
-        campos_importantes = [
-            'numero_poliza',
-            'fecha_vigencia_desde',
-            'fecha_vigencia_hasta',
-            'prima_anual',
-            'asegurado_nombre',
-        ]
-
-        encontrados = sum(1 for campo in campos_importantes if datos.get(campo))
-        confianza = encontrados / len(campos_importantes)
+        encontrados = sum(1 for campo in self.CAMPOS_IMPORTANTES if datos.get(campo))
+        confianza = encontrados / len(self.CAMPOS_IMPORTANTES)
 
         # Bonus por compania detectada
         if datos.get('compania_detectada'):
@@ -350,3 +634,86 @@ def extraer_datos_poliza(ruta_pdf):
     extractor = ExtractorDatosPoliza()
     datos = extractor.extraer_datos(ruta_pdf)
     return extractor.datos_para_poliza(datos)
+
+
+def opciones_extraccion(config):
+    """
+    Modo de lectura de páginas configurado, plantillas de diseño, orden de
+    los patrones y compañías aprendidas por remitente (argumentos de
+    ExtractorDatosPoliza). Todo salvo el modo de lectura se lee de la base
+    de datos, así que requiere contexto de aplicación.
+    """
+    opciones = {
+        'perezosa': config.get('EXTRACCION_PEREZOSA', False),
+        'max_paginas': config.get('EXTRACCION_MAX_PAGINAS', 0),
+    }
+    if config.get('EXTRACCION_PLANTILLAS', False):
+        from app.models import PlantillaDisenoPdf
+        opciones['plantillas'] = PlantillaDisenoPdf.para_extractor()
+    if config.get('EXTRACCION_ORDEN_ADAPTATIVO', False):
+        from app.models import EstadisticaPatron
+        opciones['orden_patrones'] = EstadisticaPatron.para_extractor()
+    if config.get('EXTRACCION_COMPANIA_REMITENTE', False):
+        from app.models import ClaveParserCompania
+        opciones['claves_companias'] = ClaveParserCompania.para_extractor()
+    return opciones
+
+
+def _verificar_lectura(extractor):
+    """
+    En los procesos de trabajo un PDF que no se pudo abrir o leer es un
+    error (el pool lo registra como dañado), no un PDF sin texto.
+    """
+    if extractor.error_lectura:
+        raise ValueError(f'PDF dañado: {extractor.error_lectura}')
+
+
+def interpretar_pdf_bytes(contenido, hash_archivo=None, directorio_cache=None, max_bytes_cache=0,
+                          opciones=None, compania_id=None):
+    """
+    Interpreta un PDF recibido como bytes.
+
+    Pensada para ejecutarse en un pool de procesos durante el escaneo: no
+    toca la base de datos. Con directorio_cache deja el texto en la caché
+    de texto, para que la revisión posterior no vuelva a abrir el PDF.
+    opciones son las de opciones_extraccion() y compania_id la Compania del
+    remitente (ver ExtractorDatosPoliza.extraer_datos).
+    """
+    cache = None
+    if directorio_cache and hash_archivo:
+        from app.extractor.cache_texto import obtener_cache_texto
+        cache = obtener_cache_texto(directorio_cache, max_bytes_cache)
+    extractor = ExtractorDatosPoliza(cache_texto=cache, **(opciones or {}))
+    datos = extractor.extraer_datos(contenido=contenido, hash_archivo=hash_archivo, compania_id=compania_id)
+    _verificar_lectura(extractor)
+    return datos
+
+
+def interpretar_pdf_archivo(ruta_pdf, hash_archivo=None, directorio_cache=None, max_bytes_cache=0,
+                            opciones=None, completo=False, compania_id=None):
+    """
+    Interpreta un PDF en disco. Igual que interpretar_pdf_bytes, pero el
+    proceso lee el archivo (o el texto de la caché) en vez de recibir bytes.
+    completo=True lee todas las páginas aunque el modo sea perezoso.
+    """
+    cache = None
+    if directorio_cache and hash_archivo:
+        from app.extractor.cache_texto import obtener_cache_texto
+        cache = obtener_cache_texto(directorio_cache, max_bytes_cache)
+    extractor = ExtractorDatosPoliza(cache_texto=cache, **(opciones or {}))
+    datos = extractor.extraer_datos(ruta_pdf, hash_archivo=hash_archivo, completo=completo,
+                                    compania_id=compania_id)
+    _verificar_lectura(extractor)
+    return datos
+
+
+def leer_texto_pdf(ruta_pdf, hash_archivo=None, directorio_cache=None, max_bytes_cache=0):
+    """Texto completo de un PDF en disco (de la caché si está), para un proceso aislado."""
+    cache = None
+    if directorio_cache and hash_archivo:
+        from app.extractor.cache_texto import obtener_cache_texto
+        cache = obtener_cache_texto(directorio_cache, max_bytes_cache)
+    extractor = ExtractorDatosPoliza(cache_texto=cache)
+    texto = extractor.extraer_texto_pdf(ruta_pdf, hash_archivo=hash_archivo, completo=True)
+    _verificar_lectura(extractor)
+    return texto
@@ -0,0 +1,205 @@
+"""
+Planificador global de escaneos.
+
+Limita cuántos escaneos se ejecutan a la vez (hilos) en todo el servidor y
+reparte los turnos entre usuarios. Los escaneos pequeños (incrementales o de
+pocos días) tienen prioridad y un hueco reservado frente a las cargas
+históricas grandes. Las sesiones IMAP se limitan aparte en el motor.
+"""
+
+import math
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import count
+from threading import Thread, Lock
+
+
+# Prioridades (menor = antes)
+PRIORIDAD_PEQUENO = 0
+PRIORIDAD_GRANDE = 1
+
+# Duración supuesta de un escaneo mientras no hay historial
+DURACION_POR_DEFECTO = 300  # segundos
+
+
+class SolicitudEscaneo:
+    """Escaneo a la espera de turno."""
+
+    def __init__(self, motor, usuario_id, cuenta_ids, config, directorio_salida, prioridad, orden):
+        self.motor = motor
+        self.usuario_id = usuario_id
+        self.cuenta_ids = cuenta_ids
+        self.config = config
+        self.directorio_salida = directorio_salida
+        self.prioridad = prioridad
+        self.orden = orden
+        self.encolado = datetime.utcnow()
+
+
+class PlanificadorEscaneos:
+    """Cola global de escaneos con reparto justo por usuario."""
+
+    def __init__(self):
+        self.app = None
+        self._lock = Lock()
+        self._cola = []
+        self._en_ejecucion = {}  # escaneo_id -> SolicitudEscaneo
+        self._turnos_usuario = {}  # usuario_id -> escaneos despachados
+        self._orden = count()
+        self._duraciones = deque(maxlen=20)
+
+    # ------------------------------------------------------------------
+    # Configuración
+    # ------------------------------------------------------------------
+
+    def max_hilos(self):
+        return max(1, self.app.config.get('ESCANEO_MAX_HILOS', 4))
+
+    def es_pequeno(self, cuenta_ids, config):
+        """Incremental, o una sola cuenta con rango de fechas corto."""
+        if config.get('incremental'):
+            return True
+        fecha_desde = config.get('fecha_desde')
+        if len(cuenta_ids) > 1 or not fecha_desde or config.get('forzar_escaneo'):
+            return False
+        dias = self.app.config.get('ESCANEO_DIAS_ESCANEO_PEQUENO', 7)
+        return fecha_desde >= datetime.now() - timedelta(days=dias)
+
+    # ------------------------------------------------------------------
+    # Cola
+    # ------------------------------------------------------------------
+
+    def encolar(self, motor, usuario_id, cuenta_ids, config, directorio_salida):
+        """Añade un escaneo a la cola y lo despacha si hay hueco."""
+        if self.app is None:
+            self.app = motor.app
+
+        prioridad = PRIORIDAD_PEQUENO if self.es_pequeno(cuenta_ids, config) else PRIORIDAD_GRANDE
+        solicitud = SolicitudEscaneo(motor, usuario_id, cuenta_ids, config, directorio_salida,
+                                     prioridad, next(self._orden))
+
+        with self._lock:
+            self._cola.append(solicitud)
+            motor.estado_motor = motor.ESTADO_EN_COLA
+
+        self._despachar()
+        posicion = self.posicion(motor.escaneo_id)
+        if posicion:
+            motor.registrar(f"Escaneo en cola (posición {posicion})")
+
+    def retirar(self, escaneo_id):
+        """Quita de la cola un escaneo que aún no empezó."""
+        with self._lock:
+            self._cola = [s for s in self._cola if s.motor.escaneo_id != escaneo_id]
+
+    def _siguiente(self):
+        """Elige la próxima solicitud. Debe llamarse con el lock tomado."""
+        libres = self.max_hilos() - len(self._en_ejecucion)
+        if libres <= 0 or not self._cola:
+            return None
+
+        # Las cargas grandes no pueden ocupar los huecos reservados
+        reservados = min(self.app.config.get('ESCANEO_HILOS_RESERVADOS_PEQUENOS', 1),
+                         self.max_hilos() - 1)
+        grandes_en_ejecucion = sum(1 for s in self._en_ejecucion.values()
+                                   if s.prioridad == PRIORIDAD_GRANDE)
+        admite_grandes = grandes_en_ejecucion < self.max_hilos() - reservados
+
+        usuarios_activos = {s.usuario_id for s in self._en_ejecucion.values()}
+        candidatas = [
+            s for s in self._cola
+            if s.usuario_id not in usuarios_activos
+            and (s.prioridad == PRIORIDAD_PEQUENO or admite_grandes)
+        ]
+        if not candidatas:
+            return None
+
+        # Prioridad, luego el usuario con menos turnos recibidos, luego orden de llegada
+        return min(candidatas, key=lambda s: (
+            s.prioridad, self._turnos_usuario.get(s.usuario_id, 0), s.orden
+        ))
+
+    def _despachar(self):
+        """Arranca todas las solicitudes que caben en los límites."""
+        with self._lock:
+            while True:
+                # Descartar escaneos detenidos mientras esperaban
+                self._cola = [s for s in self._cola if not s.motor.detener_solicitado]
+                solicitud = self._siguiente()
+                if solicitud is None:
+                    break
+
+                self._cola.remove(solicitud)
+                self._en_ejecucion[solicitud.motor.escaneo_id] = solicitud
+                self._turnos_usuario[solicitud.usuario_id] = \
+                    self._turnos_usuario.get(solicitud.usuario_id, 0) + 1
+
+                thread = Thread(target=self._ejecutar, args=(solicitud,))
+                thread.daemon = True
+                thread.start()
+
+    def _ejecutar(self, solicitud):
+        """Ejecuta el escaneo y libera el hueco al terminar."""
+        inicio = datetime.utcnow()
+        try:
+            solicitud.motor._escanear_multi_con_contexto(
+                solicitud.cuenta_ids, solicitud.config, solicitud.directorio_salida
+            )
+        finally:
+            with self._lock:
+                self._en_ejecucion.pop(solicitud.motor.escaneo_id, None)
+                if not solicitud.motor.detener_solicitado:
+                    self._duraciones.append((datetime.utcnow() - inicio).total_seconds())
+            self._despachar()
+
+    # ------------------------------------------------------------------
+    # Información para la interfaz
+    # ------------------------------------------------------------------
+
+    def posicion(self, escaneo_id):
+        """Posición (1 = el siguiente) de un escaneo en la cola, o None."""
+        with self._lock:
+            orden = sorted(
+                (s for s in self._cola if not s.motor.detener_solicitado),
+                key=lambda s: (s.prioridad, self._turnos_usuario.get(s.usuario_id, 0), s.orden)
+            )
+        for i, solicitud in enumerate(orden, 1):
+            if solicitud.motor.escaneo_id == escaneo_id:
+                return i
+        return None
+
+    def duracion_media(self):
+        """Duración media de los últimos escaneos, en segundos."""
+        if not self._duraciones:
+            self._cargar_duraciones()
+        if not self._duraciones:
+            return DURACION_POR_DEFECTO
+        return sum(self._duraciones) / len(self._duraciones)
+
+    def _cargar_duraciones(self):
+        """Inicializa las duraciones con los últimos escaneos completados."""
+        from app.models import Escaneo
+
+        recientes = Escaneo.query.filter(
+            Escaneo.estado == 'completado',
+            Escaneo.fecha_fin.isnot(None)
+        ).order_by(Escaneo.fecha_fin.desc()).limit(self._duraciones.maxlen).all()
+        for escaneo in recientes:
+            self._duraciones.append((escaneo.fecha_fin - escaneo.fecha_inicio).total_seconds())
+
+    def estado_cola(self, escaneo_id):
+        """Posición y tiempo estimado de espera de un escaneo en cola."""
+        posicion = self.posicion(escaneo_id)
+        if posicion is None:
+            return None
+        rondas = math.ceil(posicion / self.max_hilos())
+        return {
+            'posicion': posicion,
+            'en_cola': len(self._cola),
+            'en_ejecucion': len(self._en_ejecucion),
+            'espera_estimada_segundos': int(rondas * self.duracion_media())
+        }
+
+
+# Instancia global del planificador
+planificador_escaneos = PlanificadorEscaneos()
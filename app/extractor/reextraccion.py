@@ -0,0 +1,187 @@
+"""
+Re-extracción incremental de PDFs tras cambiar los patrones del parser.
+
+Cada ExtraccionPdf guarda la versión del parser que la produjo (una huella
+de los patrones compilados). Este trabajo vuelve a interpretar, en un pool
+de procesos, solo los PDFs de un usuario cuya extracción es de otra versión
+y, si el PDF ya tiene una póliza guardada, registra las diferencias campo a
+campo (DiferenciaExtraccion) para revisarlas en bloque.
+"""
+
+import os
+import uuid
+from concurrent.futures import as_completed
+from datetime import datetime
+from threading import Thread, Lock
+
+from sqlalchemy import or_
+
+from app.extractor.aislamiento import PoolExtraccion, ErrorExtraccion, limites_extraccion
+
+
+def consulta_obsoletas(usuario_id):
+    """
+    Archivos del usuario cuya extracción guardada es de otra versión del parser.
+
+    Los PDFs sin extracción no cuentan: no hay nada obsoleto que rehacer.
+    Tampoco los clasificados como no pólizas.
+    """
+    from app.models import ArchivoDescargado, Escaneo, ExtraccionPdf
+
+    return ArchivoDescargado.query.join(Escaneo).join(
+        ExtraccionPdf, ExtraccionPdf.hash_archivo == ArchivoDescargado.hash_archivo
+    ).filter(
+        Escaneo.usuario_id == usuario_id,
+        ArchivoDescargado.filtro_polizas(),
+        or_(ExtraccionPdf.version_parser.is_(None),
+            ExtraccionPdf.version_parser != ExtraccionPdf.version_actual())
+    )
+
+
+class ReextraccionPdfs:
+    """Re-extracción en segundo plano de las extracciones obsoletas de un usuario."""
+
+    ESTADO_EN_PROGRESO = 'en_progreso'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+
+    def __init__(self, app, usuario_id):
+        self.id = uuid.uuid4().hex
+        self.app = app
+        self.usuario_id = usuario_id
+        self.estado = self.ESTADO_EN_PROGRESO
+        self.version_parser = None
+        self.total = 0
+        self.procesados = 0
+        self.errores = 0
+        self.polizas_con_diferencias = 0
+        self.diferencias = 0
+        self.error = None
+        self.fecha_inicio = datetime.utcnow()
+        self.fecha_fin = None
+
+    def ejecutar(self):
+        """Lanza la re-extracción en un hilo separado."""
+        thread = Thread(target=self._reextraer_con_contexto)
+        thread.daemon = True
+        thread.start()
+
+    def _reextraer_con_contexto(self):
+        from app import db
+
+        with self.app.app_context():
+            try:
+                self._reextraer()
+                self.estado = self.ESTADO_COMPLETADO
+            except Exception as e:
+                db.session.rollback()
+                self.error = str(e)
+                self.estado = self.ESTADO_ERROR
+            finally:
+                self.fecha_fin = datetime.utcnow()
+
+    def _reextraer(self):
+        from app import db
+        from app.models import ExtraccionPdf
+        from app.extractor.pdf_parser import interpretar_pdf_archivo, opciones_extraccion
+
+        self.version_parser = ExtraccionPdf.version_actual()
+
+        # Un PDF recibido varias veces se re-extrae una sola vez (por hash)
+        rutas = {}
+        for archivo in consulta_obsoletas(self.usuario_id).all():
+            if archivo.hash_archivo not in rutas and os.path.exists(archivo.ruta_archivo):
+                rutas[archivo.hash_archivo] = (archivo.ruta_archivo, archivo.compania_id)
+        self.total = len(rutas)
+        db.session.rollback()  # No dejar abierta la transacción de lectura
+        if not rutas:
+            return
+
+        config = self.app.config
+        procesos = config.get('REEXTRACCION_PROCESOS', 2)
+        lote = config.get('REEXTRACCION_LOTE', 50)
+        hashes = list(rutas)
+        opciones = opciones_extraccion(config)
+
+        # Procesos aislados: reciben la ruta y devuelven un dict, sin usar la sesión de BD
+        with PoolExtraccion(procesos=procesos, **limites_extraccion(config)) as pool:
+            for inicio in range(0, len(hashes), lote):
+                futuros = {
+                    pool.submit(
+                        interpretar_pdf_archivo, rutas[hash_archivo][0], hash_archivo,
+                        config.get('TEXTO_CACHE_FOLDER'),
+                        config.get('TEXTO_CACHE_MAX_MB', 500) * 1024 * 1024,
+                        opciones, compania_id=rutas[hash_archivo][1]
+                    ): hash_archivo
+                    for hash_archivo in hashes[inicio:inicio + lote]
+                }
+                for futuro in as_completed(futuros):
+                    try:
+                        datos = futuro.result()
+                    except ErrorExtraccion as e:
+                        ExtraccionPdf.registrar_fallo(futuros[futuro], e.estado, str(e))
+                        datos = None
+                    except Exception:
+                        datos = None
+                    if datos:
+                        self._guardar(futuros[futuro], datos)
+                    else:
+                        self.errores += 1
+                    self.procesados += 1
+                # Un commit por lote: lo ya re-extraído no se pierde si algo falla
+                db.session.commit()
+
+    def _guardar(self, hash_archivo, datos):
+        """Actualiza la extracción y compara con las pólizas de ese PDF."""
+        from app.models import ArchivoDescargado, PolizaCliente, ExtraccionPdf, DiferenciaExtraccion
+
+        ExtraccionPdf.guardar(hash_archivo, datos)
+
+        # La extracción se comparte por hash: se comparan todas las pólizas
+        # de ese PDF, también las de otros usuarios (cada uno ve las suyas)
+        polizas = PolizaCliente.query.join(
+            ArchivoDescargado, PolizaCliente.archivo_id == ArchivoDescargado.id
+        ).filter(ArchivoDescargado.hash_archivo == hash_archivo).all()
+        for poliza in polizas:
+            nuevas = DiferenciaExtraccion.registrar(poliza, datos, self.version_parser)
+            if nuevas and poliza.cliente.usuario_id == self.usuario_id:
+                self.polizas_con_diferencias += 1
+                self.diferencias += len(nuevas)
+
+    def obtener_estado(self):
+        """Estado serializable para la interfaz."""
+        return {
+            'id': self.id,
+            'estado': self.estado,
+            'version_parser': self.version_parser,
+            'total': self.total,
+            'procesados': self.procesados,
+            'errores': self.errores,
+            'polizas_con_diferencias': self.polizas_con_diferencias,
+            'diferencias': self.diferencias,
+            'error': self.error,
+        }
+
+
+# Última re-extracción de cada usuario (usuario_id -> ReextraccionPdfs)
+reextracciones_activas = {}
+_lock_reextracciones = Lock()
+
+
+def crear_reextraccion(app, usuario_id):
+    """
+    Crea la re-extracción de un usuario, o None si ya tiene una en curso.
+    Reemplaza a la anterior terminada.
+    """
+    with _lock_reextracciones:
+        anterior = reextracciones_activas.get(usuario_id)
+        if anterior and anterior.estado == ReextraccionPdfs.ESTADO_EN_PROGRESO:
+            return None
+        reextraccion = ReextraccionPdfs(app, usuario_id)
+        reextracciones_activas[usuario_id] = reextraccion
+        return reextraccion
+
+
+def obtener_reextraccion(usuario_id):
+    """Devuelve la última re-extracción de un usuario, o None."""
+    return reextracciones_activas.get(usuario_id)
@@ -0,0 +1,225 @@
+"""
+Extracción por regiones con plantillas de diseño por compañía.
+
+Muchas compañías usan siempre el mismo diseño en la primera página de la
+póliza. Una plantilla asocia cada campo a una página y un rectángulo; con
+ella el valor se lee con page.get_text(clip=rect) en lugar de buscarlo con
+patrones en todo el texto.
+
+Las plantillas se aprenden de una extracción confirmada por el usuario:
+se buscan en las primeras páginas las palabras de cada valor confirmado y
+se guarda el rectángulo que las contiene, algo más ancho hacia la derecha
+para admitir valores más largos en otros PDFs.
+
+Una plantilla es un dict serializable (se pasa tal cual a los procesos):
+    {'ancho': 595.0, 'alto': 842.0,
+     'campos': {'numero_poliza': {'pagina': 0, 'rect': [x0, y0, x1, y1]}, ...}}
+"""
+
+import hashlib
+import json
+import re
+from datetime import date
+from decimal import Decimal
+
+import fitz  # PyMuPDF
+
+
+# Campos que admite una plantilla (claves de los datos del extractor)
+CAMPOS_REGION = [
+    'numero_poliza',
+    'fecha_vigencia_desde',
+    'fecha_vigencia_hasta',
+    'prima_anual',
+    'suma_asegurada',
+    'asegurado_nombre',
+    'asegurado_documento',
+    'vehiculo_marca',
+    'vehiculo_modelo',
+    'vehiculo_anio',
+    'vehiculo_patente',
+    'vehiculo_chasis',
+    'vehiculo_motor',
+]
+
+# Páginas en las que se buscan los valores al aprender una plantilla
+PAGINAS_APRENDIZAJE = 2
+
+# Diferencia de tamaño de página tolerada para aplicar una plantilla
+TOLERANCIA_TAMANO = 0.02
+
+# Forma del rectángulo aprendido. En vertical se queda con la franja central
+# de la línea: las cajas de los caracteres de líneas vecinas se solapan con
+# la del valor y un margen hacia afuera traería letras sueltas de ellas.
+RECORTE_VERTICAL = 0.25  # Fracción del alto recortada arriba y abajo
+MARGEN_IZQUIERDO = 1  # Puntos PDF
+EXTENSION_MINIMA = 20  # Hacia la derecha, como mínimo...
+EXTENSION_RELATIVA = 0.5  # ...o la mitad del ancho del valor
+
+# Valor de cada tipo de campo dentro del texto de la región
+PATRON_FECHA = re.compile(r'(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})')
+PATRON_MONTO = re.compile(r'(\d[\d\.,]*)')
+PATRON_ANIO = re.compile(r'\b((?:19|20)\d{2})\b')
+PATRON_DOCUMENTO = re.compile(r'(\d{2}\-?\d{6,8}(?:\-?\d)?)')
+PATRON_CODIGO = re.compile(r'([A-Z0-9][A-Z0-9\-\/]*)', re.IGNORECASE)
+
+CAMPOS_FECHA = ('fecha_vigencia_desde', 'fecha_vigencia_hasta')
+CAMPOS_MONTO = ('prima_anual', 'suma_asegurada')
+CAMPOS_CODIGO = ('numero_poliza', 'vehiculo_chasis', 'vehiculo_motor')
+
+
+def _normalizar_palabra(palabra):
+    return palabra.strip('.,;:()$').casefold()
+
+
+def texto_de_region(campo, texto):
+    """
+    Parte del texto leído en la región que corresponde al valor del campo.
+
+    La región se amplía hacia la derecha al aprenderla, así que puede traer
+    algo más que el valor: fechas, montos y códigos se recortan con un patrón
+    y el resto se queda con la primera línea.
+    """
+    texto = ' '.join(texto.split('\n')[0].split()) if texto else ''
+    if not texto:
+        return None
+    if campo in CAMPOS_FECHA:
+        patron = PATRON_FECHA
+    elif campo in CAMPOS_MONTO:
+        patron = PATRON_MONTO
+    elif campo == 'vehiculo_anio':
+        patron = PATRON_ANIO
+    elif campo == 'asegurado_documento':
+        patron = PATRON_DOCUMENTO
+    elif campo in CAMPOS_CODIGO:
+        patron = PATRON_CODIGO
+    else:
+        return texto
+    match = patron.search(texto)
+    return match.group(1) if match else None
+
+
+def plantilla_aplicable(doc, plantilla):
+    """True si el tamaño de la primera página coincide con el de la plantilla."""
+    if not plantilla or not plantilla.get('campos') or doc.page_count == 0:
+        return False
+    rect = doc.load_page(0).rect
+    return (abs(rect.width - plantilla['ancho']) <= plantilla['ancho'] * TOLERANCIA_TAMANO and
+            abs(rect.height - plantilla['alto']) <= plantilla['alto'] * TOLERANCIA_TAMANO)
+
+
+def huella_plantilla(plantilla):
+    """Hash corto de la plantilla: las regiones guardadas solo valen para la misma."""
+    serializada = json.dumps(plantilla, sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(serializada, digest_size=6).hexdigest()
+
+
+def leer_regiones(doc, plantilla):
+    """
+    Lee con clip el texto de cada campo de la plantilla.
+
+    Devuelve {campo: texto del valor o None}. Cada página se carga una vez.
+    """
+    resultado = {}
+    paginas = {}
+    for campo, region in plantilla['campos'].items():
+        numero = region['pagina']
+        if numero >= doc.page_count:
+            resultado[campo] = None
+            continue
+        if numero not in paginas:
+            paginas[numero] = doc.load_page(numero)
+        texto = paginas[numero].get_text(clip=fitz.Rect(region['rect']))
+        resultado[campo] = texto_de_region(campo, texto)
+    return resultado
+
+
+def _formas_valor(campo, valor):
+    """Maneras en que un valor confirmado puede estar escrito en el PDF."""
+    if valor is None or valor == '':
+        return []
+    if isinstance(valor, date):
+        formas = [valor.strftime(formato) for formato in ('%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y')]
+        formas.append(f'{valor.day}/{valor.month}/{valor.year}')
+        return formas
+    if campo in CAMPOS_MONTO:
+        try:
+            monto = Decimal(str(valor))
+        except Exception:
+            return []
+        entero, decimales = f'{monto:.2f}'.split('.')
+        miles = f'{int(entero):,}'.replace(',', '.')
+        formas = [f'{miles},{decimales}', f'{entero},{decimales}', f'{entero}.{decimales}']
+        if decimales == '00':
+            formas += [miles, entero]
+        return formas
+    return [str(valor)]
+
+
+def _lineas(pagina):
+    """Palabras de la página agrupadas por línea, en orden de lectura."""
+    lineas = {}
+    for x0, y0, x1, y1, palabra, bloque, linea, _ in pagina.get_text('words'):
+        lineas.setdefault((bloque, linea), []).append((fitz.Rect(x0, y0, x1, y1), palabra))
+    return list(lineas.values())
+
+
+def _buscar_en_lineas(lineas, ancho_pagina, formas):
+    """Rectángulo de la primera aparición de alguna de las formas, o None."""
+    for forma in formas:
+        buscadas = [_normalizar_palabra(p) for p in forma.split()]
+        buscadas = [p for p in buscadas if p]
+        if not buscadas:
+            continue
+        for palabras in lineas:
+            normalizadas = [_normalizar_palabra(p) for _, p in palabras]
+            for inicio in range(len(normalizadas) - len(buscadas) + 1):
+                if normalizadas[inicio:inicio + len(buscadas)] != buscadas:
+                    continue
+                rect = fitz.Rect(palabras[inicio][0])
+                for r, _ in palabras[inicio + 1:inicio + len(buscadas)]:
+                    rect |= r
+                # Hacia la derecha hasta la palabra siguiente de la línea
+                limite = ancho_pagina
+                if inicio + len(buscadas) < len(palabras):
+                    limite = palabras[inicio + len(buscadas)][0].x0 - 1
+                extension = max(EXTENSION_MINIMA, rect.width * EXTENSION_RELATIVA)
+                recorte = rect.height * RECORTE_VERTICAL
+                return [
+                    round(rect.x0 - MARGEN_IZQUIERDO, 1),
+                    round(rect.y0 + recorte, 1),
+                    round(min(rect.x1 + extension, limite), 1),
+                    round(rect.y1 - recorte, 1),
+                ]
+    return None
+
+
+def aprender_plantilla(doc, valores):
+    """
+    Construye una plantilla a partir de los valores confirmados de un PDF.
+
+    valores es {campo: valor} con los tipos de la póliza (date, Decimal,
+    texto). Solo entran los campos encontrados en las primeras
+    PAGINAS_APRENDIZAJE páginas. Devuelve None si no se encontró ninguno.
+    """
+    if doc.page_count == 0:
+        return None
+    primera = doc.load_page(0).rect
+    campos = {}
+    lineas_pagina = {}
+    for campo in CAMPOS_REGION:
+        formas = _formas_valor(campo, valores.get(campo))
+        if not formas:
+            continue
+        for numero in range(min(PAGINAS_APRENDIZAJE, doc.page_count)):
+            if numero not in lineas_pagina:
+                pagina = doc.load_page(numero)
+                lineas_pagina[numero] = (_lineas(pagina), pagina.rect.width)
+            lineas, ancho = lineas_pagina[numero]
+            rect = _buscar_en_lineas(lineas, ancho, formas)
+            if rect:
+                campos[campo] = {'pagina': numero, 'rect': rect}
+                break
+    if not campos:
+        return None
+    return {'ancho': round(primera.width, 1), 'alto': round(primera.height, 1), 'campos': campos}
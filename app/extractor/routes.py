@@ -3,7 +3,7 @@ Rutas del módulo extractor de PDFs
 """
 
 from flask import (Blueprint, render_template, redirect, url_for, flash,
-                   request, jsonify, current_app)
+                   request, jsonify, current_app, Response)
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, TextAreaField, DateField, SubmitField
@@ -12,6 +12,9 @@ from app import db
 from app.models import CuentaGmail, Escaneo, LogActividad, HistorialEscaneoCarpeta, CorreoProcesado
 from app.extractor.motor import (MotorExtractorWeb, crear_motor, obtener_motor,
                                   eliminar_motor, motores_activos)
+from app.extractor.planificador import planificador_escaneos
+from app.extractor.logs_escaneo import leer_pagina, iterar_log
+from app.extractor.estimador import crear_estimacion, obtener_estimacion
 from datetime import datetime, timedelta
 import os
 
@@ -183,27 +186,22 @@ def probar_cuenta(cuenta_id):
     })
 
 
-@extractor_bp.route('/iniciar', methods=['POST'])
-@login_required
-def iniciar_escaneo():
-    """Inicia un nuevo escaneo (soporta múltiples cuentas)."""
-    # Verificar que no haya escaneo activo
-    escaneo_activo = current_user.escaneos.filter_by(estado='en_progreso').first()
-    if escaneo_activo:
-        flash('Ya hay un escaneo en progreso.', 'warning')
-        return redirect(url_for('extractor.index'))
+def _leer_formulario_escaneo():
+    """
+    Lee cuentas y configuración del formulario de escaneo.
 
+    Returns:
+        (cuentas, config, mensaje_error). Con error, cuentas y config son None.
+    """
     # Obtener cuentas seleccionadas (puede ser una o varias)
     cuenta_ids = request.form.getlist('cuenta_ids')
 
     if not cuenta_ids:
-        flash('Selecciona al menos una cuenta de Gmail.', 'warning')
-        return redirect(url_for('extractor.index'))
+        return None, None, 'Selecciona al menos una cuenta de Gmail.'
 
     # Limitar a 5 cuentas máximo
     if len(cuenta_ids) > 5:
-        flash('Máximo 5 cuentas por escaneo.', 'warning')
-        return redirect(url_for('extractor.index'))
+        return None, None, 'Máximo 5 cuentas por escaneo.'
 
     # Obtener las cuentas
     cuentas = CuentaGmail.query.filter(
@@ -213,8 +211,7 @@ def iniciar_escaneo():
     ).all()
 
     if not cuentas:
-        flash('No se encontraron cuentas válidas.', 'warning')
-        return redirect(url_for('extractor.index'))
+        return None, None, 'No se encontraron cuentas válidas.'
 
     # Procesar configuración
     palabras_clave_texto = request.form.get('palabras_clave', '')
@@ -233,6 +230,39 @@ def iniciar_escaneo():
     except ValueError:
         pass
 
+    # Opcion para forzar escaneo completo (ignorar memoria)
+    forzar_escaneo = request.form.get('forzar_escaneo') == 'on'
+
+    config = {
+        'palabras_clave': palabras_clave,
+        'carpetas': carpetas,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'forzar_escaneo': forzar_escaneo
+    }
+    return cuentas, config, None
+
+
+@extractor_bp.route('/iniciar', methods=['POST'])
+@login_required
+def iniciar_escaneo():
+    """Inicia un nuevo escaneo (soporta múltiples cuentas)."""
+    # Verificar que no haya escaneo activo
+    escaneo_activo = current_user.escaneos.filter_by(estado='en_progreso').first()
+    if escaneo_activo:
+        flash('Ya hay un escaneo en progreso.', 'warning')
+        return redirect(url_for('extractor.index'))
+
+    cuentas, config, error = _leer_formulario_escaneo()
+    if error:
+        flash(error, 'warning')
+        return redirect(url_for('extractor.index'))
+
+    palabras_clave = config['palabras_clave']
+    carpetas = config['carpetas']
+    fecha_desde = config['fecha_desde']
+    fecha_hasta = config['fecha_hasta']
+
     # Crear directorio de salida para el usuario
     directorio_usuario = os.path.join(
         current_app.config['UPLOAD_FOLDER'],
@@ -262,17 +292,6 @@ def iniciar_escaneo():
     # Crear y ejecutar motor
     motor = crear_motor(escaneo.id, current_app._get_current_object())
 
-    # Opcion para forzar escaneo completo (ignorar memoria)
-    forzar_escaneo = request.form.get('forzar_escaneo') == 'on'
-
-    config = {
-        'palabras_clave': palabras_clave,
-        'carpetas': carpetas,
-        'fecha_desde': fecha_desde,
-        'fecha_hasta': fecha_hasta,
-        'forzar_escaneo': forzar_escaneo
-    }
-
     motor.ejecutar_escaneo_multi(cuentas, config, directorio_usuario)
 
     # Log
@@ -283,10 +302,41 @@ def iniciar_escaneo():
         request
     )
 
-    flash(f'Escaneo iniciado para {len(cuentas)} cuenta(s).', 'success')
+    cola = planificador_escaneos.estado_cola(escaneo.id)
+    if cola:
+        flash(f'Escaneo en cola para {len(cuentas)} cuenta(s): posición {cola["posicion"]}, '
+              f'espera estimada {max(1, cola["espera_estimada_segundos"] // 60)} min.', 'info')
+    else:
+        flash(f'Escaneo iniciado para {len(cuentas)} cuenta(s).', 'success')
     return redirect(url_for('extractor.index'))
 
 
+@extractor_bp.route('/estimar', methods=['POST'])
+@login_required
+def estimar_escaneo():
+    """Lanza una simulación del escaneo: cuenta correos y PDFs sin descargar nada."""
+    cuentas, config, error = _leer_formulario_escaneo()
+    if error:
+        return jsonify({'exito': False, 'mensaje': error})
+
+    estimacion = crear_estimacion(current_app._get_current_object(), current_user.id)
+    if estimacion is None:
+        return jsonify({'exito': False, 'mensaje': 'Ya hay una estimación en curso.'})
+
+    estimacion.ejecutar([c.id for c in cuentas], config)
+    return jsonify({'exito': True, 'id': estimacion.id})
+
+
+@extractor_bp.route('/estimar/estado')
+@login_required
+def estado_estimacion():
+    """Resultado (parcial o final) de la última simulación del usuario."""
+    estimacion = obtener_estimacion(current_user.id)
+    if not estimacion:
+        return jsonify({'error': 'No hay estimaciones'}), 404
+    return jsonify(estimacion.obtener_estado())
+
+
 @extractor_bp.route('/detener/<int:escaneo_id>', methods=['POST'])
 @login_required
 def detener_escaneo(escaneo_id):
@@ -392,6 +442,9 @@ def estado_escaneo(escaneo_id):
     pausado = False
     correo_actual = 0
     total_correos_carpeta = 0
+    pdfs_interpretados = 0
+    memoria_mb = None
+    cola = None
 
     if motor:
         estado_detallado = motor.obtener_estado_detallado()
@@ -399,6 +452,10 @@ def estado_escaneo(escaneo_id):
         pausado = estado_detallado['pausado']
         correo_actual = estado_detallado['correo_actual']
         total_correos_carpeta = estado_detallado['total_correos_carpeta']
+        pdfs_interpretados = estado_detallado['pdfs_interpretados']
+        memoria_mb = estado_detallado['memoria_mb']
+        if estado_motor == motor.ESTADO_EN_COLA:
+            cola = planificador_escaneos.estado_cola(escaneo_id)
 
     return jsonify({
         'estado': escaneo.estado,
@@ -408,6 +465,9 @@ def estado_escaneo(escaneo_id):
         'pdfs_descargados': escaneo.pdfs_descargados or 0,
         'correo_actual': correo_actual,
         'total_correos_carpeta': total_correos_carpeta,
+        'pdfs_interpretados': pdfs_interpretados,
+        'memoria_mb': memoria_mb,
+        'cola': cola,
         'logs': logs,
         'es_multi_cuenta': escaneo.es_multi_cuenta,
         'cuenta_actual': cuenta_actual,
@@ -431,6 +491,58 @@ def historial():
     return render_template('extractor/historial.html', escaneos=escaneos)
 
 
+@extractor_bp.route('/historial/<int:escaneo_id>/log')
+@login_required
+def log_escaneo(escaneo_id):
+    """Visor del log archivado de un escaneo (se carga por páginas)."""
+    escaneo = Escaneo.query.filter_by(
+        id=escaneo_id,
+        usuario_id=current_user.id
+    ).first_or_404()
+
+    return render_template('extractor/log_escaneo.html', escaneo=escaneo)
+
+
+@extractor_bp.route('/historial/<int:escaneo_id>/log/pagina')
+@login_required
+def pagina_log_escaneo(escaneo_id):
+    """Devuelve una página del log archivado (para AJAX)."""
+    escaneo = Escaneo.query.filter_by(
+        id=escaneo_id,
+        usuario_id=current_user.id
+    ).first_or_404()
+
+    limite = min(request.args.get('limite', 200, type=int), 1000)
+    entradas, cursor, hay_mas = leer_pagina(
+        current_app.config['ESCANEO_LOGS_FOLDER'], escaneo.id,
+        request.args.get('cursor'), limite
+    )
+
+    return jsonify({
+        'entradas': entradas,
+        'cursor': cursor,
+        'hay_mas': hay_mas,
+        'en_progreso': escaneo.estado == 'en_progreso'
+    })
+
+
+@extractor_bp.route('/historial/<int:escaneo_id>/log/descargar')
+@login_required
+def descargar_log_escaneo(escaneo_id):
+    """Descarga el log archivado completo en streaming."""
+    escaneo = Escaneo.query.filter_by(
+        id=escaneo_id,
+        usuario_id=current_user.id
+    ).first_or_404()
+
+    directorio = current_app.config['ESCANEO_LOGS_FOLDER']
+    return Response(
+        iterar_log(directorio, escaneo.id),
+        mimetype='text/plain; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename=escaneo_{escaneo.id}.log'}
+    )
+
+
 @extractor_bp.route('/memoria')
 @login_required
 def memoria_escaneo():
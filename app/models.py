@@ -7,6 +7,7 @@ from flask_login import UserMixin
 from app import db, bcrypt, login_manager
 from cryptography.fernet import Fernet
 from flask import current_app
+from sqlalchemy.exc import IntegrityError
 import base64
 import hashlib
 
@@ -182,19 +183,23 @@ class Compania(db.Model):
     archivos = db.relationship('ArchivoDescargado', backref='compania', lazy='dynamic')
 
     @staticmethod
-    def detectar_o_crear(remitente):
-        """Detecta la compañía del remitente o crea una nueva."""
+    def extraer_dominio(remitente):
+        """Devuelve el dominio (en minúsculas) del email del remitente, o None."""
         import re
 
         if not remitente:
             return None
 
-        # Extraer dominio del email
         match = re.search(r'@([a-zA-Z0-9.-]+)', remitente)
-        if not match:
-            return None
+        return match.group(1).lower() if match else None
 
-        dominio = match.group(1).lower()
+    @staticmethod
+    def detectar_o_crear(remitente):
+        """Detecta la compañía del remitente o crea una nueva."""
+        # Extraer dominio del email
+        dominio = Compania.extraer_dominio(remitente)
+        if not dominio:
+            return None
 
         # Buscar compañía existente por dominio
         compania = Compania.query.filter_by(dominio_email=dominio).first()
@@ -211,8 +216,12 @@ class Compania(db.Model):
                 cantidad_documentos=0,
                 fecha_primer_documento=datetime.utcnow()
             )
-            db.session.add(compania)
-            db.session.flush()
+            try:
+                # Punto de guardado: otro escaneo en paralelo puede crearla a la vez
+                with db.session.begin_nested():
+                    db.session.add(compania)
+            except IntegrityError:
+                compania = Compania.query.filter_by(dominio_email=dominio).first()
 
         return compania
 
@@ -221,6 +230,19 @@ class Compania(db.Model):
         self.cantidad_documentos += 1
         self.fecha_ultimo_documento = datetime.utcnow()
 
+    @staticmethod
+    def sumar_documentos(compania_id, cantidad, fecha=None):
+        """
+        Suma documentos al contador con un único UPDATE, sin cargar la fila.
+
+        Devuelve False si la compañía ya no existe.
+        """
+        filas = Compania.query.filter_by(id=compania_id).update({
+            Compania.cantidad_documentos: db.func.coalesce(Compania.cantidad_documentos, 0) + cantidad,
+            Compania.fecha_ultimo_documento: fecha or datetime.utcnow()
+        }, synchronize_session=False)
+        return filas > 0
+
     def __repr__(self):
         return f'<Compania {self.nombre}>'
 
@@ -246,10 +268,488 @@ class ArchivoDescargado(db.Model):
     nombre_compania_original = db.Column(db.String(255), nullable=True)
     cuenta_origen = db.Column(db.String(120), nullable=True)  # Email de la cuenta Gmail origen
 
+    # Clasificación por la primera página (ver app/extractor/clasificador.py).
+    # None: todavía sin clasificar, se trata como póliza.
+    tipo_documento = db.Column(db.String(20), nullable=True, index=True)
+
+    TIPOS_DOCUMENTO = [
+        ('poliza', 'Póliza'),
+        ('endoso', 'Endoso'),
+        ('recibo', 'Recibo'),
+        ('otro', 'Otro'),
+    ]
+
+    @staticmethod
+    def filtro_polizas():
+        """Condición SQL de los archivos que se interpretan: pólizas y sin clasificar."""
+        return db.or_(ArchivoDescargado.tipo_documento.is_(None),
+                      ArchivoDescargado.tipo_documento == 'poliza')
+
+    def es_poliza(self):
+        """True si el archivo se interpreta (póliza o sin clasificar)."""
+        return self.tipo_documento in (None, 'poliza')
+
+    def etiqueta_tipo_documento(self):
+        return dict(self.TIPOS_DOCUMENTO).get(self.tipo_documento, 'Sin clasificar')
+
     def __repr__(self):
         return f'<ArchivoDescargado {self.nombre_archivo}>'
 
 
+class ExtraccionPdf(db.Model):
+    """
+    Resultado de la interpretación automática de un PDF.
+
+    Se indexa por el hash SHA-256 del archivo, de modo que el mismo PDF
+    recibido varias veces se interpreta una sola vez.
+    """
+
+    __tablename__ = 'extracciones_pdf'
+
+    id = db.Column(db.Integer, primary_key=True)
+    hash_archivo = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    datos_extraidos = db.Column(db.Text, nullable=True)  # JSON con los datos del parser
+    confianza = db.Column(db.Float, nullable=True)
+    compania_detectada = db.Column(db.String(50), nullable=True)
+    version_parser = db.Column(db.String(16), nullable=True, index=True)  # Huella de los patrones usados
+    fecha_extraccion = db.Column(db.DateTime, default=datetime.utcnow)
+    # Resultado del proceso aislado (ver app/extractor/aislamiento.py)
+    estado = db.Column(db.String(10), default='ok')  # ok, timeout, oom, corrupt
+    error = db.Column(db.Text, nullable=True)
+
+    ESTADOS = [
+        ('ok', 'Correcta'),
+        ('timeout', 'Tiempo agotado'),
+        ('oom', 'Memoria excedida'),
+        ('corrupt', 'PDF dañado'),
+    ]
+
+    @staticmethod
+    def version_actual():
+        """Versión del parser en ejecución (ver ExtractorDatosPoliza.VERSION_PARSER)."""
+        from app.extractor.pdf_parser import ExtractorDatosPoliza
+        return ExtractorDatosPoliza.VERSION_PARSER
+
+    def es_vigente(self):
+        """True si la extracción se hizo con los patrones actuales."""
+        return self.version_parser == ExtraccionPdf.version_actual()
+
+    @staticmethod
+    def obtener(hash_archivo):
+        """Obtiene la extracción guardada para un hash (o None)."""
+        if not hash_archivo:
+            return None
+        return ExtraccionPdf.query.filter_by(hash_archivo=hash_archivo).first()
+
+    @staticmethod
+    def guardar(hash_archivo, datos):
+        """Crea o actualiza la extracción de un hash."""
+        import json
+
+        extraccion = ExtraccionPdf.obtener(hash_archivo)
+        if not extraccion:
+            extraccion = ExtraccionPdf(hash_archivo=hash_archivo)
+            db.session.add(extraccion)
+
+        extraccion.datos_extraidos = json.dumps(datos, default=str)
+        extraccion.confianza = datos.get('confianza')
+        extraccion.compania_detectada = datos.get('compania_detectada')
+        extraccion.version_parser = datos.get('version_parser')
+        extraccion.fecha_extraccion = datetime.utcnow()
+        extraccion.estado = 'ok'
+        extraccion.error = None
+        return extraccion
+
+    @staticmethod
+    def registrar_fallo(hash_archivo, estado, error=None):
+        """
+        Registra que el PDF no se pudo interpretar (timeout, oom, corrupt).
+
+        Queda con la versión actual del parser, así no se reintenta en cada
+        visita ni en segundo plano hasta que cambien los patrones.
+        """
+        extraccion = ExtraccionPdf.obtener(hash_archivo)
+        if not extraccion:
+            extraccion = ExtraccionPdf(hash_archivo=hash_archivo)
+            db.session.add(extraccion)
+
+        extraccion.datos_extraidos = None
+        extraccion.confianza = 0.0
+        extraccion.compania_detectada = None
+        extraccion.version_parser = ExtraccionPdf.version_actual()
+        extraccion.fecha_extraccion = datetime.utcnow()
+        extraccion.estado = estado
+        extraccion.error = (error or '')[:1000]
+        return extraccion
+
+    @staticmethod
+    def vincular_duplicado(hash_archivo, hash_original):
+        """
+        Guarda para un PDF casi idéntico la extracción de su original, sin
+        interpretarlo (ver app/extractor/duplicados.py). Devuelve None si el
+        original no tiene una extracción correcta con los patrones actuales.
+        """
+        original = ExtraccionPdf.obtener(hash_original)
+        if not original or original.es_fallida() or not original.es_vigente():
+            return None
+        return ExtraccionPdf.guardar(hash_archivo, original.obtener_datos())
+
+    def es_fallida(self):
+        return self.estado not in (None, 'ok')
+
+    def etiqueta_estado(self):
+        return dict(self.ESTADOS).get(self.estado or 'ok', self.estado)
+
+    def obtener_datos(self):
+        """Devuelve los datos extraídos como diccionario."""
+        import json
+
+        if self.datos_extraidos:
+            try:
+                return json.loads(self.datos_extraidos)
+            except:
+                return {}
+        return {}
+
+    def __repr__(self):
+        return f'<ExtraccionPdf {self.hash_archivo[:12]}>'
+
+
+class PlantillaDisenoPdf(db.Model):
+    """
+    Diseño de las pólizas de una compañía: página y rectángulo de cada campo.
+
+    Se aprende de una extracción confirmada por el usuario y el intérprete
+    la usa para leer esos campos por región (ver app/extractor/regiones.py).
+    Hay una por clave de compañía (ExtractorDatosPoliza.COMPANIAS).
+    """
+
+    __tablename__ = 'plantillas_diseno_pdf'
+
+    id = db.Column(db.Integer, primary_key=True)
+    compania_clave = db.Column(db.String(50), nullable=False, unique=True, index=True)
+    ancho = db.Column(db.Float, nullable=False)  # Tamaño de la primera página
+    alto = db.Column(db.Float, nullable=False)
+    campos = db.Column(db.Text, nullable=False)  # JSON: campo -> {'pagina', 'rect'}
+    veces_aprendida = db.Column(db.Integer, default=1)
+    aprendida_por_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+    aprendida_por = db.relationship('Usuario', foreign_keys=[aprendida_por_id])
+
+    @staticmethod
+    def obtener(compania_clave):
+        """Plantilla de una compañía (o None)."""
+        if not compania_clave:
+            return None
+        return PlantillaDisenoPdf.query.filter_by(compania_clave=compania_clave).first()
+
+    @staticmethod
+    def para_extractor():
+        """Todas las plantillas como dicts, listas para pasar a los procesos del intérprete."""
+        return {
+            plantilla.compania_clave: plantilla.como_dict()
+            for plantilla in PlantillaDisenoPdf.query.all()
+        }
+
+    @staticmethod
+    def aprender(compania_clave, plantilla, usuario_id=None):
+        """
+        Crea o actualiza la plantilla de una compañía con una recién aprendida.
+
+        Si el tamaño de página coincide se combinan los campos (los nuevos
+        reemplazan a los anteriores); si no, el diseño cambió y se reemplaza.
+        """
+        import json
+
+        existente = PlantillaDisenoPdf.obtener(compania_clave)
+        if not existente:
+            existente = PlantillaDisenoPdf(compania_clave=compania_clave, veces_aprendida=0)
+            db.session.add(existente)
+            campos = {}
+        elif existente.ancho == plantilla['ancho'] and existente.alto == plantilla['alto']:
+            campos = existente.obtener_campos()
+        else:
+            campos = {}
+
+        campos.update(plantilla['campos'])
+        existente.ancho = plantilla['ancho']
+        existente.alto = plantilla['alto']
+        existente.campos = json.dumps(campos)
+        existente.veces_aprendida = (existente.veces_aprendida or 0) + 1
+        existente.aprendida_por_id = usuario_id
+        existente.fecha_actualizacion = datetime.utcnow()
+        return existente
+
+    def obtener_campos(self):
+        """Campos de la plantilla como diccionario."""
+        import json
+
+        try:
+            return json.loads(self.campos) if self.campos else {}
+        except ValueError:
+            return {}
+
+    def como_dict(self):
+        return {'ancho': self.ancho, 'alto': self.alto, 'campos': self.obtener_campos()}
+
+    def __repr__(self):
+        return f'<PlantillaDisenoPdf {self.compania_clave}>'
+
+
+class EstadisticaPatron(db.Model):
+    """
+    Aciertos de un patrón del intérprete para una compañía y un campo.
+
+    Cada póliza confirmada desde un PDF suma una evaluación a cada patrón del
+    campo y un acierto a los que habrían dado el valor confirmado. Con esto
+    el intérprete prueba primero los patrones con más aciertos (ver
+    app/extractor/orden_patrones.py).
+    """
+
+    __tablename__ = 'estadisticas_patrones'
+    __table_args__ = (
+        db.UniqueConstraint('compania_clave', 'campo', 'patron', name='uq_estadistica_patron'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    compania_clave = db.Column(db.String(50), nullable=False, default='', index=True)  # '' sin compañía
+    campo = db.Column(db.String(50), nullable=False)
+    patron = db.Column(db.Text, nullable=False)
+    aciertos = db.Column(db.Integer, default=0)
+    evaluaciones = db.Column(db.Integer, default=0)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def registrar(compania_clave, evaluacion):
+        """
+        Suma el resultado de evaluar los patrones sobre una póliza confirmada.
+        evaluacion es la lista [(campo, patron, acierto)] de evaluar_patrones().
+        """
+        compania_clave = compania_clave or ''
+        existentes = {
+            (fila.campo, fila.patron): fila
+            for fila in EstadisticaPatron.query.filter_by(compania_clave=compania_clave).all()
+        }
+        ahora = datetime.utcnow()
+        for campo, patron, acierto in evaluacion:
+            fila = existentes.get((campo, patron))
+            if not fila:
+                fila = EstadisticaPatron(compania_clave=compania_clave, campo=campo, patron=patron,
+                                         aciertos=0, evaluaciones=0)
+                db.session.add(fila)
+                existentes[(campo, patron)] = fila
+            fila.evaluaciones = (fila.evaluaciones or 0) + 1
+            if acierto:
+                fila.aciertos = (fila.aciertos or 0) + 1
+            fila.fecha_actualizacion = ahora
+
+    @staticmethod
+    def para_extractor():
+        """Orden de los patrones por compañía y campo, listo para pasar a los procesos del intérprete."""
+        from app.extractor.pdf_parser import ExtractorDatosPoliza
+        from app.extractor.orden_patrones import calcular_orden
+
+        filas = db.session.query(
+            EstadisticaPatron.compania_clave, EstadisticaPatron.campo, EstadisticaPatron.patron,
+            EstadisticaPatron.aciertos, EstadisticaPatron.evaluaciones
+        ).all()
+        return calcular_orden(filas, ExtractorDatosPoliza.PATRONES)
+
+    def tasa(self):
+        """Porcentaje de aciertos (0-100)."""
+        if not self.evaluaciones:
+            return 0
+        return round(100 * (self.aciertos or 0) / self.evaluaciones)
+
+    def __repr__(self):
+        return f'<EstadisticaPatron {self.compania_clave or "-"} {self.campo}>'
+
+
+class ClaveParserCompania(db.Model):
+    """
+    Confirmaciones de que los PDFs de una Compania (dominio del remitente)
+    son de una compañía del intérprete (clave de ExtractorDatosPoliza.COMPANIAS).
+
+    Cada póliza confirmada suma una a la clave detectada en el texto de su
+    PDF. Cuando una clave reúne casi todas las confirmaciones de la
+    Compania, el intérprete la usa directamente para sus PDFs y solo busca
+    la compañía en el texto cuando el remitente no tiene clave aprendida.
+    Un dominio que envía pólizas de varias compañías (un productor, una
+    casilla genérica) nunca llega a tener clave.
+    """
+
+    __tablename__ = 'claves_parser_companias'
+    __table_args__ = (
+        db.UniqueConstraint('compania_id', 'clave', name='uq_clave_parser_compania'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    compania_id = db.Column(db.Integer, db.ForeignKey('companias.id'), nullable=False, index=True)
+    clave = db.Column(db.String(50), nullable=False)
+    confirmaciones = db.Column(db.Integer, default=0)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+    compania = db.relationship('Compania')
+
+    # Para usar una clave: confirmaciones mínimas y proporción sobre las de la Compania
+    MIN_CONFIRMACIONES = 2
+    PROPORCION_MINIMA = 0.9
+
+    @staticmethod
+    def registrar(compania_id, clave):
+        """Suma una confirmación de la clave para la Compania."""
+        fila = ClaveParserCompania.query.filter_by(compania_id=compania_id, clave=clave).first()
+        if not fila:
+            fila = ClaveParserCompania(compania_id=compania_id, clave=clave, confirmaciones=0)
+            db.session.add(fila)
+        fila.confirmaciones = (fila.confirmaciones or 0) + 1
+        fila.fecha_actualizacion = datetime.utcnow()
+        return fila
+
+    @staticmethod
+    def para_extractor():
+        """Mapa compania_id -> clave de las Compania con clave aprendida."""
+        por_compania = {}
+        for compania_id, clave, confirmaciones in db.session.query(
+            ClaveParserCompania.compania_id, ClaveParserCompania.clave, ClaveParserCompania.confirmaciones
+        ).all():
+            por_compania.setdefault(compania_id, {})[clave] = confirmaciones or 0
+
+        mapa = {}
+        for compania_id, claves in por_compania.items():
+            clave, confirmaciones = max(claves.items(), key=lambda item: item[1])
+            if confirmaciones >= ClaveParserCompania.MIN_CONFIRMACIONES and \
+                    confirmaciones >= sum(claves.values()) * ClaveParserCompania.PROPORCION_MINIMA:
+                mapa[compania_id] = clave
+        return mapa
+
+    def __repr__(self):
+        return f'<ClaveParserCompania {self.compania_id} {self.clave}>'
+
+
+class FirmaTextoPdf(db.Model):
+    """
+    Firma MinHash del texto de un PDF, para reconocer las copias casi
+    idénticas de una póliza con otro hash (ver app/extractor/duplicados.py).
+
+    duplicado_de es el hash del primer PDF firmado del grupo: todas las
+    copias apuntan a ese original, nunca a otra copia. Los PDFs sin texto
+    quedan con firma vacía, así no se vuelven a firmar.
+    """
+
+    __tablename__ = 'firmas_texto_pdf'
+
+    id = db.Column(db.Integer, primary_key=True)
+    hash_archivo = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    firma = db.Column(db.LargeBinary, nullable=True)  # NUM_PERMUTACIONES enteros de 64 bits
+    huella_numeros = db.Column(db.String(16), nullable=True)  # Los números del texto
+    duplicado_de = db.Column(db.String(64), nullable=True, index=True)
+    similitud = db.Column(db.Float, nullable=True)  # Con el original
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def obtener(hash_archivo):
+        """Firma guardada para un hash (o None)."""
+        if not hash_archivo:
+            return None
+        return FirmaTextoPdf.query.filter_by(hash_archivo=hash_archivo).first()
+
+    @staticmethod
+    def buscar_original(firma, huella_numeros, excluir=None):
+        """
+        Original del PDF más parecido a la firma, por el índice de bandas.
+
+        Devuelve (hash_original, similitud) o None si ningún candidato con
+        los mismos números llega a UMBRAL_SIMILITUD.
+        """
+        from app.extractor.duplicados import bandas, similitud, desempaquetar, UMBRAL_SIMILITUD
+
+        candidatos = {
+            hash_archivo for (hash_archivo,) in db.session.query(BandaFirmaPdf.hash_archivo).filter(
+                BandaFirmaPdf.valor.in_(bandas(firma))
+            ).distinct().all()
+        }
+        candidatos.discard(excluir)
+        if not candidatos:
+            return None
+
+        mejor = None
+        for fila in FirmaTextoPdf.query.filter(
+            FirmaTextoPdf.hash_archivo.in_(candidatos),
+            FirmaTextoPdf.huella_numeros == huella_numeros
+        ).all():
+            parecido = similitud(firma, desempaquetar(fila.firma))
+            if parecido >= UMBRAL_SIMILITUD and (mejor is None or parecido > mejor[1]):
+                mejor = (fila.duplicado_de or fila.hash_archivo, parecido)
+        return mejor
+
+    @staticmethod
+    def registrar(hash_archivo, firma):
+        """
+        Guarda la firma de un PDF y sus bandas, y busca su original.
+
+        firma es (minhash, huella_numeros) de app/extractor/duplicados.py;
+        None (PDF sin texto o que no se pudo leer) se guarda vacía y sin
+        bandas. Si el hash ya estaba firmado devuelve la firma existente.
+        """
+        from app.extractor.duplicados import bandas, empaquetar
+
+        fila = FirmaTextoPdf.obtener(hash_archivo)
+        if fila:
+            return fila
+
+        fila = FirmaTextoPdf(hash_archivo=hash_archivo)
+        if firma:
+            minhash, fila.huella_numeros = firma
+            fila.firma = empaquetar(minhash)
+            original = FirmaTextoPdf.buscar_original(minhash, fila.huella_numeros, excluir=hash_archivo)
+            if original:
+                fila.duplicado_de, fila.similitud = original
+            for banda, valor in enumerate(bandas(minhash)):
+                db.session.add(BandaFirmaPdf(banda=banda, valor=valor, hash_archivo=hash_archivo))
+        db.session.add(fila)
+        return fila
+
+    @staticmethod
+    def hashes_grupo(hash_archivo):
+        """Hashes de los demás PDFs casi idénticos a este (el original y sus copias)."""
+        fila = FirmaTextoPdf.obtener(hash_archivo)
+        if not fila:
+            return set()
+        original = fila.duplicado_de or fila.hash_archivo
+        grupo = {original} | {
+            copia for (copia,) in db.session.query(FirmaTextoPdf.hash_archivo).filter(
+                FirmaTextoPdf.duplicado_de == original
+            ).all()
+        }
+        grupo.discard(hash_archivo)
+        return grupo
+
+    def __repr__(self):
+        return f'<FirmaTextoPdf {self.hash_archivo[:12]}>'
+
+
+class BandaFirmaPdf(db.Model):
+    """
+    Índice LSH de las firmas: un valor por banda de cada FirmaTextoPdf.
+
+    Dos PDFs con una banda igual son candidatos a casi idénticos; la
+    búsqueda es una consulta por el índice de valor.
+    """
+
+    __tablename__ = 'bandas_firma_pdf'
+
+    id = db.Column(db.Integer, primary_key=True)
+    banda = db.Column(db.Integer, nullable=False)
+    valor = db.Column(db.BigInteger, nullable=False, index=True)  # Incluye el número de banda
+    hash_archivo = db.Column(db.String(64), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<BandaFirmaPdf {self.banda} {self.hash_archivo[:12]}>'
+
+
 class LogActividad(db.Model):
     """Modelo para registrar actividad del sistema (auditoría)."""
 
@@ -529,6 +1029,138 @@ class PolizaCliente(db.Model):
         return f'<PolizaCliente {self.numero_poliza or self.id}>'
 
 
+class DiferenciaExtraccion(db.Model):
+    """
+    Diferencia entre un campo guardado de una póliza y lo que extrae del
+    mismo PDF una versión nueva del parser. Queda pendiente hasta que el
+    usuario la aplica (el valor nuevo pasa a la póliza) o la descarta.
+    """
+
+    __tablename__ = 'diferencias_extraccion'
+
+    id = db.Column(db.Integer, primary_key=True)
+    poliza_id = db.Column(db.Integer, db.ForeignKey('polizas_cliente.id'), nullable=False, index=True)
+    campo = db.Column(db.String(50), nullable=False)
+    valor_guardado = db.Column(db.Text, nullable=True)
+    valor_nuevo = db.Column(db.Text, nullable=True)
+    version_parser = db.Column(db.String(16), nullable=True)
+    estado = db.Column(db.String(20), default='pendiente', index=True)  # pendiente, aplicada, descartada
+    fecha_deteccion = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_revision = db.Column(db.DateTime, nullable=True)
+
+    poliza = db.relationship('PolizaCliente', backref=db.backref('diferencias_extraccion', lazy='dynamic',
+                                                                 cascade='all, delete-orphan'))
+
+    # Campos de PolizaCliente que rellena el intérprete
+    CAMPOS = [
+        ('numero_poliza', 'Número de Póliza'),
+        ('tipo_seguro', 'Tipo de Seguro'),
+        ('fecha_vigencia_desde', 'Vigencia Desde'),
+        ('fecha_vigencia_hasta', 'Vigencia Hasta'),
+        ('prima_anual', 'Prima Anual'),
+        ('suma_asegurada', 'Suma Asegurada'),
+        ('asegurado_nombre', 'Asegurado'),
+        ('asegurado_documento', 'Documento'),
+        ('bien_asegurado_tipo', 'Tipo de Bien'),
+        ('vehiculo_marca', 'Vehículo Marca'),
+        ('vehiculo_modelo', 'Vehículo Modelo'),
+        ('vehiculo_anio', 'Vehículo Año'),
+        ('vehiculo_patente', 'Vehículo Patente'),
+        ('vehiculo_chasis', 'Vehículo Chasis'),
+        ('vehiculo_motor', 'Vehículo Motor'),
+    ]
+
+    @staticmethod
+    def normalizar(campo, valor):
+        """Valor como texto comparable según el tipo de la columna, o None."""
+        from decimal import Decimal, InvalidOperation
+
+        if valor is None or (isinstance(valor, str) and not valor.strip()):
+            return None
+        tipo = PolizaCliente.__table__.c[campo].type
+        try:
+            if isinstance(tipo, db.Numeric):
+                return f'{Decimal(str(valor)):.2f}'
+            if isinstance(tipo, db.Integer):
+                return str(int(valor))
+        except (InvalidOperation, ValueError):
+            pass
+        if hasattr(valor, 'isoformat'):
+            return valor.isoformat()
+        return str(valor).strip()
+
+    @staticmethod
+    def convertir(campo, texto):
+        """Convierte el texto guardado al tipo de la columna de la póliza."""
+        from decimal import Decimal
+
+        if texto is None:
+            return None
+        tipo = PolizaCliente.__table__.c[campo].type
+        if isinstance(tipo, db.Date):
+            return datetime.strptime(texto, '%Y-%m-%d').date()
+        if isinstance(tipo, db.Numeric):
+            return Decimal(texto)
+        if isinstance(tipo, db.Integer):
+            return int(texto)
+        return texto
+
+    @staticmethod
+    def registrar(poliza, datos, version_parser=None):
+        """
+        Compara los datos de una extracción nueva con la póliza guardada.
+
+        Reemplaza las diferencias pendientes de la póliza y no vuelve a
+        proponer un valor que el usuario ya descartó. Devuelve las nuevas.
+        """
+        DiferenciaExtraccion.query.filter_by(poliza_id=poliza.id, estado='pendiente').delete()
+        descartadas = {
+            (d.campo, d.valor_nuevo) for d in
+            DiferenciaExtraccion.query.filter_by(poliza_id=poliza.id, estado='descartada').all()
+        }
+
+        nuevas = []
+        for campo, _ in DiferenciaExtraccion.CAMPOS:
+            guardado = DiferenciaExtraccion.normalizar(campo, getattr(poliza, campo))
+            nuevo = DiferenciaExtraccion.normalizar(campo, datos.get(campo))
+            if guardado == nuevo or (campo, nuevo) in descartadas:
+                continue
+            # En una extracción parcial, un campo vacío puede estar en páginas no leídas
+            if nuevo is None and datos.get('extraccion_parcial'):
+                continue
+            diferencia = DiferenciaExtraccion(
+                poliza_id=poliza.id,
+                campo=campo,
+                valor_guardado=guardado,
+                valor_nuevo=nuevo,
+                version_parser=version_parser,
+            )
+            db.session.add(diferencia)
+            nuevas.append(diferencia)
+        return nuevas
+
+    @property
+    def etiqueta(self):
+        return dict(self.CAMPOS).get(self.campo, self.campo)
+
+    def aplicar(self, usuario_id=None):
+        """Pasa el valor nuevo a la póliza."""
+        setattr(self.poliza, self.campo, self.convertir(self.campo, self.valor_nuevo))
+        self.poliza.fecha_ultima_modificacion = datetime.utcnow()
+        if usuario_id:
+            self.poliza.modificado_por_id = usuario_id
+        self.estado = 'aplicada'
+        self.fecha_revision = datetime.utcnow()
+
+    def descartar(self):
+        """Mantiene el valor guardado; el mismo valor nuevo no se vuelve a proponer."""
+        self.estado = 'descartada'
+        self.fecha_revision = datetime.utcnow()
+
+    def __repr__(self):
+        return f'<DiferenciaExtraccion {self.poliza_id}.{self.campo}>'
+
+
 class EnvioWhatsApp(db.Model):
     """Modelo para registrar envíos de WhatsApp."""
 
@@ -896,10 +1528,43 @@ class CorreoProcesado(db.Model):
             carpeta=carpeta
         ).first() is not None
 
+    @staticmethod
+    def filtrar_procesados(cuenta_gmail_id, carpeta, message_ids):
+        """Devuelve el subconjunto de message_ids ya procesados (una consulta)."""
+        if not message_ids:
+            return set()
+        filas = db.session.query(CorreoProcesado.message_id).filter(
+            CorreoProcesado.cuenta_gmail_id == cuenta_gmail_id,
+            CorreoProcesado.carpeta == carpeta,
+            CorreoProcesado.message_id.in_(list(message_ids))
+        ).all()
+        return {fila[0] for fila in filas}
+
     @staticmethod
     def registrar_procesado(cuenta_gmail_id, message_id, carpeta, fecha_correo=None,
-                           remitente=None, asunto=None, tiene_pdfs=False, pdfs_descargados=0):
-        """Registra un correo como procesado."""
+                           remitente=None, asunto=None, tiene_pdfs=False, pdfs_descargados=0,
+                           actualizar=False):
+        """
+        Registra un correo como procesado.
+
+        Con actualizar=True (re-escaneo forzado) reutiliza el registro
+        existente en lugar de violar la restricción única.
+        """
+        if actualizar:
+            registro = CorreoProcesado.query.filter_by(
+                cuenta_gmail_id=cuenta_gmail_id,
+                message_id=message_id,
+                carpeta=carpeta
+            ).first()
+            if registro:
+                registro.fecha_correo = fecha_correo
+                registro.remitente = remitente
+                registro.asunto = asunto
+                registro.tiene_pdfs = tiene_pdfs
+                registro.pdfs_descargados = pdfs_descargados
+                registro.fecha_procesado = datetime.utcnow()
+                return registro
+
         registro = CorreoProcesado(
             cuenta_gmail_id=cuenta_gmail_id,
             message_id=message_id,
@@ -921,9 +1586,11 @@ class HistorialEscaneoCarpeta(db.Model):
     """
     Modelo para registrar estadisticas de escaneo por cuenta y carpeta.
 
-    IMPORTANTE: Este modelo es SOLO INFORMATIVO/ESTADISTICO.
+    IMPORTANTE: En los escaneos manuales este modelo es SOLO INFORMATIVO.
     NO se usa para filtrar correos (eso dejaria huecos en las fechas).
     El unico criterio para saltar correos es el Message-ID en CorreoProcesado.
+    Los escaneos automaticos incrementales si lo usan para acotar la busqueda
+    a los correos nuevos (con un margen de un dia).
     """
 
     __tablename__ = 'historial_escaneo_carpeta'
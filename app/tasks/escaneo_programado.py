@@ -0,0 +1,202 @@
+"""
+Escaneo automatico incremental de las cuentas de Gmail activas.
+
+Cada cuenta se vuelve a escanear cuando pasa el intervalo configurado desde
+su ultimo escaneo, mas un desfase fijo por cuenta para que no arranquen
+todas a la vez. Solo se buscan los correos nuevos (ver
+MotorExtractorWeb._fecha_desde_incremental).
+"""
+
+import os
+import zlib
+from datetime import datetime, timedelta
+from threading import Thread, Lock
+from time import sleep
+
+
+class ProgramadorEscaneos:
+    """
+    Lanza en segundo plano los escaneos incrementales pendientes.
+    """
+
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._initialized = True
+        self.running = False
+        self.thread = None
+        self.app = None
+        self.escaneos_lanzados = set()
+        self.ultimo_intento = {}  # cuenta_id -> datetime (aunque el login falle)
+
+    def iniciar(self, app):
+        """Inicia el programador."""
+        if self.running:
+            return
+
+        self.app = app
+        self.running = True
+        self.thread = Thread(target=self._bucle, daemon=True)
+        self.thread.start()
+        print("  [Escaneo] Programador de escaneos automáticos iniciado")
+
+    def detener(self):
+        """Detiene el programador (los escaneos en curso continúan)."""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _bucle(self):
+        """Bucle principal: revisa periódicamente las cuentas pendientes."""
+        while self.running:
+            try:
+                with self.app.app_context():
+                    self._limpiar_terminados()
+                    self._lanzar_pendientes()
+            except Exception as e:
+                print(f"  [Escaneo] Error en programador: {e}")
+
+            sleep(self.app.config.get('ESCANEO_AUTOMATICO_REVISION_SEGUNDOS', 60))
+
+    def desfase(self, cuenta):
+        """Desfase fijo de la cuenta dentro de la ventana de dispersión."""
+        intervalo = self.app.config.get('ESCANEO_AUTOMATICO_INTERVALO_MINUTOS', 60) * 60
+        ventana = int(intervalo * self.app.config.get('ESCANEO_AUTOMATICO_DISPERSION', 0.2))
+        if ventana <= 0:
+            return timedelta(0)
+        return timedelta(seconds=zlib.crc32(cuenta.correo_gmail.encode()) % ventana)
+
+    def proximo_escaneo(self, cuenta):
+        """Fecha en que le toca el próximo escaneo automático a la cuenta."""
+        referencia = cuenta.ultimo_escaneo
+        intento = self.ultimo_intento.get(cuenta.id)
+        if intento and intento > referencia:
+            referencia = intento
+        intervalo = timedelta(minutes=self.app.config.get('ESCANEO_AUTOMATICO_INTERVALO_MINUTOS', 60))
+        return referencia + intervalo + self.desfase(cuenta)
+
+    def _limpiar_terminados(self):
+        """Libera los motores de los escaneos automáticos ya terminados."""
+        from app.extractor.motor import obtener_motor, eliminar_motor, MotorExtractorWeb
+
+        for escaneo_id in list(self.escaneos_lanzados):
+            motor = obtener_motor(escaneo_id)
+            if motor and motor.estado_motor not in (MotorExtractorWeb.ESTADO_COMPLETADO,
+                                                    MotorExtractorWeb.ESTADO_DETENIDO):
+                continue
+            eliminar_motor(escaneo_id)
+            self.escaneos_lanzados.discard(escaneo_id)
+
+    def _lanzar_pendientes(self):
+        """Lanza los escaneos de las cuentas a las que ya les toca."""
+        from app.models import CuentaGmail, Escaneo, Usuario
+
+        max_simultaneos = self.app.config.get('ESCANEO_MAX_SESIONES_IMAP', 3)
+        if len(self.escaneos_lanzados) >= max_simultaneos:
+            return
+
+        # Un escaneo a la vez por usuario, igual que en el escaneo manual
+        usuarios_ocupados = {
+            usuario_id for (usuario_id,) in
+            Escaneo.query.with_entities(Escaneo.usuario_id).filter_by(estado='en_progreso')
+        }
+
+        # Solo cuentas ya escaneadas alguna vez: la carga inicial la lanza el usuario
+        cuentas = CuentaGmail.query.join(Usuario).filter(
+            CuentaGmail.activa == True,
+            CuentaGmail.ultimo_escaneo.isnot(None),
+            Usuario.activo == True
+        ).all()
+
+        ahora = datetime.utcnow()
+        pendientes = [c for c in cuentas
+                      if c.usuario_id not in usuarios_ocupados and self.proximo_escaneo(c) <= ahora]
+        pendientes.sort(key=self.proximo_escaneo)
+
+        for cuenta in pendientes:
+            if not self.running or len(self.escaneos_lanzados) >= max_simultaneos:
+                break
+            if cuenta.usuario_id in usuarios_ocupados:
+                continue
+            self._lanzar_escaneo(cuenta)
+            usuarios_ocupados.add(cuenta.usuario_id)
+
+    def _config_usuario(self, cuenta):
+        """Carpetas y palabras clave del último escaneo del usuario."""
+        from app.models import Escaneo
+
+        anterior = Escaneo.query.filter(
+            Escaneo.usuario_id == cuenta.usuario_id,
+            Escaneo.carpetas.isnot(None)
+        ).order_by(Escaneo.fecha_inicio.desc()).first()
+
+        carpetas = list(self.app.config.get('ESCANEO_AUTOMATICO_CARPETAS', ['INBOX']))
+        palabras_clave = []
+        if anterior:
+            carpetas = [c for c in anterior.carpetas.split(',') if c] or carpetas
+            palabras_clave = [p for p in (anterior.palabras_clave or '').split(',') if p]
+        return carpetas, palabras_clave
+
+    def _lanzar_escaneo(self, cuenta):
+        """Crea el registro de escaneo y arranca el motor para una cuenta."""
+        from app import db
+        from app.models import Escaneo, LogActividad
+        from app.extractor.motor import crear_motor
+
+        carpetas, palabras_clave = self._config_usuario(cuenta)
+
+        directorio_usuario = os.path.join(self.app.config['UPLOAD_FOLDER'], str(cuenta.usuario_id))
+        os.makedirs(directorio_usuario, exist_ok=True)
+
+        escaneo = Escaneo(
+            usuario_id=cuenta.usuario_id,
+            cuenta_gmail_id=cuenta.id,
+            estado='en_progreso',
+            palabras_clave=','.join(palabras_clave),
+            carpetas=','.join(carpetas),
+            es_multi_cuenta=False,
+            cuentas_escaneadas=str(cuenta.id)
+        )
+        db.session.add(escaneo)
+        db.session.commit()
+
+        config = {
+            'palabras_clave': palabras_clave,
+            'carpetas': carpetas,
+            'fecha_desde': None,
+            'fecha_hasta': None,
+            'forzar_escaneo': False,
+            'incremental': True
+        }
+
+        self.ultimo_intento[cuenta.id] = datetime.utcnow()
+        motor = crear_motor(escaneo.id, self.app)
+        self.escaneos_lanzados.add(escaneo.id)
+        motor.ejecutar_escaneo_multi([cuenta], config, directorio_usuario)
+
+        LogActividad.registrar(
+            cuenta.usuario_id, 'escaneo_automatico',
+            f'Escaneo automático incremental de {cuenta.correo_gmail}'
+        )
+        print(f"  [Escaneo] Escaneo automático de {cuenta.correo_gmail} (#{escaneo.id})")
+
+
+# Instancia global del programador
+programador_escaneos = ProgramadorEscaneos()
+
+
+def iniciar_escaneo_programado(app):
+    """Función helper para iniciar el programador desde la app."""
+    programador_escaneos.iniciar(app)
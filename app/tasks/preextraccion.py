@@ -0,0 +1,280 @@
+"""
+Pre-extracción en segundo plano de los PDFs descargados.
+
+Interpreta por adelantado los ArchivoDescargado que todavía no tienen
+ExtraccionPdf, así la pantalla de revisión se abre sin esperar a PyMuPDF y
+el panel del intérprete muestra la confianza antes de entrar en cada PDF.
+Solo se interpretan las pólizas (ver app/extractor/clasificador.py); los
+PDFs anteriores al clasificador se clasifican aquí antes de interpretarlos.
+
+También firma cada póliza (FirmaTextoPdf). Una copia casi idéntica de un
+PDF ya interpretado, con otro hash, recibe la extracción del original en
+vez de volver a interpretarse (ver app/extractor/duplicados.py).
+
+Es trabajo de baja prioridad: un único proceso con prioridad mínima (nice),
+unos pocos archivos por vuelta y una pausa entre archivos, para no quitarle
+CPU a las peticiones web. Con varios workers (gunicorn) solo la ejecuta el
+que toma el lock de PREEXTRACCION_LOCK.
+"""
+
+import os
+from threading import Thread, Lock
+from time import sleep
+
+from app.extractor.aislamiento import PoolExtraccion, ErrorExtraccion, limites_extraccion
+
+
+def _tomar_lock(ruta):
+    """
+    Lock exclusivo sobre el archivo, sin esperar. Devuelve el archivo
+    abierto (el lock dura mientras siga abierto) o None si lo tiene otro
+    proceso.
+    """
+    archivo = open(ruta, 'a')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        archivo.close()
+        return None
+    return archivo
+
+
+def _bajar_prioridad():
+    """Inicializador del proceso de trabajo: prioridad mínima de CPU."""
+    try:
+        os.nice(19)
+    except (AttributeError, OSError):
+        pass
+
+
+class PreExtractorPdfs:
+    """
+    Interpreta en segundo plano los PDFs nuevos sin extracción guardada.
+    """
+
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._initialized = True
+        self.running = False
+        self.thread = None
+        self.app = None
+        self.pool = None
+        self.lock_archivo = None  # Archivo con el lock de instancia única
+        self.fallidos = set()  # Hashes que fallaron: no se reintentan hasta reiniciar
+        self.extraidos = 0
+        self.vinculados = 0  # Copias casi idénticas que tomaron la extracción del original
+
+    def iniciar(self, app):
+        """Inicia el pre-extractor."""
+        if self.running:
+            return
+
+        ruta_lock = app.config.get('PREEXTRACCION_LOCK')
+        if ruta_lock:
+            self.lock_archivo = _tomar_lock(ruta_lock)
+            if self.lock_archivo is None:
+                print("  [PDF] Pre-extracción ya en ejecución en otro proceso")
+                return
+
+        self.app = app
+        self.running = True
+        self.thread = Thread(target=self._bucle, daemon=True)
+        self.thread.start()
+        print("  [PDF] Pre-extracción de PDFs iniciada")
+
+    def detener(self):
+        """Detiene el pre-extractor."""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        if self.lock_archivo:
+            self.lock_archivo.close()
+            self.lock_archivo = None
+
+    def _bucle(self):
+        """Bucle principal: procesa un lote y espera si no quedan pendientes."""
+        while self.running:
+            procesados = 0
+            try:
+                with self.app.app_context():
+                    procesados = self._procesar_pendientes()
+            except Exception as e:
+                print(f"  [PDF] Error en pre-extracción: {e}")
+
+            # Con trabajo pendiente se sigue enseguida; si no, se espera
+            if not procesados:
+                sleep(self.app.config.get('PREEXTRACCION_INTERVALO_SEGUNDOS', 30))
+
+    def _pendientes(self, limite):
+        """
+        (hash, ruta, tipo, compania_id, extraido, firmado) de los PDFs más
+        recientes sin extracción o sin firma guardada.
+        """
+        from app import db
+        from sqlalchemy import or_
+        from app.models import ArchivoDescargado, ExtraccionPdf, FirmaTextoPdf
+
+        consulta = db.session.query(
+            ArchivoDescargado.hash_archivo, ArchivoDescargado.ruta_archivo,
+            ArchivoDescargado.tipo_documento, ArchivoDescargado.compania_id,
+            ExtraccionPdf.id.isnot(None), FirmaTextoPdf.id.isnot(None)
+        ).outerjoin(
+            ExtraccionPdf, ExtraccionPdf.hash_archivo == ArchivoDescargado.hash_archivo
+        ).outerjoin(
+            FirmaTextoPdf, FirmaTextoPdf.hash_archivo == ArchivoDescargado.hash_archivo
+        ).filter(
+            ArchivoDescargado.hash_archivo.isnot(None),
+            ArchivoDescargado.filtro_polizas(),
+            or_(ExtraccionPdf.id.is_(None), FirmaTextoPdf.id.is_(None))
+        )
+        if self.fallidos:
+            consulta = consulta.filter(ArchivoDescargado.hash_archivo.notin_(self.fallidos))
+        filas = consulta.order_by(ArchivoDescargado.fecha_descarga.desc()).limit(limite).all()
+        db.session.rollback()  # No dejar abierta la transacción de lectura
+
+        # Un mismo PDF recibido varias veces se interpreta una sola vez
+        pendientes = {}
+        for fila in filas:
+            pendientes.setdefault(fila[0], tuple(fila))
+        return list(pendientes.values())
+
+    def _clasificar(self, hash_archivo, ruta):
+        """
+        Clasifica un PDF descargado antes de existir el clasificador y guarda
+        el tipo en sus ArchivoDescargado. Devuelve el tipo (None si falló).
+        """
+        from app import db
+        from app.models import ArchivoDescargado
+        from app.extractor.clasificador import clasificar_pdf
+
+        tipo = self.pool.submit(clasificar_pdf, ruta).result()
+        if tipo:
+            ArchivoDescargado.query.filter_by(hash_archivo=hash_archivo, tipo_documento=None).update(
+                {'tipo_documento': tipo}, synchronize_session=False
+            )
+            db.session.commit()
+        return tipo
+
+    def _firmar(self, hash_archivo, ruta):
+        """
+        Firma el PDF y lo registra en el índice de duplicados. Devuelve el
+        hash de su original si es una copia casi idéntica (o None).
+        """
+        from app.models import FirmaTextoPdf
+        from app.extractor.duplicados import firma_pdf
+
+        try:
+            firma = self.pool.submit(firma_pdf, ruta).result()
+        except ErrorExtraccion:
+            firma = None  # Se registra vacía: la interpretación informará el fallo
+        fila = FirmaTextoPdf.registrar(hash_archivo, firma)
+        self._confirmar()
+        return fila.duplicado_de
+
+    def _confirmar(self):
+        """Commit de la extracción o la firma recién guardada."""
+        from app import db
+
+        try:
+            db.session.commit()
+        except Exception:
+            # Lo guardó antes la revisión o un lote: su resultado vale igual
+            db.session.rollback()
+
+    def _procesar_pendientes(self):
+        """Interpreta un lote de PDFs pendientes, de a uno. Devuelve cuántos."""
+        from app import db
+        from app.models import ExtraccionPdf
+        from app.extractor.pdf_parser import interpretar_pdf_archivo, opciones_extraccion
+        from app.extractor.clasificador import TIPO_POLIZA
+
+        config = self.app.config
+        pausa = config.get('PREEXTRACCION_PAUSA_SEGUNDOS', 0.5)
+        procesados = 0
+
+        pendientes = self._pendientes(config.get('PREEXTRACCION_LOTE', 20))
+        opciones = opciones_extraccion(config) if pendientes else None  # Una lectura por vuelta
+        for hash_archivo, ruta, tipo, compania_id, extraido, firmado in pendientes:
+            if not self.running:
+                break
+            if not os.path.exists(ruta):
+                self.fallidos.add(hash_archivo)
+                continue
+
+            if self.pool is None or self.pool.cerrado:
+                self.pool = PoolExtraccion(procesos=1, inicializador=_bajar_prioridad,
+                                           **limites_extraccion(config))
+            try:
+                # Los PDFs sin clasificar se clasifican primero: los que no son
+                # pólizas no se interpretan y ya no vuelven a aparecer
+                if tipo is None and self._clasificar(hash_archivo, ruta) not in (None, TIPO_POLIZA):
+                    procesados += 1
+                    continue
+                original = None if firmado else self._firmar(hash_archivo, ruta)
+                if extraido:
+                    procesados += 1
+                    continue
+                # Copia casi idéntica de un PDF ya interpretado: toma su extracción
+                if original and ExtraccionPdf.vincular_duplicado(hash_archivo, original):
+                    self._confirmar()
+                    procesados += 1
+                    self.vinculados += 1
+                    continue
+                datos = self.pool.submit(
+                    interpretar_pdf_archivo, ruta, hash_archivo,
+                    config.get('TEXTO_CACHE_FOLDER'),
+                    config.get('TEXTO_CACHE_MAX_MB', 500) * 1024 * 1024,
+                    opciones, compania_id=compania_id
+                ).result()
+            except ErrorExtraccion as e:
+                # Colgado, sin memoria o dañado: queda registrado y no se reintenta
+                print(f"  [PDF] PDF {hash_archivo[:12]} no interpretado ({e.estado}): {e}")
+                ExtraccionPdf.registrar_fallo(hash_archivo, e.estado, str(e))
+                self._confirmar()
+                continue
+            except Exception as e:
+                print(f"  [PDF] Error pre-extrayendo {hash_archivo[:12]}: {e}")
+                self.fallidos.add(hash_archivo)
+                continue
+
+            # Un PDF sin texto (escaneado) también se guarda, para no reintentarlo
+            ExtraccionPdf.guardar(hash_archivo, datos or {
+                'confianza': 0.0,
+                'version_parser': ExtraccionPdf.version_actual(),
+            })
+            self._confirmar()
+            procesados += 1
+            self.extraidos += 1
+            sleep(pausa)
+
+        return procesados
+
+
+# Instancia global del pre-extractor
+preextractor_pdfs = PreExtractorPdfs()
+
+
+def iniciar_preextraccion(app):
+    """Función helper para iniciar el pre-extractor desde la app."""
+    preextractor_pdfs.iniciar(app)
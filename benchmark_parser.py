@@ -0,0 +1,104 @@
+"""
+Banco de pruebas del intérprete de pólizas sobre un corpus sintético.
+Genera (si hace falta) PDFs de cada compañía con valores plantados, mide
+velocidad y precisión del extractor y guarda el informe en JSON.
+
+Ejecutar con:
+    python benchmark_parser.py DIRECTORIO [--generar] [--por-compania N]
+                               [--max-paginas-corpus N] [--semilla N]
+                               [--perezosa] [--max-paginas N] [--repeticiones N]
+                               [--salida informe.json] [--comparar anterior.json]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Añadir el directorio del proyecto al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.extractor.benchmark import (
+    ARCHIVO_MANIFIESTO, BancoParser, generar_corpus, comparar_informes
+)
+
+
+def _mostrar_informe(informe):
+    rendimiento = informe['rendimiento']
+    configuracion = informe['configuracion']
+    print(f"Parser {informe['version_parser']} - PyMuPDF {informe['version_pymupdf']}")
+    print(f"Corpus: {configuracion['documentos']} PDFs, {configuracion['paginas']} páginas "
+          f"(perezosa={configuracion['perezosa']}, max_paginas={configuracion['max_paginas']})")
+    print(f"\n{rendimiento['pdfs_por_segundo']} PDFs/s en {rendimiento['segundos']} s")
+    print(f"  get_text:  {rendimiento['segundos_get_text']} s ({rendimiento['fraccion_get_text']:.0%})")
+    print(f"  patrones:  {rendimiento['segundos_patrones']} s")
+
+    print(f"\nPrecisión global: {informe['precision']['global']}")
+    for campo, resumen in informe['precision']['campos'].items():
+        print(f"  {campo:<24} {resumen['aciertos']:>4}/{resumen['total']:<4} {resumen['tasa']}")
+    print("\nPor compañía:")
+    for compania, resumen in informe['precision']['companias'].items():
+        print(f"  {compania:<24} {resumen['tasa']}")
+
+    print("\nPatrones más caros:")
+    patrones = sorted(informe['patrones'], key=lambda p: p['milisegundos'], reverse=True)
+    for patron in patrones[:10]:
+        print(f"  {patron['milisegundos']:>9.3f} ms  {patron['campo']}[{patron['prioridad']}] "
+              f"coincide {patron['tasa_coincidencia']} elegido {patron['elegido']}")
+    sin_uso = [p for p in informe['patrones'] if p['evaluados'] and not p['elegido']]
+    if sin_uso:
+        print(f"\nPatrones que nunca dieron el valor: {len(sin_uso)}")
+        for patron in sin_uso:
+            print(f"  {patron['campo']}[{patron['prioridad']}] {patron['patron']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Banco de pruebas del intérprete de pólizas')
+    parser.add_argument('directorio', help='Directorio del corpus sintético')
+    parser.add_argument('--generar', action='store_true',
+                        help='Generar el corpus aunque ya exista')
+    parser.add_argument('--por-compania', type=int, default=10, help='PDFs por compañía')
+    parser.add_argument('--max-paginas-corpus', type=int, default=40,
+                        help='Páginas máximas de los PDFs generados')
+    parser.add_argument('--semilla', type=int, default=1, help='Semilla del corpus')
+    parser.add_argument('--perezosa', action='store_true',
+                        help='Lectura perezosa de páginas (como EXTRACCION_PEREZOSA)')
+    parser.add_argument('--max-paginas', type=int, default=0,
+                        help='Páginas leídas como máximo (0 = todas)')
+    parser.add_argument('--repeticiones', type=int, default=1,
+                        help='Veces que se procesa el corpus para medir el tiempo')
+    parser.add_argument('--salida', help='Archivo JSON donde guardar el informe')
+    parser.add_argument('--comparar', help='Informe JSON anterior con el que comparar')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("BANCO DE PRUEBAS DEL INTÉRPRETE DE PÓLIZAS")
+    print("=" * 50)
+
+    if args.generar or not os.path.exists(os.path.join(args.directorio, ARCHIVO_MANIFIESTO)):
+        manifiesto = generar_corpus(args.directorio, args.por_compania,
+                                    args.max_paginas_corpus, args.semilla)
+        print(f"Corpus generado: {len(manifiesto['documentos'])} PDFs en {args.directorio}\n")
+
+    banco = BancoParser(args.directorio, perezosa=args.perezosa, max_paginas=args.max_paginas)
+    informe = banco.ejecutar(repeticiones=args.repeticiones)
+    _mostrar_informe(informe)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"\nInforme guardado en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        print("\n" + "=" * 50)
+        print(f"COMPARACIÓN CON {args.comparar}")
+        print("=" * 50)
+        for metrica, valor_anterior, valor_actual in comparar_informes(anterior, informe):
+            marca = '' if valor_anterior == valor_actual else '  *'
+            print(f"  {metrica:<34} {str(valor_anterior):>12} -> {str(valor_actual):<12}{marca}")
+
+
+if __name__ == '__main__':
+    main()
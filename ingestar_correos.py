@@ -0,0 +1,70 @@
+"""
+Script de ingesta offline de correos (mbox, Maildir o directorio de .eml).
+Importa exportaciones como Google Takeout sin volver a descargarlas por IMAP.
+
+Ejecutar con:
+    python ingestar_correos.py RUTA --cuenta correo@gmail.com [--carpeta NOMBRE]
+                               [--procesos N] [--palabras-clave a,b] [--forzar]
+                               [--interpretar]
+"""
+
+import os
+import sys
+import argparse
+
+# Añadir el directorio del proyecto al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.models import CuentaGmail
+from app.extractor.ingesta import IngestorCorreos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingesta offline de correos con PDFs')
+    parser.add_argument('ruta', help='Archivo .mbox, directorio Maildir o directorio con .eml')
+    parser.add_argument('--cuenta', required=True,
+                        help='Cuenta Gmail (ya registrada) a la que se asignan los correos')
+    parser.add_argument('--carpeta', help='Nombre de carpeta para la memoria de escaneo')
+    parser.add_argument('--procesos', type=int, default=None, help='Procesos de parseo')
+    parser.add_argument('--palabras-clave', default='', help='Palabras clave separadas por coma')
+    parser.add_argument('--forzar', action='store_true', help='Ignorar la memoria de escaneo')
+    parser.add_argument('--interpretar', action='store_true',
+                        help='Interpretar los PDFs importados con el extractor de pólizas')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.ruta):
+        print(f"ERROR: no existe {args.ruta}")
+        sys.exit(1)
+
+    app = create_app()
+
+    with app.app_context():
+        cuenta = CuentaGmail.query.filter_by(correo_gmail=args.cuenta.lower()).first()
+        if not cuenta:
+            print(f"ERROR: la cuenta {args.cuenta} no está registrada en el portal")
+            sys.exit(1)
+
+        carpeta = args.carpeta or f"IMPORTACION/{os.path.basename(os.path.normpath(args.ruta))}"
+        palabras_clave = [p.strip() for p in args.palabras_clave.split(',') if p.strip()]
+
+        directorio_usuario = os.path.join(app.config['UPLOAD_FOLDER'], str(cuenta.usuario_id))
+
+        print("=" * 50)
+        print("INGESTA OFFLINE DE CORREOS")
+        print("=" * 50)
+
+        ingestor = IngestorCorreos(
+            app, cuenta, carpeta,
+            palabras_clave=palabras_clave,
+            forzar=args.forzar,
+            procesos=args.procesos,
+            interpretar_pdfs=args.interpretar
+        )
+        escaneo = ingestor.ejecutar(args.ruta, directorio_usuario)
+
+        print(f"\nEscaneo #{escaneo.id} registrado en el historial ({escaneo.estado}).")
+
+
+if __name__ == '__main__':
+    main()
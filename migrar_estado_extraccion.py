@@ -0,0 +1,58 @@
+"""
+Script de migración para registrar las extracciones fallidas.
+Añade el estado (ok, timeout, oom, corrupt) y el error de la
+interpretación aislada a extracciones_pdf.
+Ejecutar con: python migrar_estado_extraccion.py
+"""
+
+import os
+import sys
+
+# Añadir el directorio del proyecto al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from sqlalchemy import text, inspect
+
+
+def migrar():
+    """Ejecuta la migración de la base de datos."""
+    app = create_app()
+
+    with app.app_context():
+        inspector = inspect(db.engine)
+        tablas_existentes = inspector.get_table_names()
+
+        print("=" * 50)
+        print("MIGRACIÓN: Estado de las extracciones de PDF")
+        print("=" * 50)
+
+        if 'extracciones_pdf' not in tablas_existentes:
+            print("\nTabla 'extracciones_pdf' no existe (se creará al iniciar la aplicación).")
+            return
+        columnas = [col['name'] for col in inspector.get_columns('extracciones_pdf')]
+
+        # 1. Añadir columna estado (las extracciones existentes quedan como correctas)
+        print("\n[1/2] Añadiendo columna 'estado'...")
+        if 'estado' not in columnas:
+            db.session.execute(text("ALTER TABLE extracciones_pdf ADD COLUMN estado VARCHAR(10) DEFAULT 'ok'"))
+            db.session.execute(text("UPDATE extracciones_pdf SET estado = 'ok' WHERE estado IS NULL"))
+            db.session.commit()
+        else:
+            print("    Columna 'estado' ya existe. Saltando...")
+
+        # 2. Añadir columna error
+        print("\n[2/2] Añadiendo columna 'error'...")
+        if 'error' not in columnas:
+            db.session.execute(text("ALTER TABLE extracciones_pdf ADD COLUMN error TEXT"))
+            db.session.commit()
+        else:
+            print("    Columna 'error' ya existe. Saltando...")
+
+        print("\n" + "=" * 50)
+        print("MIGRACIÓN COMPLETADA")
+        print("=" * 50)
+
+
+if __name__ == '__main__':
+    migrar()
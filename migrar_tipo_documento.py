@@ -0,0 +1,74 @@
+"""
+Script de migración para clasificar los PDFs descargados.
+Añade el tipo de documento (póliza, endoso, recibo, otro) a
+archivos_descargados y clasifica los archivos existentes.
+Ejecutar con: python migrar_tipo_documento.py
+"""
+
+import os
+import sys
+
+# Añadir el directorio del proyecto al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from sqlalchemy import text, inspect
+
+
+def migrar():
+    """Ejecuta la migración de la base de datos."""
+    app = create_app()
+
+    with app.app_context():
+        inspector = inspect(db.engine)
+        tablas_existentes = inspector.get_table_names()
+
+        print("=" * 50)
+        print("MIGRACIÓN: Tipo de documento de los PDFs")
+        print("=" * 50)
+
+        # 1. Añadir columna tipo_documento a archivos_descargados
+        print("\n[1/2] Actualizando tabla 'archivos_descargados'...")
+        if 'archivos_descargados' not in tablas_existentes:
+            print("    Tabla no existe (se creará al iniciar la aplicación). Saltando...")
+            return
+        columnas = [col['name'] for col in inspector.get_columns('archivos_descargados')]
+        if 'tipo_documento' not in columnas:
+            print("    Añadiendo columna 'tipo_documento'...")
+            db.session.execute(text("ALTER TABLE archivos_descargados ADD COLUMN tipo_documento VARCHAR(20)"))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_archivos_descargados_tipo_documento "
+                "ON archivos_descargados (tipo_documento)"
+            ))
+            db.session.commit()
+        else:
+            print("    Columna 'tipo_documento' ya existe. Saltando...")
+
+        # 2. Clasificar los archivos existentes (solo la primera página de cada uno)
+        print("\n[2/2] Clasificando archivos existentes...")
+        from app.models import ArchivoDescargado
+        from app.extractor.clasificador import clasificar_pdf
+
+        sin_clasificar = ArchivoDescargado.query.filter(ArchivoDescargado.tipo_documento.is_(None)).all()
+        conteo = {}
+        for indice, archivo in enumerate(sin_clasificar, 1):
+            if not os.path.exists(archivo.ruta_archivo):
+                continue
+            tipo = clasificar_pdf(archivo.ruta_archivo)
+            if tipo:
+                archivo.tipo_documento = tipo
+                conteo[tipo] = conteo.get(tipo, 0) + 1
+            if indice % 200 == 0:
+                db.session.commit()
+                print(f"    {indice}/{len(sin_clasificar)}...")
+        db.session.commit()
+        for tipo, cantidad in sorted(conteo.items()):
+            print(f"    {tipo}: {cantidad}")
+
+        print("\n" + "=" * 50)
+        print("MIGRACIÓN COMPLETADA")
+        print("=" * 50)
+
+
+if __name__ == '__main__':
+    migrar()
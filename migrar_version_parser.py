@@ -0,0 +1,63 @@
+"""
+Script de migración para versionar las extracciones de PDFs.
+Añade la versión del parser a extracciones_pdf y crea la tabla de
+diferencias entre pólizas guardadas y re-extracciones.
+Ejecutar con: python migrar_version_parser.py
+"""
+
+import os
+import sys
+
+# Añadir el directorio del proyecto al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from sqlalchemy import text, inspect
+
+
+def migrar():
+    """Ejecuta la migración de la base de datos."""
+    app = create_app()
+
+    with app.app_context():
+        inspector = inspect(db.engine)
+        tablas_existentes = inspector.get_table_names()
+
+        print("=" * 50)
+        print("MIGRACIÓN: Versión del parser en extracciones")
+        print("=" * 50)
+
+        # 1. Añadir columna version_parser a extracciones_pdf
+        print("\n[1/2] Actualizando tabla 'extracciones_pdf'...")
+        if 'extracciones_pdf' not in tablas_existentes:
+            print("    Tabla no existe (se creará al iniciar la aplicación). Saltando...")
+        else:
+            columnas = [col['name'] for col in inspector.get_columns('extracciones_pdf')]
+            if 'version_parser' not in columnas:
+                print("    Añadiendo columna 'version_parser'...")
+                db.session.execute(text("ALTER TABLE extracciones_pdf ADD COLUMN version_parser VARCHAR(16)"))
+                db.session.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_extracciones_pdf_version_parser "
+                    "ON extracciones_pdf (version_parser)"
+                ))
+                db.session.commit()
+                print("    Las extracciones existentes quedan sin versión: se re-extraerán.")
+            else:
+                print("    Columna 'version_parser' ya existe. Saltando...")
+
+        # 2. Crear tabla diferencias_extraccion
+        print("\n[2/2] Creando tabla 'diferencias_extraccion'...")
+        if 'diferencias_extraccion' not in tablas_existentes:
+            from app.models import DiferenciaExtraccion
+            DiferenciaExtraccion.__table__.create(db.engine)
+            print("    Tabla 'diferencias_extraccion' creada correctamente.")
+        else:
+            print("    Tabla 'diferencias_extraccion' ya existe. Saltando...")
+
+        print("\n" + "=" * 50)
+        print("MIGRACIÓN COMPLETADA")
+        print("=" * 50)
+
+
+if __name__ == '__main__':
+    migrar()